@@ -1,16 +1,22 @@
 import shutil
 import hashlib
 from utils.errors import NoImagesError
-from utils.logger import log_method
+from utils.tracing import traced, tracer
 from data_processing.annotation_saver import AnnotationSaver
 from data_processing.image_loader import ImageLoader
-from ui.canvas import AnnotationCanvas
+from ui.canvas import AnnotationCanvas, post_to_tk
+from ui.label_palette import LabelPalette
+from ml.box_refine import BoxRefiner
+from ml.carry_forward import CarryForward
+from ml.suggestions import SuggestionEngine, available_models
+from utils.label_vocabulary import LabelVocabulary
 from tkinter import ttk, filedialog, messagebox, simpledialog
 import tkinter as tk
 import os
 from pathlib import Path
-from utils.json_manager import JsonManager, AnnotationFileManager
+from utils.json_manager import get_json_manager, get_annotation_manager
 from utils.paths import DATA_DIR
+from utils.dir_listing import list_images
 import tempfile
 import zipfile
 
@@ -32,6 +38,7 @@ class AnnotationPopover(tk.Toplevel):
         # Блокируем главное окно
         self.grab_set()
         self.focus_set()
+        self.protocol("WM_DELETE_WINDOW", self.close)
 
         # Инициализация состояния
         self.image_loader = None
@@ -39,6 +46,8 @@ class AnnotationPopover(tk.Toplevel):
         self.folder_path = None
         self.json_manager = None  # Управление hash_to_name
         self.current_blazon = None
+        self.suggestion_engine = None  # Предразметка моделью, создаётся при включении
+        self.carry_forward = None  # Перенос разметки с предыдущей картинки, создаётся по кнопке
 
         # Рисовка графики
         self._setup_ui()
@@ -78,13 +87,38 @@ class AnnotationPopover(tk.Toplevel):
         )
         self.current_blazon_label.pack(pady=5)
 
+        self.refine_var = tk.BooleanVar(value=False)
         if not self.readonly:
             ttk.Label(right_frame, text="Разметка:").pack(pady=10)
             ttk.Entry(right_frame, textvariable=text_var, width=30).pack(pady=5)
+            ttk.Checkbutton(
+                right_frame,
+                text="Уточнять рамки по краям",
+                variable=self.refine_var,
+                command=self._on_refine_toggle
+            ).pack(anchor="w", pady=5)
+            ttk.Button(
+                right_frame,
+                text="Перенести с предыдущего",
+                command=self._carry_forward
+            ).pack(fill=tk.X, pady=5)
 
         # Canvas для изображений
         self.canvas = AnnotationCanvas(left_frame, self.image_loader, self.annotation_saver, readonly=self.readonly)
         self.canvas.pack(fill=tk.BOTH, expand=True, padx=5, pady=5)
+        self.canvas.on_annotation_created = lambda annotation: self._update_status()
+
+        # Палитра классов датасета, заполняется при загрузке папки
+        self.palette_frame = ttk.Frame(right_frame)
+        if not self.readonly:
+            self.palette_frame.pack(fill=tk.X, pady=5)
+
+        # Подсказки модели: пунктирные рамки, двойной клик принимает
+        self.suggest_var = tk.BooleanVar(value=False)
+        self.suggest_model_var = tk.StringVar()
+        self.suggest_status_var = tk.StringVar()
+        if not self.readonly:
+            self._setup_suggestions_ui(right_frame)
 
         # Панель управления
         control_frame = ttk.Frame(left_frame)
@@ -106,6 +140,31 @@ class AnnotationPopover(tk.Toplevel):
         )
         self.next_button.pack(side=tk.LEFT, padx=5)
 
+        # Переходы к ближайшей неразмеченной картинке
+        self.prev_unannotated_button = ttk.Button(
+            control_frame,
+            text="⇤ Неразмеченное",
+            style="Popover.TButton",
+            command=self._prev_unannotated
+        )
+        self.prev_unannotated_button.pack(side=tk.LEFT, padx=5)
+
+        self.next_unannotated_button = ttk.Button(
+            control_frame,
+            text="Неразмеченное ⇥",
+            style="Popover.TButton",
+            command=self._next_unannotated
+        )
+        self.next_unannotated_button.pack(side=tk.LEFT, padx=5)
+
+        # Колесо мыши — масштаб, Shift+перетаскивание — прокрутка
+        ttk.Button(
+            control_frame,
+            text="Вписать",
+            style="Popover.TButton",
+            command=self.canvas.reset_view
+        ).pack(side=tk.LEFT, padx=5)
+
         self.status_var = tk.StringVar()
         ttk.Label(
             control_frame,
@@ -136,6 +195,161 @@ class AnnotationPopover(tk.Toplevel):
             command=self.close
         ).pack(side=tk.RIGHT, padx=5, pady=10)
 
+    def _on_refine_toggle(self):
+        if self.refine_var.get():
+            if self.canvas.refiner is None:
+                self.canvas.refiner = BoxRefiner()
+                self.canvas.prepare_refiner()
+        elif self.canvas.refiner is not None:
+            self._close_refiner()
+
+    def _close_refiner(self):
+        if tracer.enabled:
+            print(f"[DEBUG] Уточнение рамок: {self.canvas.refiner.stats()}")
+        self.canvas.refiner.close()
+        self.canvas.refiner = None
+
+    def _carry_forward(self):
+        """Переносит рамки предыдущей картинки на текущую сопоставлением шаблонов."""
+        loader = self.image_loader
+        if not loader or loader.current_index <= 0:
+            self.status_var.set("Нет предыдущего изображения")
+            return
+        current_path = self._current_image_full_path()
+        previous_name = loader.image_files[loader.current_index - 1]
+        previous_path = os.path.join(str(loader.folder_path), previous_name)
+        annotations = [
+            # Старые записи хранят координаты вписанного вида и его ratio
+            {"coords": [c / (ann.ratio or 1.0) for c in ann.coords], "text": ann.text}
+            for ann in self.annotation_saver.get_annotations(previous_name)
+        ]
+        if not annotations:
+            self.status_var.set("На предыдущем изображении нет разметки")
+            return
+
+        if self.carry_forward is None:
+            self.carry_forward = CarryForward()
+        self.status_var.set("Переносим разметку…")
+
+        self.carry_forward.run(
+            previous_path, current_path, annotations,
+            lambda path, carried: post_to_tk(self, lambda: self._apply_carried(path, carried, len(annotations)))
+        )
+
+    def _apply_carried(self, image_path, carried, total):
+        if image_path != self._current_image_full_path():
+            return  # картинку уже сменили
+        if carried is None:
+            self.status_var.set("Не удалось перенести разметку (подробности в консоли)")
+            return
+        added = self.canvas.add_carried(carried)
+        self.status_var.set(f"Перенесено рамок: {added} из {total}")
+
+    def _setup_suggestions_ui(self, parent):
+        suggest_frame = ttk.LabelFrame(parent, text="Подсказки модели", padding=5)
+        suggest_frame.pack(fill=tk.X, pady=10)
+
+        models = available_models()
+        selected = getattr(self.app, "model_var", None)
+        if selected is not None and selected.get() in models:
+            self.suggest_model_var.set(selected.get())
+        elif models:
+            self.suggest_model_var.set(models[0])
+
+        model_box = ttk.Combobox(
+            suggest_frame,
+            textvariable=self.suggest_model_var,
+            values=models,
+            state="readonly"
+        )
+        model_box.pack(fill=tk.X, pady=2)
+        model_box.bind("<<ComboboxSelected>>", lambda e: self._on_suggest_model_change())
+
+        ttk.Checkbutton(
+            suggest_frame,
+            text="Показывать подсказки",
+            variable=self.suggest_var,
+            command=self._on_suggest_toggle
+        ).pack(anchor="w", pady=2)
+
+        ttk.Button(
+            suggest_frame,
+            text="Принять все",
+            command=self._accept_all_suggestions
+        ).pack(fill=tk.X, pady=2)
+
+        ttk.Label(
+            suggest_frame,
+            textvariable=self.suggest_status_var,
+            wraplength=250,
+            justify='left'
+        ).pack(anchor="w")
+
+    def _stop_suggestions(self):
+        if self.suggestion_engine:
+            self.suggestion_engine.close()
+            self.suggestion_engine = None
+
+    def _on_suggest_toggle(self):
+        if self.suggest_var.get():
+            self._request_suggestions()
+        else:
+            self._stop_suggestions()
+            self.canvas.clear_suggestions()
+            self.suggest_status_var.set("")
+
+    def _on_suggest_model_change(self):
+        self._stop_suggestions()
+        self.canvas.clear_suggestions()
+        self._request_suggestions()
+
+    def _current_image_full_path(self):
+        current_image_path = self.image_loader.get_current_image_path()
+        if current_image_path is None:
+            return None
+        return os.path.join(str(self.image_loader.folder_path), current_image_path)
+
+    def _request_suggestions(self):
+        """Запускает модель на текущей картинке и заранее — на следующих."""
+        if not self.suggest_var.get() or not self.image_loader:
+            return
+        model_name = self.suggest_model_var.get()
+        if not model_name:
+            self.suggest_status_var.set("Нет моделей в папке models")
+            return
+        image_path = self._current_image_full_path()
+        if image_path is None:
+            return
+
+        if self.suggestion_engine is None:
+            self.suggestion_engine = SuggestionEngine(DATA_DIR / "models" / model_name)
+        self.suggest_status_var.set("Модель ищет объекты…")
+
+        self.suggestion_engine.request(
+            image_path,
+            lambda path, proposals: post_to_tk(self, lambda: self._show_suggestions(path, proposals))
+        )
+
+        loader = self.image_loader
+        upcoming = range(loader.current_index + 1, min(loader.current_index + 1 + loader.PREFETCH_AHEAD, len(loader.image_files)))
+        self.suggestion_engine.prefetch(os.path.join(str(loader.folder_path), loader.image_files[i]) for i in upcoming)
+
+    def _show_suggestions(self, image_path, proposals):
+        if not self.suggest_var.get() or image_path != self._current_image_full_path():
+            return  # картинку уже сменили
+        if proposals is None:
+            self.suggest_status_var.set("Не удалось получить подсказки (подробности в консоли)")
+            return
+        self.canvas.show_suggestions(proposals)
+        self.suggest_status_var.set(
+            f"Подсказок: {self.canvas.suggestion_count()} (двойной клик или правая кнопка — принять)"
+        )
+
+    def _accept_all_suggestions(self):
+        self.canvas.accept_all_suggestions()
+        if self.suggest_var.get():
+            self.suggest_status_var.set("Подсказки приняты")
+
     def _go_to_image(self):
         """Обновить изображение по номеру, введенному пользователем."""
         try:
@@ -161,7 +375,7 @@ class AnnotationPopover(tk.Toplevel):
             output_dir = DATA_DIR / "annotated_dataset"
 
             hash_name = get_unique_folder_name(folder_path)
-            self.json_manager = JsonManager(
+            self.json_manager = get_json_manager(
                 os.path.join(output_dir, 'hash_to_name.json')
             )
 
@@ -178,16 +392,16 @@ class AnnotationPopover(tk.Toplevel):
                     else:
                         raise FileNotFoundError("JSON файл не найден в распакованной папке.")
 
-                    annotations_manager = JsonManager(output_dir / 'annotations.json')
+                    annotations_manager = get_annotation_manager(output_dir / 'annotations.json')
                     annotations_file = Path(folder_path) / annotations_path
                     with open(annotations_file, 'r', encoding='utf-8') as f:
                         new_annotations = json.load(f)
                     # new_annotations: {image_name: [anns]}
-                    for image_name, anns in new_annotations.items():
-                        annotations_manager.data.setdefault(str(dst_path), {}).setdefault(image_name, []).extend(anns)
-                    annotations_manager.save()
+                    with annotations_manager.batch():
+                        for image_name, anns in new_annotations.items():
+                            annotations_manager.add_file_info(str(dst_path), image_name, anns)
 
-                    print(annotations_manager.data)
+                    print(annotations_manager.get_folder_info(str(dst_path)))
 
             else:
                 self.folder_path = dst_path
@@ -197,10 +411,7 @@ class AnnotationPopover(tk.Toplevel):
             folder_path = Path(path)
             self.folder_path = path
 
-            images = [
-                f for f in os.listdir(folder_path)
-                if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))
-            ]
+            images = list_images(folder_path)
 
             if not images:
                 self.destroy()
@@ -213,10 +424,7 @@ class AnnotationPopover(tk.Toplevel):
                     self.destroy()
                     return
 
-                images = [
-                    f for f in os.listdir(folder_path)
-                    if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))
-                ]
+                images = list_images(folder_path)
 
                 if not images:
                     self.destroy()
@@ -239,10 +447,7 @@ class AnnotationPopover(tk.Toplevel):
 
                 folder_path = temp_dir
 
-                images = [
-                    f for f in os.listdir(temp_dir)
-                    if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))
-                ]
+                images = list_images(temp_dir)
 
                 if not images:
                     self.destroy()
@@ -257,6 +462,8 @@ class AnnotationPopover(tk.Toplevel):
                 self.destroy()
                 messagebox.showerror("Ошибка", f"Нет .json файл с разметкой в архиве:\n\n{e}")
 
+        if self.image_loader:
+            self.image_loader.close()
         self.image_loader = ImageLoader(
             self.folder_path,
             annotated_path=self.annotated_path
@@ -264,19 +471,46 @@ class AnnotationPopover(tk.Toplevel):
 
         self.canvas.image_loader = self.image_loader
 
+        if self.annotation_saver:
+            self.annotation_saver.json_manager.remove_write_error_listener(self._on_write_error)
         self.annotation_saver = AnnotationSaver(
             self.folder_path,
             annotated_path=self.annotated_path
         )
+        self.annotation_saver.json_manager.add_write_error_listener(self._on_write_error)
         self.canvas.annotation_saver = self.annotation_saver
+        self._setup_vocabulary()
         self._load_image()
 
-    @log_method
+    def _on_write_error(self, error):
+        # Вызывается из потока записи один раз, когда повторы исчерпаны
+        post_to_tk(self, lambda: messagebox.showerror(
+            "Ошибка", f"Не удалось сохранить разметку:\n\n{error}", parent=self
+        ))
+
+    def _setup_vocabulary(self):
+        """Словарь классов текущего датасета для палитры и подсказок."""
+        output_dir = DATA_DIR / "annotated_dataset"
+        folder = str(self.folder_path)
+        annotations_manager = get_annotation_manager(os.path.join(output_dir, 'annotations.json'))
+        counts = annotations_manager.annotation_table([folder]).class_histogram([folder])
+        self.canvas.vocabulary = LabelVocabulary(counts)
+
+        for child in self.palette_frame.winfo_children():
+            child.destroy()
+        LabelPalette(self.palette_frame, self.canvas.vocabulary, self.canvas.apply_label).pack(fill=tk.X)
+
+    @traced
     def _load_image(self, direction="next"):
         output_dir = DATA_DIR / "annotated_dataset"
 
         if self.image_loader:
-            json_manager = JsonManager(os.path.join(output_dir, 'blazons.json'))
+            # Перед переходом дописываем разметку текущей картинки
+            self.canvas.commit_pending()
+            if self.annotation_saver:
+                self.annotation_saver.flush()
+
+            json_manager = get_json_manager(os.path.join(output_dir, 'blazons.json'))
 
             img = self.image_loader.get_image(direction)
             if img:
@@ -296,6 +530,7 @@ class AnnotationPopover(tk.Toplevel):
                 self.canvas.display_image(img, current_image_path)
                 self._load_existing_annotations(current_image_path)
                 self._update_status()
+                self._request_suggestions()
 
     def _load_existing_annotations(self, current_image_path):
         print("_load_existing_annotations", current_image_path)
@@ -311,18 +546,46 @@ class AnnotationPopover(tk.Toplevel):
     def _next_image(self):
         self._load_image("next")
 
+    def _jump_to(self, index):
+        if index is None:
+            self.status_var.set("Неразмеченных изображений в этом направлении нет")
+            return
+        self.image_loader.current_index = index
+        self._load_image('current')
+
+    def _prev_unannotated(self):
+        if self.image_loader:
+            self._jump_to(self.image_loader.prev_unannotated_index())
+
+    def _next_unannotated(self):
+        if self.image_loader:
+            self._jump_to(self.image_loader.next_unannotated_index())
+
     def _update_status(self):
         if self.image_loader:
             current_index = self.image_loader.current_index
             total_images = len(self.image_loader.image_files)
-            self.status_var.set(
-                f"Изображение {current_index + 1}/{total_images}"
-            )
+            status = f"Изображение {current_index + 1}/{total_images}"
+            rate = self.canvas.boxes_per_minute()
+            if rate is not None:
+                status += f"  ·  {rate:.1f} рамок/мин"
+            self.status_var.set(status)
             
             # Update button states
             self.prev_button.configure(state='normal' if current_index > 0 else 'disabled')
             self.next_button.configure(state='normal' if current_index < total_images - 1 else 'disabled')
 
     def close(self):
+        self._stop_suggestions()
+        if self.carry_forward is not None:
+            self.carry_forward.close()
+        self.canvas.commit_pending()
+        if self.canvas.refiner is not None:
+            self._close_refiner()
+        if self.annotation_saver:
+            self.annotation_saver.flush()
+            self.annotation_saver.json_manager.remove_write_error_listener(self._on_write_error)
+        if self.image_loader:
+            self.image_loader.close()
         self.destroy()
         self.app.get_annotated_datasets()
\ No newline at end of file
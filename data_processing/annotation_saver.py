@@ -1,6 +1,7 @@
-from utils.json_manager import AnnotationFileManager
+from utils.json_manager import get_annotation_manager
 from typing import List
 from utils.annotation import Annotation
+from utils.tracing import tracer
 from utils.paths import *
 
 
@@ -14,9 +15,11 @@ class AnnotationSaver:
 
         self.output_dir.mkdir(exist_ok=True)
 
-        self.json_manager = AnnotationFileManager(
+        self.json_manager = get_annotation_manager(
             os.path.join(self.output_dir, 'annotations.json')
         )
+        # Запись идёт фоновым потоком, чтобы не тормозить рисование на Canvas
+        self.json_manager.enable_write_behind()
 
         self.annotations_file = self.output_dir / "annotations.json"
 
@@ -34,8 +37,33 @@ class AnnotationSaver:
                 for annotation_dict in self.json_manager.get_file_info(str(self.annotated_path), img_name)
             ]
 
-    def delete_annotation_from_file(self, image_path: str, annotation: Annotation) -> None:
-        self.json_manager.delete_annotation(str(self.source_folder), image_path, annotation.to_dict())
+    def delete_annotation_from_file(self, image_path: str, annotation: Annotation) -> bool:
+        folder = str(self.source_folder)
+        if self.json_manager.delete_annotation_by_id(folder, image_path, annotation.id):
+            return True
+        # id в файле мог смениться — ищем ту же рамку по координатам и метке
+        values = {key: value for key, value in annotation.to_dict().items() if key != 'id'}
+        if self.json_manager.delete_annotation(folder, image_path, values):
+            return True
+        print(f"Аннотация {annotation.id} не найдена в {image_path}, удалять нечего")
+        return False
+
+    def update_annotation_in_file(self, image_path: str, annotation: Annotation) -> None:
+        """Сохраняет изменённую метку/координаты аннотации без удаления и повторного добавления."""
+        updated = self.json_manager.update_annotation(
+            str(self.source_folder), image_path, annotation.id,
+            {'coords': annotation.coords, 'text': annotation.text, 'ratio': annotation.ratio}
+        )
+        if not updated:
+            # В файле аннотации нет (удалена снаружи) — записываем её заново
+            print(f"Аннотация {annotation.id} не найдена в {image_path}, добавляем её заново")
+            self.add_annotation_to_file(image_path, annotation)
 
     def add_annotation_to_file(self, image_path: str, annotation: Annotation) -> None:
         self.json_manager.add_file_info(str(self.source_folder), image_path, [annotation.to_dict()])
+
+    def flush(self) -> None:
+        """Немедленно записывает накопленные изменения (при переходе и закрытии)."""
+        self.json_manager.flush()
+        if tracer.enabled:
+            print(f"[DEBUG] Запись аннотаций: {self.json_manager.write_metrics()}")
@@ -1,49 +1,86 @@
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from PIL import Image
 from typing import Optional, List
 
-from utils.json_manager import JsonManager, AnnotationFileManager
-from utils.logger import log_method
+from utils.annotation_progress import AnnotationProgress
+from utils.dir_listing import list_images
+from utils.image_cache import ImageCache
+from utils.json_manager import get_annotation_manager
+from utils.tracing import traced, tracer
 from utils.paths import DATA_DIR
 
+# Размер Canvas разметки: картинки заранее уменьшаются до него
+DISPLAY_SIZE = (800, 600)
+
+
+@traced
+def load_display_image(image_path: str, display_size=DISPLAY_SIZE) -> Image.Image:
+    """Декодирует картинку и уменьшает её до размера Canvas.
+
+    JPEG декодируется сразу в уменьшенном виде (DCT-масштабирование через
+    `draft`), поэтому большие сканы не разжимаются целиком. Исходный размер
+    сохраняется в `info["original_size"]`, масштаб декодирования — в
+    `info["decode_scale"]`: ratio аннотаций считается относительно оригинала.
+    Для экспорта и обучения картинки по-прежнему читаются в полном размере.
+    """
+    image = Image.open(image_path)
+    original_size = image.size
+    ratio = min(display_size[0] / original_size[0], display_size[1] / original_size[1])
+    new_size = (int(original_size[0] * ratio), int(original_size[1] * ratio))
+    if ratio < 1:
+        # Декодер выберет наименьший масштаб 1/2, 1/4 или 1/8 не меньше new_size
+        image.draft(image.mode, new_size)
+    image.load()
+    decode_scale = image.size[0] / original_size[0]
+    if new_size != image.size:
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    image.info["original_size"] = original_size
+    image.info["decode_scale"] = decode_scale
+    return image
+
 
 class ImageLoader:
-    @log_method
-    def __init__(self, folder_path: str, annotated_path=None):
+    # Сколько картинок вперёд и назад готовить заранее
+    PREFETCH_AHEAD = 3
+
+    @traced
+    def __init__(self, folder_path: str, annotated_path=None, cache: Optional[ImageCache] = None):
         self.folder_path = folder_path
         self.image_files = self._get_image_files()
         self.current_index = -1
         self.annotated_path = annotated_path
 
+        self.cache = cache if cache is not None else ImageCache()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="image-prefetch")
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+
+        output_dir = DATA_DIR / "annotated_dataset"
+        annotation_manager = get_annotation_manager(os.path.join(output_dir, 'annotations.json'))
+        self.progress = AnnotationProgress(str(self.folder_path), self.image_files, annotation_manager)
+
         self.get_first_unannotated_image()
 
-    @log_method
     def _get_image_files(self) -> List[str]:
-        return list(sorted([
-            f for f in os.listdir(self.folder_path)
-            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))
-        ]))
+        # Листинг общий с окном разметки и статистикой, папка читается один раз
+        return list_images(self.folder_path)
 
-    @log_method
+    @traced
     def get_first_unannotated_image(self) -> None:
-        images_files = self._get_image_files()
-        output_dir = DATA_DIR / "annotated_dataset"
-        annotation_manager = AnnotationFileManager(os.path.join(output_dir, 'annotations.json'))
-
-        for i, image_file in enumerate(images_files):
-            if (str(self.folder_path) in annotation_manager.keys() and
-                    image_file not in annotation_manager[str(self.folder_path)].keys()):
-                self.current_index = i - 1
-                break
-            else:
-                if (str(self.folder_path) in annotation_manager.keys() and
-                        not annotation_manager[str(self.folder_path)][image_file]):
-                    self.current_index = i - 1
-                    break
-
-    @log_method
+        """Встаёт перед картинкой, с которой продолжать разметку."""
+        self.current_index = self.progress.resume_index() - 1
+
+    def next_unannotated_index(self) -> Optional[int]:
+        return self.progress.next_unannotated(self.current_index)
+
+    def prev_unannotated_index(self) -> Optional[int]:
+        return self.progress.prev_unannotated(self.current_index)
+
+    @traced
     def get_image(self, direction: str = "next") -> Optional[Image.Image]:
         if direction == "next":
             if self.current_index >= len(self.image_files) - 1:
@@ -58,14 +95,61 @@ class ImageLoader:
 
         return self._load_current_image()
 
-    @log_method
+    def _image_path(self, index: int) -> str:
+        return os.path.join(self.folder_path, self.image_files[index])
+
+    def _decode(self, image_path: str) -> Image.Image:
+        image = self.cache.get(image_path)
+        if image is None:
+            image = load_display_image(image_path)
+            self.cache.put(image_path, image)
+        return image
+
+    def _prefetch_task(self, image_path: str):
+        try:
+            return self._decode(image_path)
+        finally:
+            with self._pending_lock:
+                self._pending.pop(image_path, None)
+
+    def _prefetch_around(self, index: int):
+        """Готовит соседние картинки в фоне: сначала следующие, потом предыдущие."""
+        order = []
+        for step in range(1, self.PREFETCH_AHEAD + 1):
+            order += [index + step, index - step]
+        for i in order:
+            if not 0 <= i < len(self.image_files):
+                continue
+            image_path = self._image_path(i)
+            with self._pending_lock:
+                if image_path in self._pending or image_path in self.cache:
+                    continue
+                try:
+                    self._pending[image_path] = self._executor.submit(self._prefetch_task, image_path)
+                except RuntimeError:
+                    return  # загрузчик уже закрыт
+
+    @traced
     def _load_current_image(self) -> Optional[Image.Image]:
         if 0 <= self.current_index < len(self.image_files):
-            image_path = os.path.join(self.folder_path, self.image_files[self.current_index])
-            return Image.open(image_path)
+            image_path = self._image_path(self.current_index)
+            with self._pending_lock:
+                future = self._pending.get(image_path)
+            # Если картинка уже декодируется в фоне, ждём её, а не декодируем второй раз
+            image = future.result() if future is not None else self._decode(image_path)
+            self.progress.set_cursor(self.current_index)
+            self._prefetch_around(self.current_index)
+            return image
         return None
 
-    @log_method
+    def close(self):
+        """Останавливает фоновую подгрузку и сохраняет позицию разметки."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.progress.close()
+        if tracer.enabled:
+            print(f"[DEBUG] Кэш картинок: {self.cache.stats()}")
+
+    @traced
     def get_current_image_path(self) -> Optional[str]:
         if 0 <= self.current_index < len(self.image_files):
             path = self.image_files[self.current_index]
@@ -0,0 +1,207 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from utils.spatial_index import box_iou
+from utils.tracing import traced
+
+
+class RegionReader:
+    """Фрагменты одной картинки для уточнения рамок.
+
+    Если у картинки есть готовый уровень пирамиды тайлов нужного разрешения,
+    фрагмент собирается из тайлов. Иначе оригинал декодируется один раз и
+    хранится, пока рамки рисуются на этой же картинке: повторное
+    декодирование большого скана на каждую рамку не укладывается в бюджет.
+    """
+
+    def __init__(self, image_path: str, pyramid=None):
+        self.image_path = image_path
+        self.pyramid = pyramid
+        self._image = None
+        if pyramid is not None:
+            self.size = (pyramid.width, pyramid.height)
+        else:
+            with Image.open(image_path) as image:
+                self.size = image.size
+
+    def load(self):
+        """Декодирует оригинал заранее (из фонового потока)."""
+        if self._image is None:
+            with Image.open(self.image_path) as image:
+                self._image = image.convert("RGB")
+        return self._image
+
+    def read(self, region, max_side: int):
+        """Фрагмент в BGR и его масштаб (пикселей на пиксель оригинала).
+
+        Больше `max_side` пикселей по длинной стороне точности не добавляют.
+        """
+        region_width, region_height = region[2] - region[0], region[3] - region[1]
+        scale = min(1.0, max_side / max(region_width, region_height))
+        size = (max(int(round(region_width * scale)), 1), max(int(round(region_height * scale)), 1))
+        crop = None
+        if self.pyramid is not None:
+            level = self.pyramid.level_for_scale(scale)
+            if self.pyramid.is_ready(level):
+                crop = self.pyramid.render(level, region, (0, 0, *size))
+        if crop is None:
+            crop = self.load().resize(size, Image.Resampling.BILINEAR, box=tuple(region))
+
+        import cv2
+        return cv2.cvtColor(np.asarray(crop), cv2.COLOR_RGB2BGR), size[0] / region_width
+
+
+def _edges_extent(crop: np.ndarray, inner) -> Optional[List[int]]:
+    """Объединение контуров по краям, центры которых лежат внутри нарисованной рамки."""
+    import cv2
+    gray = cv2.GaussianBlur(cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+    median = float(np.median(gray))
+    edges = cv2.Canny(gray, int(max(0, 0.66 * median)), int(min(255, 1.33 * median)))
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    x1, y1, x2, y2 = inner
+    min_area = 0.01 * (x2 - x1) * (y2 - y1)
+    extent = None
+    for contour in contours:
+        cx, cy, cw, ch = cv2.boundingRect(contour)
+        center_x, center_y = cx + cw / 2, cy + ch / 2
+        if cw * ch < min_area or not (x1 <= center_x <= x2 and y1 <= center_y <= y2):
+            continue
+        rect = [cx, cy, cx + cw, cy + ch]
+        extent = rect if extent is None else [
+            min(extent[0], rect[0]), min(extent[1], rect[1]),
+            max(extent[2], rect[2]), max(extent[3], rect[3]),
+        ]
+    return extent
+
+
+def _grabcut_extent(crop: np.ndarray, inner) -> Optional[List[int]]:
+    """Рамка переднего плана после GrabCut, инициализированного нарисованной рамкой."""
+    import cv2
+    x1, y1, x2, y2 = (int(v) for v in inner)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return None
+    mask = np.zeros(crop.shape[:2], np.uint8)
+    background = np.zeros((1, 65), np.float64)
+    foreground = np.zeros((1, 65), np.float64)
+    cv2.grabCut(crop, mask, (x1, y1, x2 - x1, y2 - y1), background, foreground, 3, cv2.GC_INIT_WITH_RECT)
+    ys, xs = np.nonzero((mask == cv2.GC_FGD) | (mask == cv2.GC_PR_FGD))
+    if not len(xs):
+        return None
+    return [int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1]
+
+
+@traced
+def refine_box(image_path: str, box: Sequence[float], method: str = "edges",
+               margin: float = 0.15, max_side: int = 384, min_iou: float = 0.5,
+               reader: Optional[RegionReader] = None) -> Optional[List[float]]:
+    """Подгоняет рамку (координаты оригинала) к границам объекта.
+
+    Берётся окрестность рамки с запасом `margin`, края ищутся Canny и
+    контурами (`method="edges"`) или GrabCut (`method="grabcut"`). Если
+    результат слишком далёк от нарисованной рамки (IoU < `min_iou`),
+    возвращается None. `reader` позволяет не декодировать картинку заново
+    для каждой рамки.
+    """
+    x1, y1, x2, y2 = min(box[0], box[2]), min(box[1], box[3]), max(box[0], box[2]), max(box[1], box[3])
+    margin_x, margin_y = (x2 - x1) * margin, (y2 - y1) * margin
+    reader = reader or RegionReader(image_path)
+    width, height = reader.size
+    region = (max(x1 - margin_x, 0), max(y1 - margin_y, 0), min(x2 + margin_x, width), min(y2 + margin_y, height))
+    if region[2] <= region[0] or region[3] <= region[1]:
+        return None
+    crop, scale = reader.read(region, max_side)
+    inner = ((x1 - region[0]) * scale, (y1 - region[1]) * scale, (x2 - region[0]) * scale, (y2 - region[1]) * scale)
+    extent = _grabcut_extent(crop, inner) if method == "grabcut" else _edges_extent(crop, inner)
+    if extent is None:
+        return None
+
+    refined = [
+        extent[0] / scale + region[0], extent[1] / scale + region[1],
+        extent[2] / scale + region[0], extent[3] / scale + region[1],
+    ]
+    if box_iou(refined, [x1, y1, x2, y2]) < min_iou:
+        return None
+    return refined
+
+
+class BoxRefiner:
+    """Уточнение рамок в фоновом потоке с бюджетом задержки.
+
+    Результат, опоздавший больше чем на `budget` секунд с момента запроса
+    (включая ожидание в очереди), отбрасывается: рамка остаётся как нарисована.
+    Картинку стоит подготовить заранее через `prepare()` при её открытии.
+    Счётчики исходов доступны через `stats()`.
+    """
+
+    LATENCY_BUDGET = 0.5
+
+    def __init__(self, method: str = "edges", budget: float = LATENCY_BUDGET):
+        self.method = method
+        self.budget = budget
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="box-refine")
+        # Пишет только рабочий поток
+        self._stats = {"refined": 0, "unchanged": 0, "over_budget": 0, "errors": 0}
+        self._reader = None
+
+    def _reader_for(self, image_path: str, pyramid=None) -> RegionReader:
+        # Вызывается только из рабочего потока
+        reader = self._reader
+        if reader is None or reader.image_path != image_path:
+            reader = self._reader = RegionReader(image_path, pyramid)
+        elif pyramid is not None:
+            reader.pyramid = pyramid
+        return reader
+
+    def prepare(self, image_path: str, pyramid=None):
+        """Заранее декодирует картинку, на которой будут рисоваться рамки."""
+        def run():
+            try:
+                self._reader_for(image_path, pyramid).load()
+            except Exception as e:
+                print(f"Ошибка подготовки картинки для уточнения: {e}")
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            pass  # уточнение уже выключено
+
+    def refine(self, image_path: str, box: Sequence[float], callback: Callable[[Optional[List[float]]], None],
+               pyramid=None):
+        """Вызывает `callback(уточнённая рамка или None)` из фонового потока."""
+        submitted = time.monotonic()
+
+        def run():
+            try:
+                refined = refine_box(image_path, box, self.method, reader=self._reader_for(image_path, pyramid))
+            except Exception as e:
+                print(f"Ошибка уточнения рамки: {e}")
+                self._stats["errors"] += 1
+                callback(None)
+                return
+            if refined is None:
+                self._stats["unchanged"] += 1
+            elif time.monotonic() - submitted > self.budget:
+                self._stats["over_budget"] += 1
+                refined = None
+            else:
+                self._stats["refined"] += 1
+            callback(refined)
+
+        try:
+            self._executor.submit(run)
+        except RuntimeError:
+            callback(None)  # уточнение уже выключено
+
+    def stats(self) -> dict:
+        """Сколько рамок уточнено, оставлено как есть, отброшено по бюджету и с ошибкой."""
+        return dict(self._stats)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._reader = None
@@ -0,0 +1,157 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from PIL import Image
+
+from utils.tracing import span, traced
+
+Carried = Dict[str, object]
+
+# Насколько могут отличаться пропорции сканов, чтобы свести их к одной сетке
+ASPECT_TOLERANCE = 0.02
+
+
+def _load_gray(image_path: str, max_side: int, size=None, scale=None):
+    """Картинка в оттенках серого и размер оригинала.
+
+    Рабочий размер — ровно `size`, либо оригинал, умноженный на `scale`,
+    либо не больше `max_side` по длинной стороне.
+    """
+    with Image.open(image_path) as image:
+        original_size = image.size
+        if size is None:
+            if scale is None:
+                scale = min(1.0, max_side / max(original_size))
+            size = (max(int(original_size[0] * scale), 1), max(int(original_size[1] * scale), 1))
+        image.draft("L", size)
+        gray = image.convert("L")
+        if gray.size != size:
+            gray = gray.resize(size, Image.Resampling.BILINEAR)
+    return np.asarray(gray), original_size
+
+
+def match_box(previous: np.ndarray, current: np.ndarray, box: Sequence[float],
+              expected: Optional[Sequence[float]] = None, search: float = 0.5,
+              scales: Sequence[float] = (0.9, 0.95, 1.0, 1.05, 1.1)):
+    """Ищет фрагмент `box` предыдущей картинки на текущей (координаты рабочего масштаба).
+
+    Поиск идёт только в окне вокруг ожидаемого положения `expected` (по
+    умолчанию — прежнего, `search` — запас в долях размера рамки) и на
+    нескольких масштабах шаблона. Возвращает (рамка, оценка TM_CCOEFF_NORMED)
+    или None.
+    """
+    import cv2
+    x1, y1, x2, y2 = (int(round(v)) for v in box)
+    x1, y1 = max(x1, 0), max(y1, 0)
+    x2, y2 = min(x2, previous.shape[1]), min(y2, previous.shape[0])
+    if x2 - x1 < 4 or y2 - y1 < 4:
+        return None
+    template = previous[y1:y2, x1:x2]
+    if float(template.std()) < 1.0:
+        return None  # однотонный фрагмент совпадёт где угодно
+
+    ex1, ey1, ex2, ey2 = (int(round(v)) for v in expected) if expected is not None else (x1, y1, x2, y2)
+    pad_x, pad_y = int((x2 - x1) * search) + 4, int((y2 - y1) * search) + 4
+    wx1, wy1 = max(ex1 - pad_x, 0), max(ey1 - pad_y, 0)
+    wx2, wy2 = min(ex2 + pad_x, current.shape[1]), min(ey2 + pad_y, current.shape[0])
+    window = current[wy1:wy2, wx1:wx2]
+
+    best = None
+    for scale in scales:
+        width, height = int(round((x2 - x1) * scale)), int(round((y2 - y1) * scale))
+        if width < 4 or height < 4 or width > window.shape[1] or height > window.shape[0]:
+            continue
+        scaled = template if scale == 1.0 else cv2.resize(template, (width, height), interpolation=cv2.INTER_AREA)
+        result = cv2.matchTemplate(window, scaled, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(result)
+        if best is None or score > best[1]:
+            best = ([wx1 + mx, wy1 + my, wx1 + mx + width, wy1 + my + height], float(score))
+    return best
+
+
+@traced
+def carry_forward(previous_path: str, current_path: str, annotations: Sequence[Carried],
+                  executor: ThreadPoolExecutor, threshold: float = 0.6, max_side: int = 1024) -> List[Carried]:
+    """Переносит рамки предыдущей картинки на текущую.
+
+    `annotations` — `{"coords": [x1, y1, x2, y2], "text": метка}` в координатах
+    оригинала предыдущей картинки. Рамки сопоставляются параллельно в
+    `executor` (OpenCV отпускает GIL); совпадения с оценкой ниже `threshold`
+    пропускаются. Результат — такие же словари с `"score"` в координатах
+    оригинала текущей картинки.
+
+    Сканы почти одних пропорций (в пределах `ASPECT_TOLERANCE`) сводятся к
+    одной сетке. Иначе текущая картинка берётся в том же масштабе, что и
+    предыдущая, без искажения шаблонов, а ожидаемое место рамки
+    пересчитывается по каждой оси отдельно.
+    """
+    with span("carry_forward.load"):
+        previous, previous_size = _load_gray(previous_path, max_side)
+        size = (previous.shape[1], previous.shape[0])
+        with Image.open(current_path) as image:
+            current_size = image.size
+        aspect = (previous_size[0] / previous_size[1]) / (current_size[0] / current_size[1])
+        if abs(aspect - 1) <= ASPECT_TOLERANCE:
+            current, current_size = _load_gray(current_path, max_side, size=size)
+        else:
+            current, current_size = _load_gray(current_path, max_side, scale=size[0] / previous_size[0])
+    to_work = (size[0] / previous_size[0], size[1] / previous_size[1])
+    # Ожидаемое место рамки: те же доли ширины и высоты текущей картинки
+    to_expected = (current.shape[1] / size[0], current.shape[0] / size[1])
+    to_current = (current_size[0] / current.shape[1], current_size[1] / current.shape[0])
+
+    def run(annotation):
+        x1, y1, x2, y2 = annotation["coords"]
+        box = [x1 * to_work[0], y1 * to_work[1], x2 * to_work[0], y2 * to_work[1]]
+        expected = [box[0] * to_expected[0], box[1] * to_expected[1], box[2] * to_expected[0], box[3] * to_expected[1]]
+        return match_box(previous, current, box, expected)
+
+    carried = []
+    for annotation, match in zip(annotations, executor.map(run, annotations)):
+        if match is None or match[1] < threshold:
+            continue
+        (x1, y1, x2, y2), score = match
+        carried.append({
+            "coords": [x1 * to_current[0], y1 * to_current[1], x2 * to_current[0], y2 * to_current[1]],
+            "text": annotation["text"],
+            "score": score,
+        })
+    return carried
+
+
+class CarryForward:
+    """Перенос разметки с предыдущей картинки в фоне.
+
+    Один поток ведёт задачу (загрузка картинок, сбор результата), рамки
+    сопоставляются пулом из нескольких потоков.
+    """
+
+    def __init__(self, threshold: float = 0.6, workers: Optional[int] = None):
+        self.threshold = threshold
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="carry-forward")
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers or min(4, os.cpu_count() or 1),
+            thread_name_prefix="carry-forward-match"
+        )
+
+    def run(self, previous_path: str, current_path: str, annotations: Sequence[Carried],
+            callback: Callable[[str, Optional[List[Carried]]], None]):
+        """Вызывает `callback(путь текущей картинки, рамки или None)` из фонового потока."""
+        def task():
+            try:
+                carried = carry_forward(previous_path, current_path, annotations, self._pool, self.threshold)
+            except Exception as e:
+                print(f"Ошибка переноса разметки: {e}")
+                carried = None
+            callback(current_path, carried)
+
+        try:
+            self._executor.submit(task)
+        except RuntimeError:
+            callback(current_path, None)  # окно разметки уже закрыто
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._pool.shutdown(wait=False, cancel_futures=True)
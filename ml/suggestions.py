@@ -0,0 +1,226 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Union
+
+from utils.annotation_storage import atomic_write_json
+from utils.paths import DATA_DIR
+
+SUGGESTIONS_DIR = DATA_DIR / ".suggestions"
+
+Proposal = Dict[str, object]
+
+
+def file_sha1(path: Union[str, Path], chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class SuggestionEngine:
+    """Предразметка моделью YOLO из `DATA_DIR/models` в фоновом потоке.
+
+    Предложения — рамки в координатах оригинала с классом и уверенностью:
+    `{"coords": [x1, y1, x2, y2], "text": класс, "score": уверенность}`.
+    Они кэшируются в памяти и на диске по паре (хэш модели, хэш картинки),
+    поэтому копия датасета или повторное открытие модель не запускают.
+    Модель загружается в рабочем потоке только при первом промахе кэша;
+    поток один, так что текущая картинка обрабатывается раньше подгружаемых
+    заранее.
+
+    В папке кэша модели лежит `model.txt` с путём, mtime и размером файла
+    модели. При первом обращении папки моделей, которых больше нет или
+    которые переобучены, удаляются, а в папке текущей модели остаются
+    `DISK_CACHE_SIZE` самых свежих записей.
+    """
+
+    # Сколько картинок держать в памяти (остальное — на диске)
+    MEMORY_CACHE_SIZE = 256
+    # Сколько хэшей картинок помнить по (путь, mtime, размер)
+    IMAGE_HASHES_SIZE = 4096
+    # Сколько записей хранить на диске для одной модели
+    DISK_CACHE_SIZE = 20000
+
+    def __init__(self, model_path: Union[str, Path], conf: float = 0.25):
+        self.model_path = Path(model_path)
+        self.conf = conf
+        self._model = None
+        self._model_hash = None
+        self._memory: "OrderedDict[str, List[Proposal]]" = OrderedDict()
+        self._image_hashes: "OrderedDict[tuple, str]" = OrderedDict()
+        self._pending = {}
+        self._prefetched = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="suggestions")
+
+    def _image_hash(self, image_path: str) -> str:
+        stat = os.stat(image_path)
+        key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+        image_hash = self._image_hashes.get(key)
+        if image_hash is None:
+            image_hash = self._image_hashes[key] = file_sha1(image_path)
+            while len(self._image_hashes) > self.IMAGE_HASHES_SIZE:
+                self._image_hashes.popitem(last=False)
+        else:
+            self._image_hashes.move_to_end(key)
+        return image_hash
+
+    def _cache_path(self, image_hash: str) -> Path:
+        return SUGGESTIONS_DIR / self._model_hash / f"{image_hash}.json"
+
+    @staticmethod
+    def _model_key(model_path: Union[str, Path]) -> Optional[str]:
+        try:
+            stat = os.stat(model_path)
+        except OSError:
+            return None
+        return f"{os.path.abspath(model_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+
+    def _prune_disk_cache(self):
+        """Удаляет кэш удалённых и переобученных моделей, ограничивает кэш текущей."""
+        current = SUGGESTIONS_DIR / self._model_hash
+        try:
+            current.mkdir(parents=True, exist_ok=True)
+            (current / "model.txt").write_text(self._model_key(self.model_path) or "", encoding="utf-8")
+            model_dirs = [path for path in SUGGESTIONS_DIR.iterdir() if path.is_dir()]
+        except OSError as e:
+            print(f"Не удалось очистить кэш подсказок: {e}")
+            return
+
+        for model_dir in model_dirs:
+            if model_dir == current:
+                continue
+            try:
+                key = (model_dir / "model.txt").read_text(encoding="utf-8")
+            except OSError:
+                key = ""
+            model_path = key.rsplit("|", 2)[0]
+            if not key or self._model_key(model_path) != key:
+                shutil.rmtree(model_dir, ignore_errors=True)
+
+        entries = []
+        for entry in os.scandir(current):
+            if entry.name.endswith(".json"):
+                try:
+                    entries.append((entry.stat().st_mtime_ns, entry.path))
+                except OSError:
+                    pass
+        if len(entries) > self.DISK_CACHE_SIZE:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.DISK_CACHE_SIZE]:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def _load_model(self):
+        if self._model is None:
+            from ultralytics import YOLO
+            self._model = YOLO(self.model_path)
+        return self._model
+
+    def _remember(self, image_hash: str, proposals: List[Proposal]):
+        self._memory[image_hash] = proposals
+        self._memory.move_to_end(image_hash)
+        while len(self._memory) > self.MEMORY_CACHE_SIZE:
+            self._memory.popitem(last=False)
+
+    def _predict(self, image_path: str) -> List[Proposal]:
+        if self._model_hash is None:
+            self._model_hash = file_sha1(self.model_path)
+            self._prune_disk_cache()
+        image_hash = self._image_hash(image_path)
+        proposals = self._memory.get(image_hash)
+        if proposals is not None:
+            self._memory.move_to_end(image_hash)
+            return proposals
+
+        cache_path = self._cache_path(image_hash)
+        try:
+            with open(cache_path, "r", encoding="utf-8") as file:
+                proposals = json.load(file)
+        except (OSError, ValueError):
+            result = self._load_model().predict(image_path, conf=self.conf, verbose=False)[0]
+            boxes = result.boxes
+            proposals = [
+                {
+                    "coords": [float(v) for v in xyxy],
+                    "text": str(result.names[int(cls)]),
+                    "score": float(score),
+                }
+                for xyxy, cls, score in zip(boxes.xyxy.tolist(), boxes.cls.tolist(), boxes.conf.tolist())
+            ]
+            try:
+                cache_path.parent.mkdir(parents=True, exist_ok=True)
+                atomic_write_json(cache_path, proposals, indent=None)
+            except OSError as e:
+                print(f"Не удалось сохранить подсказки: {e}")
+
+        self._remember(image_hash, proposals)
+        return proposals
+
+    def _run(self, image_path: str):
+        try:
+            proposals = self._predict(image_path)
+        except Exception as e:
+            print(f"Ошибка предразметки {image_path}: {e}")
+            proposals = None
+        with self._lock:
+            callbacks = self._pending.pop(image_path, [])
+            self._prefetched.pop(image_path, None)
+        for callback in callbacks:
+            callback(image_path, proposals)
+        return proposals
+
+    def _submit(self, image_path: str, callback=None) -> bool:
+        with self._lock:
+            callbacks = self._pending.get(image_path)
+            if callbacks is not None:
+                if callback is not None:
+                    callbacks.append(callback)
+                    # Картинку ждут — её подгрузку больше не отменяем
+                    self._prefetched.pop(image_path, None)
+                return False
+            self._pending[image_path] = [callback] if callback is not None else []
+            try:
+                future = self._executor.submit(self._run, image_path)
+            except RuntimeError:
+                self._pending.pop(image_path, None)
+                return False  # движок уже закрыт
+            if callback is None:
+                self._prefetched[image_path] = future
+            return True
+
+    def request(self, image_path: Union[str, Path],
+                callback: Callable[[str, Optional[List[Proposal]]], None]):
+        """Вызывает `callback(путь, предложения или None)` из фонового потока."""
+        self._submit(str(image_path), callback)
+
+    def prefetch(self, image_paths: Iterable[Union[str, Path]]):
+        """Считает предложения заранее; ещё не начатую подгрузку других картинок отменяет."""
+        wanted = [str(path) for path in image_paths]
+        with self._lock:
+            for path, future in list(self._prefetched.items()):
+                if path not in wanted and future.cancel():
+                    self._prefetched.pop(path, None)
+                    self._pending.pop(path, None)
+        for path in wanted:
+            self._submit(path)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def available_models() -> List[str]:
+    """Модели в `DATA_DIR/models` (как в списке моделей главного окна)."""
+    models_dir = DATA_DIR / "models"
+    if not models_dir.exists():
+        return []
+    return sorted(f.name for f in models_dir.glob("*.pt"))
@@ -3,7 +3,6 @@ import shutil
 import urllib.request
 
 import yaml
-import json
 from pathlib import Path
 from sklearn.model_selection import train_test_split
 import cv2
@@ -13,6 +12,7 @@ import random
 from PIL import Image, ImageDraw, ImageFont
 
 
+from utils.json_manager import get_annotation_manager
 from utils.paths import DATA_DIR
 import re
 
@@ -62,7 +62,7 @@ def prepare_yolo_dataset(
     Полностью подготавливает датасет для YOLO из JSON-аннотаций.
 
     Параметры:
-        json_path (str): Путь к JSON-файлу с метками.
+        json_path (str): Путь к annotations.json (хранилище выбирает AnnotationFileManager).
         images_source_dir (str): Папка с исходными изображениями.
         output_base_dir (str): Базовая папка для выходных данных (по умолчанию 'data').
         class_names (list): Список классов (например, ['cat', 'dog']). Если None, будет извлечен из JSON.
@@ -86,12 +86,14 @@ def prepare_yolo_dataset(
     for d in dirs.values():
         os.makedirs(d, exist_ok=True)
 
-    # Загружаем JSON-данные
-    with open(json_path) as f:
-        data = json.load(f)
-
     output_dir = DATA_DIR / "annotated_dataset"
 
+    # Загружаем только шарды выбранных датасетов
+    annotation_manager = get_annotation_manager(json_path)
+    folders = [str(output_dir / dir_name) for dir_name in dir_names]
+    data = {folder: annotation_manager.get_folder_info(folder) for folder in folders}
+    table = annotation_manager.annotation_table(folders)
+
     # Собираем все изображения
     all_images = []
     for dir_name in dir_names:
@@ -130,7 +132,7 @@ def prepare_yolo_dataset(
                     os.symlink(os.path.abspath(img_path), target_img_path)
 
                 # Обработка меток
-                labels = data[folder_name][img_name]
+                boxes, labels = table.image_boxes(folder_name, img_name)
                 txt_filename = Path(img_name).stem + ".txt"
                 txt_path = os.path.join(target_label_dir, txt_filename)
 
@@ -139,25 +141,16 @@ def prepare_yolo_dataset(
                     raise ValueError(f"Не удалось загрузить изображение: {img_path}")
                 h, w = img.shape[:2]
 
-                with open(txt_path, 'w') as f:
-                    for label in labels:
-                        x1, y1, x2, y2 = label['coords']
-                        class_name = label['text']
-                        ratio = label.get('ratio', 1.0)
+                # Конвертация в YOLO-формат сразу для всех рамок картинки
+                yolo_boxes = table.to_yolo(boxes, w, h)
 
+                with open(txt_path, 'w') as f:
+                    for class_name, (center_x, center_y, width, height) in zip(labels, yolo_boxes):
                         # Проверка класса
                         if class_names and class_name not in class_names:
                             # Игнорируем остальные классы
                             continue
 
-                        # Конвертация в YOLO-формат
-                        x1, y1, x2, y2 = [x / ratio for x in [x1, y1, x2, y2]]
-                        # x1, y1, x2, y2 = min(x1, w), min(y1, h), min(x2, w), min(y2, h)
-                        center_x = max(min(((x1 + x2) / 2) / w, 1.0), 0.0)
-                        center_y = max(min(((y1 + y2) / 2) / h, 1.0), 0.0)
-                        width = max(min((x2 - x1) / w, 1.0), 0.0)
-                        height = max(min((y2 - y1) / h, 1.0), 0.0)
-
                         class_id = class_names.index(class_name) if class_names else 0
                         f.write(f"{class_id} {center_x:.6f} {center_y:.6f} {width:.6f} {height:.6f}\n")
 
@@ -173,12 +166,9 @@ def prepare_yolo_dataset(
 
     # Автоматическое определение классов, если не заданы
     if class_names is None:
-        class_names = sorted(list(set(
-            label['text']
-            for folder_data in data.values()
-            for img_labels in folder_data.values()
-            for label in img_labels
-        )))
+        # Классы берём из всех датасетов, а не только выбранных: номера классов
+        # должны совпадать между обучениями на разных наборах папок
+        class_names = annotation_manager.annotation_table().class_names()
         logging.info(f"Автоопределенные классы: {class_names}")
 
     # Создаем / Обновляем data.yaml
@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from utils.annotation_storage import (
+    SHARDS_DIR_NAME,
+    ShardedAnnotationStorage,
+    SqliteAnnotationStorage,
+    open_sharded_storage,
+)
+
+
+def _images(text):
+    return {"1.jpg": [{"id": f"{text}-1", "coords": [1, 2, 30, 40], "text": text, "ratio": 1.0}]}
+
+
+def _write_json(path, data):
+    path.write_text(json.dumps(data), encoding="utf-8")
+
+
+def test_migrates_json_and_rewrites_old_root(tmp_path):
+    # Ключи от прежнего расположения DATA_DIR переносятся на текущий root
+    _write_json(tmp_path / "annotations.json", {
+        "/old/data/annotated_dataset/first": _images("герб"),
+        str(tmp_path / "second"): _images("печать"),
+    })
+
+    storage = open_sharded_storage(tmp_path / "annotations.json")
+
+    assert sorted(storage.folders()) == sorted([str(tmp_path / "first"), str(tmp_path / "second")])
+    assert storage.load_folder(str(tmp_path / "first")) == _images("герб")
+    assert storage.load_folder(str(tmp_path / "second")) == _images("печать")
+    assert not (tmp_path / (SHARDS_DIR_NAME + ".tmp")).exists()
+
+
+def test_migrates_sqlite_before_json(tmp_path):
+    _write_json(tmp_path / "annotations.json", {str(tmp_path / "stale"): _images("старое")})
+    source = SqliteAnnotationStorage(tmp_path / "annotations.sqlite3")
+    source.write_folder("/old/data/annotated_dataset/first", _images("герб"))
+    source.close()
+
+    storage = open_sharded_storage(tmp_path / "annotations.json")
+
+    assert storage.folders() == [str(tmp_path / "first")]
+    assert storage.load_folder(str(tmp_path / "first")) == _images("герб")
+
+
+def test_failed_migration_leaves_no_shards_and_retries(tmp_path):
+    json_path = tmp_path / "annotations.json"
+    # Остатки прерванной миграции должны быть выброшены
+    stale_dir = tmp_path / (SHARDS_DIR_NAME + ".tmp")
+    stale_dir.mkdir()
+    (stale_dir / "garbage.json").write_text("{", encoding="utf-8")
+    # Две папки с одним именем шарда — миграция прерывается
+    _write_json(json_path, {"/a/first": _images("герб"), "/b/first": _images("печать")})
+
+    with pytest.raises(ValueError):
+        open_sharded_storage(json_path)
+    assert not (tmp_path / SHARDS_DIR_NAME).exists()
+
+    _write_json(json_path, {"/a/first": _images("герб")})
+    storage = open_sharded_storage(json_path)
+
+    assert storage.load_folder(str(tmp_path / "first")) == _images("герб")
+    assert not stale_dir.exists()
+    assert not (tmp_path / SHARDS_DIR_NAME / "garbage.json").exists()
+
+
+def test_existing_shards_are_not_migrated_again(tmp_path):
+    json_path = tmp_path / "annotations.json"
+    _write_json(json_path, {"/a/first": _images("герб")})
+    open_sharded_storage(json_path)
+
+    _write_json(json_path, {"/a/second": _images("печать")})
+    storage = open_sharded_storage(json_path)
+
+    assert storage.folders() == [str(tmp_path / "first")]
+
+
+def test_rejects_folders_outside_root(tmp_path):
+    storage = ShardedAnnotationStorage(tmp_path, tmp_path / SHARDS_DIR_NAME)
+
+    with pytest.raises(ValueError):
+        storage.write_folder(str(tmp_path / "nested" / "first"), _images("герб"))
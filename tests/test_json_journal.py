@@ -0,0 +1,46 @@
+import json
+
+from utils.json_journal import replay_journal
+from utils.json_manager import JsonManager
+
+
+def _write_journal(path, records, torn_tail):
+    lines = [json.dumps(record, ensure_ascii=False) for record in records]
+    path.write_text("\n".join(lines) + "\n" + torn_tail, encoding="utf-8")
+
+
+def test_replay_skips_torn_last_record(tmp_path):
+    journal_path = tmp_path / "blazons.json.journal"
+    _write_journal(journal_path, [
+        {"op": "set", "path": ["герб", "color"], "value": "red"},
+        {"op": "del", "path": ["old"]},
+    ], torn_tail='{"op": "set", "path": ["герб", "col')
+
+    data = replay_journal(journal_path, {"old": 1, "other": 2})
+
+    assert data == {"other": 2, "герб": {"color": "red"}}
+
+
+def test_leftover_journal_is_absorbed_into_base_file(tmp_path):
+    file_path = tmp_path / "blazons.json"
+    file_path.write_text(json.dumps({"other": 2}), encoding="utf-8")
+    journal_path = tmp_path / "blazons.json.journal"
+    _write_journal(journal_path, [
+        {"op": "set", "path": ["герб"], "value": {"color": "red"}},
+    ], torn_tail='{"op": "del", "pa')
+
+    manager = JsonManager(file_path)
+
+    assert manager.data == {"other": 2, "герб": {"color": "red"}}
+    assert not journal_path.exists()
+    assert json.loads(file_path.read_text(encoding="utf-8")) == manager.data
+
+
+def test_journal_is_compacted_on_close(tmp_path):
+    file_path = tmp_path / "blazons.json"
+    manager = JsonManager(file_path, journal=True)
+    manager.set_path(["герб", "color"], "red")
+    manager.close()
+
+    assert not manager.journal_path.exists()
+    assert json.loads(file_path.read_text(encoding="utf-8")) == {"герб": {"color": "red"}}
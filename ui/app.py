@@ -1,3 +1,4 @@
+import copy
 import os
 import shutil
 import sys
@@ -17,9 +18,15 @@ import yaml
 from data_processing.annotation_popover import AnnotationPopover, get_unique_folder_name
 from utils.dataset_deleter import DatasetDeleter
 from utils.dataset_download import download_dataset_with_notification
-from utils.json_manager import JsonManager, AnnotationFileManager
-
-from utils.paths import DATA_DIR
+from utils.json_manager import get_json_manager, get_annotation_manager, registry
+from utils.dataset_stats import get_dataset_stats
+from utils.thumbnail_cache import get_thumbnail_cache
+from utils.dir_listing import list_images
+from utils.tracing import tracer
+from ui.canvas import post_to_tk
+from ui.dataset_gallery import VirtualDatasetGallery
+
+from utils.paths import DATA_DIR, get_dataset_folders
 from utils.errors import FolderLoadError, NoImagesError
 
 # Импорты для ML компонентов (загружаются при инициализации приложения)
@@ -87,9 +94,37 @@ class ImageAnnotationApp:
         self.deleter_test = DatasetDeleter(self.root, test_dataset=True)
         self.root.bind("<<RefreshDatasets>>", lambda e: self.get_annotated_datasets())
         self.root.bind("<<RefreshTestedDatasets>>", lambda e: self.get_tested_datasets())
+        # F12 включает/выключает трассировку, действует и в окне разметки
+        self.root.bind_all("<F12>", lambda e: self._toggle_tracing())
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
+    def _export_trace(self):
+        path = DATA_DIR / "logs" / f"trace-{datetime.now():%Y%m%d-%H%M%S}.json"
+        try:
+            tracer.export_chrome_trace(path)
+            print(f"[DEBUG] Трасса ({len(tracer)} интервалов) сохранена в {path}")
+        except OSError as e:
+            print(f"Не удалось сохранить трассу: {e}")
+        tracer.clear()
+
+    def _toggle_tracing(self):
+        """Включает трассировку; при выключении выгружает трассу в logs/."""
+        if tracer.enabled:
+            tracer.disable()
+            self._export_trace()
+        else:
+            tracer.clear()
+            tracer.enable()
+            print("[DEBUG] Трассировка включена (F12 — остановить и сохранить)")
+
     def on_close(self):
+        # Дописываем отложенную разметку до закрытия окна
+        registry.flush_all()
+        if tracer.enabled:
+            tracer.disable()
+            self._export_trace()
+        if (DATA_DIR / "annotated_dataset").exists():
+            get_dataset_stats(DATA_DIR / "annotated_dataset").save()
         try:
             if self.root.master:
                 self.root.master.quit()
@@ -201,17 +236,20 @@ class ImageAnnotationApp:
         v_scroll = tk.Scrollbar(left_container, orient="vertical", command=self.canvas.yview)
         self.canvas.configure(xscrollcommand=h_scroll.set, yscrollcommand=v_scroll.set)
 
-        # Фрейм для содержимого внутри Canvas
-        self.scrollable_frame = tk.Frame(self.canvas, bg="white")
-        self.canvas.create_window((0, 0), window=self.scrollable_frame, anchor="nw")
-
         # Упаковка скроллбаров и canvas
         h_scroll.pack(side=tk.BOTTOM, fill=tk.X)
         v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
         self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
 
-        # Виджеты датасетов
-        self.annotated_datasets = []
+        # Виртуальная галерея датасетов
+        self.selected_datasets = set()  # Для хранения выбранных датасетов
+        self.gallery = VirtualDatasetGallery(
+            self,
+            self.canvas,
+            v_scroll,
+            self._create_datasets_toolbar(),
+            self._describe_dataset
+        )
         self.get_annotated_datasets()
 
         self.tested_datasets = []
@@ -605,13 +643,10 @@ class ImageAnnotationApp:
         class_vars = {}
 
         output_dir = DATA_DIR / "annotated_dataset"
-        annotation_manager = AnnotationFileManager(os.path.join(output_dir, 'annotations.json'))
+        annotation_manager = get_annotation_manager(os.path.join(output_dir, 'annotations.json'))
 
-        classes = set()
-        for dataset in self.selected_datasets:
-            for anns in annotation_manager[str(output_dir / dataset.name)].values():
-                for ann in anns:
-                    classes.add(ann['text'])
+        folders = [str(output_dir / dataset.name) for dataset in self.selected_datasets]
+        classes = annotation_manager.annotation_table(folders).class_names(folders)
         for i, class_name in enumerate(classes):
             var = tk.BooleanVar(value=True)
             cb = tk.Checkbutton(classes_frame, text=class_name, variable=var)
@@ -1276,14 +1311,10 @@ class ImageAnnotationApp:
         class_vars = {}
 
         output_dir = DATA_DIR / "annotated_dataset"
-        annotation_manager = AnnotationFileManager(os.path.join(output_dir, 'annotations.json'))
-
-        classes = set()
-        for dataset in self.selected_datasets:
-            if annotation_manager[str(output_dir / dataset.name)]:
-                for anns in annotation_manager[str(output_dir / dataset.name)].values():
-                    for ann in anns:
-                        classes.add(ann['text'])
+        annotation_manager = get_annotation_manager(os.path.join(output_dir, 'annotations.json'))
+
+        folders = [str(output_dir / dataset.name) for dataset in self.selected_datasets]
+        classes = annotation_manager.annotation_table(folders).class_names(folders)
         for i, class_name in enumerate(classes):
             var = tk.BooleanVar(value=True)
             cb = tk.Checkbutton(classes_frame, text=class_name, variable=var)
@@ -1398,7 +1429,7 @@ class ImageAnnotationApp:
             return
         output_dir = DATA_DIR / "annotated_dataset"
         sub_folders = [f for f in test_dir.iterdir() if f.is_dir()]
-        json_manager = JsonManager(os.path.join(output_dir, 'hash_to_name.json'))
+        json_manager = get_json_manager(os.path.join(output_dir, 'hash_to_name.json'))
 
         # Параметры сетки
         ITEMS_PER_ROW = 3
@@ -1450,26 +1481,15 @@ class ImageAnnotationApp:
             img_container.pack_propagate(False)
 
             # Загрузка превью изображения
-            image_files = list(
-                sorted(
-                    list(images_folder.glob("*.jpg")) +
-                    list(images_folder.glob("*.jpeg")) +
-                    list(images_folder.glob("*.png")) +
-                    list(images_folder.glob("*.gif"))
-                )
-            )
+            image_files = [images_folder / name for name in list_images(images_folder)] if images_folder.exists() else []
 
             if image_files:
                 try:
-                    from PIL import Image, ImageTk
-                    img = Image.open(image_files[0])
-                    img.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
-                    photo = ImageTk.PhotoImage(img)
-
-                    img_label = tk.Label(img_container, image=photo, bg="white", cursor="hand")
-                    img_label.image = photo
-                    img_label.pack()
-                    img_label.bind("<Button-1>", lambda _, s=images_folder: self._open_dataset(s))
+                    self._show_preview(
+                        img_container,
+                        image_files[0],
+                        lambda _, s=images_folder: self._open_dataset(s)
+                    )
                 except Exception as e:
                     print(f"Ошибка загрузки изображения: {e}")
                     no_img = tk.Label(img_container, text="No preview", bg="white", fg="gray")
@@ -1626,23 +1646,9 @@ class ImageAnnotationApp:
         # Выполняем обновление в основном потоке
         self.root.after(0, update)
 
-    def get_annotated_datasets(self):
-        output_dir = DATA_DIR / "annotated_dataset"
-
-        # Очищаем предыдущие датасеты
-        for dataset in self.annotated_datasets:
-            dataset.destroy()
-        self.annotated_datasets = []
-        self.selected_datasets = set()  # Для хранения выбранных датасетов
-
-        if not output_dir.exists():
-            return
-
-        self.scrollable_frame.bind("<Configure>", lambda _: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-
-        # Панель инструментов
-        toolbar = tk.Frame(self.scrollable_frame, bg="#f0f0f0")
-        toolbar.grid(row=0, column=0, columnspan=4, sticky="ew", pady=(0, 10), padx=5)
+    def _create_datasets_toolbar(self):
+        """Панель инструментов над галереей датасетов"""
+        toolbar = tk.Frame(self.canvas, bg="#f0f0f0")
 
         merge_btn = tk.Button(
             toolbar,
@@ -1670,144 +1676,34 @@ class ImageAnnotationApp:
             relief=tk.FLAT
         )
         select_all_btn.pack(side=tk.RIGHT, padx=5)
+        return toolbar
 
-        # Получаем список датасетов
-        sub_folders = [f for f in output_dir.iterdir() if f.is_dir()]
-        json_manager = JsonManager(os.path.join(output_dir, 'hash_to_name.json'))
-
-        # Параметры сетки
-        ITEMS_PER_ROW = 3
-        ITEM_WIDTH = 250
-        PREVIEW_SIZE = 150
-
-        for i, sub_folder in enumerate(sub_folders):
-            real_name = Path(json_manager[sub_folder.name]).name
-
-            # Фрейм для одного датасета
-            item_frame = tk.Frame(
-                self.scrollable_frame,
-                width=ITEM_WIDTH,
-                height=ITEM_WIDTH + 60,
-                bg="white",
-                bd=1,
-                relief=tk.RAISED,
-                highlightbackground="#e0e0e0",
-                highlightthickness=1
-            )
-            item_frame.grid(
-                row=(i // ITEMS_PER_ROW) + 1,
-                column=i % ITEMS_PER_ROW,
-                padx=10,
-                pady=10,
-                sticky="nsew"
-            )
-            item_frame.grid_propagate(False)
-
-            # Чекбокс для выбора
-            var = tk.IntVar()
-            chk = tk.Checkbutton(
-                item_frame,
-                variable=var,
-                bg="white",
-                command=lambda f=sub_folder, v=var: self._toggle_dataset_selection(f, v)
-            )
-            chk.var = var  # Сохраняем ссылку на переменную
-            chk.place(x=5, y=5)
-
-            # Инициализируем состояние чекбокса
-            var.set(1 if sub_folder in self.selected_datasets else 0)
-
-            # Контейнер для изображения
-            img_container = tk.Frame(item_frame, bg="white", height=PREVIEW_SIZE + 10)
-            img_container.pack(fill=tk.X, pady=(25, 5))
-            img_container.pack_propagate(False)
-
-            # Загрузка превью изображения
-            image_files = list(sorted(
-                list(sub_folder.glob("*.jpg")) +
-                list(sub_folder.glob("*.jpeg")) +
-                list(sub_folder.glob("*.png")) +
-                list(sub_folder.glob("*.gif"))
-            ))
-
-            if image_files:
-                try:
-                    from PIL import Image, ImageTk
-                    print(f"[INFO] Loading image: {image_files[0]}")
-                    img = Image.open(image_files[0])
-                    img.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
-                    photo = ImageTk.PhotoImage(img)
-
-                    img_label = tk.Label(img_container, image=photo, bg="white", cursor="hand")
-                    img_label.image = photo
-                    img_label.pack()
-                    img_label.bind("<Button-1>", lambda _, s=sub_folder: self._modify_dataset(s))
-                except Exception as e:
-                    print(f"Ошибка загрузки изображения: {e}")
-                    no_img = tk.Label(img_container, text="No preview", bg="white", fg="gray")
-                    no_img.pack(pady=20)
-
-            # Название датасета
-            name_label = tk.Label(
-                item_frame,
-                text=real_name,
-                bg="white",
-                wraplength=ITEM_WIDTH - 20,
-                cursor="hand"
-            )
-            name_label.pack(fill=tk.X, padx=5, pady=(0, 5))
-            name_label.bind("<Button-1>", lambda _, s=sub_folder: self._modify_dataset(s))
-
-            # Статистика и кнопки управления
-            stat_frame = tk.Frame(item_frame, bg="white")
-            stat_frame.pack(fill=tk.X, pady=(0, 5))
+    def _describe_dataset(self, folder):
+        """Данные карточки датасета: имя и статистика из кэша"""
+        output_dir = DATA_DIR / "annotated_dataset"
+        json_manager = get_json_manager(os.path.join(output_dir, 'hash_to_name.json'))
+        stats = get_dataset_stats(output_dir).get(folder)
+        return {
+            "real_name": Path(json_manager[folder.name]).name,
+            "annotated": stats["annotated_count"],
+            "images": stats["image_count"],
+            "preview": folder / stats["preview"] if stats["preview"] else None,
+        }
 
-            annotated_imgs, imgs = self._get_dataset_stat(sub_folder)
-            stat_label = tk.Label(
-                stat_frame,
-                text=f"Аннотировано: {annotated_imgs}/{imgs}",
-                bg="white",
-                font=("Arial", 8)
-            )
-            stat_label.pack(side=tk.LEFT, padx=5)
+    def get_annotated_datasets(self):
+        output_dir = DATA_DIR / "annotated_dataset"
 
-            # Кнопка скачивания (стрелка вниз)
-            download_btn = tk.Button(
-                stat_frame,
-                text="↓",
-                fg="green",
-                bg="white",
-                bd=0,
-                font=("Arial", 12, "bold"),
-                command=lambda s=sub_folder: self._download_dataset(s)
-            )
-            download_btn.pack(side=tk.RIGHT, padx=2)
+        # Галерея обновляется разницей: карточки создаются только для видимых строк
+        sub_folders = get_dataset_folders(output_dir)
+        self.selected_datasets &= set(sub_folders)
+        self.gallery.update(sub_folders)
 
-            # Кнопка редактирования (карандаш)
-            edit_btn = tk.Button(
-                stat_frame,
-                text="✏️",
-                fg="blue",
-                bg="white",
-                bd=0,
-                font=("Arial", 12, "bold"),
-                command=lambda s=sub_folder: self._edit_dataset(s)
-            )
-            edit_btn.pack(side=tk.RIGHT, padx=2)
-
-            # Кнопка удаления (крестик)
-            del_btn = tk.Button(
-                stat_frame,
-                text="×",
-                fg="red",
-                bg="white",
-                bd=0,
-                font=("Arial", 12, "bold"),
-                command=lambda s=sub_folder: self._delete_single_dataset(s)
-            )
-            del_btn.pack(side=tk.RIGHT, padx=2)
-
-            self.annotated_datasets.append(item_frame)
+        if output_dir.exists():
+            get_dataset_stats(output_dir).save()
+        # Счётчики нужны только при профилировании (F12)
+        if tracer.enabled:
+            print(f"[DEBUG] Карточек датасетов: {self.gallery.card_count()} на {len(sub_folders)} датасетов")
+            print(f"[DEBUG] Кэш JSON-менеджеров: {registry.stats()}")
 
     def _refresh_annotated_datasets_only(self):
         """Обновляет только панель аннотированных датасетов без пересоздания всего UI"""
@@ -1817,9 +1713,9 @@ class ImageAnnotationApp:
     def _download_dataset(self, dataset_folder, test=False):
         """Метод для вызова из интерфейса"""
         output_dir = DATA_DIR / "annotated_dataset"
-        hash_to_name_manager = JsonManager(os.path.join(output_dir, 'hash_to_name.json'))
-        annotations_manager = JsonManager(os.path.join(output_dir, 'annotations.json'))
-        blazons_manager = JsonManager(os.path.join(output_dir, 'blazons.json'))
+        hash_to_name_manager = get_json_manager(os.path.join(output_dir, 'hash_to_name.json'))
+        annotations_manager = get_annotation_manager(os.path.join(output_dir, 'annotations.json'))
+        blazons_manager = get_json_manager(os.path.join(output_dir, 'blazons.json'))
         if not test:
             real_name = Path(hash_to_name_manager[dataset_folder.name]).name
             # Получаем аннотации для всего датасета
@@ -1917,6 +1813,14 @@ class ImageAnnotationApp:
             output_dir = temp_dir / real_name
             output_dir.mkdir(parents=True)
 
+            # Рамки всех картинок датасета в исходных координатах
+            dataset_path = str(DATA_DIR / "annotated_dataset" / dataset_folder.name)
+            table = None
+            if annotations is not None:
+                table = get_annotation_manager(
+                    os.path.join(DATA_DIR / "annotated_dataset", 'annotations.json')
+                ).annotation_table([dataset_path])
+
             # Копируем и аннотируем каждое изображение
             for image_path in dataset_folder.glob('*'):
                 if image_path.suffix.lower() in ['.jpg', '.jpeg', '.png', '.gif']:
@@ -1931,21 +1835,12 @@ class ImageAnnotationApp:
                     
                     # Получаем аннотации для текущего изображения по имени файла
                     image_name = image_path.name
-                    image_annotations = annotations.get(image_name, []) if annotations is not None else []
-                    print(f"Аннотации для изображения {image_name}: {image_annotations}")
+                    boxes, labels = table.image_boxes(dataset_path, image_name) if table is not None else ([], [])
+                    print(f"Аннотации для изображения {image_name}: {labels}")
                     
-                    # Рисуем аннотации на изображении
-                    for ann in image_annotations:
-                        print(f"Обработка аннотации: {ann}")
-                        coords = ann['coords']
-                        label = ann['text']
-                        ratio = ann.get('ratio', 1.0)
-                        # Преобразуем координаты обратно в оригинальный размер
-                        x1 = coords[0] / ratio
-                        y1 = coords[1] / ratio
-                        x2 = coords[2] / ratio
-                        y2 = coords[3] / ratio
-                        print(f"Координаты (оригинал): {x1}, {y1}, {x2}, {y2}, ratio: {ratio}")
+                    # Рисуем аннотации на изображении (координаты уже в оригинальном размере)
+                    for label, (x1, y1, x2, y2) in zip(labels, boxes):
+                        print(f"Координаты (оригинал): {x1}, {y1}, {x2}, {y2}")
                         # Рисуем прямоугольник
                         draw.rectangle([x1, y1, x2, y2], outline='red', width=2)
                         # Рисуем текст
@@ -2110,7 +2005,7 @@ class ImageAnnotationApp:
     def _edit_dataset(self, dataset):
         output_dir = DATA_DIR / "annotated_dataset"
         hash_to_name_path = output_dir / 'hash_to_name.json'
-        hash_to_name_manager = JsonManager(hash_to_name_path)
+        hash_to_name_manager = get_json_manager(hash_to_name_path)
 
         current_value = Path(hash_to_name_manager[dataset.name]).name
         new_value = simpledialog.askstring("Редактирование", "Введите новое значение:", initialvalue=current_value)
@@ -2134,17 +2029,13 @@ class ImageAnnotationApp:
         else:
             self.selected_datasets = set()
 
-        # Обновляем чекбоксы во всех фреймах датасетов
-        for widget in self.scrollable_frame.winfo_children():
-            if isinstance(widget, tk.Frame):
-                for child in widget.winfo_children():
-                    if isinstance(child, tk.Checkbutton):
-                        child.var.set(1 if select_all else 0)
+        # Обновляем чекбоксы видимых карточек
+        self.gallery.refresh_selection()
 
     def _get_all_dataset_folders(self):
         """Возвращает список всех папок с датасетами"""
         output_dir = DATA_DIR / "annotated_dataset"
-        return [f for f in output_dir.iterdir() if f.is_dir()] if output_dir.exists() else []
+        return get_dataset_folders(output_dir)
 
     def _merge_selected_datasets(self):
         if not self.selected_datasets:
@@ -2162,8 +2053,8 @@ class ImageAnnotationApp:
         output_dir = DATA_DIR / "annotated_dataset"
         annotations_path = output_dir / 'annotations.json'
         hash_to_name_path = output_dir / 'hash_to_name.json'
-        annotations_manager = JsonManager(annotations_path)
-        hash_to_name_manager = JsonManager(hash_to_name_path)
+        annotations_manager = get_annotation_manager(annotations_path)
+        hash_to_name_manager = get_json_manager(hash_to_name_path)
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         merged_folder = output_dir / f"merged_{timestamp}"
 
@@ -2175,6 +2066,7 @@ class ImageAnnotationApp:
         Path(merged_folder_path).mkdir(parents=True, exist_ok=True)
 
         try:
+            merged_annotations = {}
             for dataset in self.selected_datasets:
                 if not dataset.exists() or not dataset.is_dir():
                     continue
@@ -2186,19 +2078,12 @@ class ImageAnnotationApp:
                     else:
                         shutil.copy2(item, dest)
 
+                # Читаем только шарды выбранных датасетов
                 dataset_path = str(output_dir / dataset.name)
+                # Копия: списки разметки принадлежат исходному датасету
+                merged_annotations |= copy.deepcopy(annotations_manager.get_folder_info(dataset_path))
 
-                if merged_folder_path not in annotations_manager.keys():
-                    if dataset_path in annotations_manager.keys() and annotations_manager[dataset_path] is not None:
-                        annotations_manager[merged_folder_path] = annotations_manager[dataset_path]
-                    else:
-                        annotations_manager[merged_folder_path] = {}
-                else:
-                    if dataset_path in annotations_manager.keys() and annotations_manager[dataset_path] is not None:
-                        annotations_manager[merged_folder_path] = (annotations_manager[merged_folder_path] |
-                                                                   annotations_manager[dataset_path])
-
-            annotations_manager.save()
+            annotations_manager[merged_folder_path] = merged_annotations
             self.root.event_generate("<<RefreshDatasets>>")
             messagebox.showinfo("Готово", f"Датасеты объединены в папку:\n{merged_folder}", parent=self.root)
 
@@ -2220,28 +2105,55 @@ class ImageAnnotationApp:
     def _translate_from_hash(self, hash_folder: Path):
         output_dir = DATA_DIR / "annotated_dataset"
 
-        json_manager = JsonManager(
+        json_manager = get_json_manager(
             os.path.join(output_dir, 'hash_to_name.json')
         )
 
         real_path = json_manager[hash_folder.name]
         return real_path
 
-    def _get_dataset_stat(self, folder):
-        output_dir = DATA_DIR / "annotated_dataset"
+    def _show_preview(self, container, image_path, on_click):
+        """Показывает превью из дискового кэша; недостающее создаётся в фоне."""
+        thumbnails = get_thumbnail_cache()
+        thumb_path = thumbnails.cached(image_path)
+        if thumb_path is not None:
+            self._place_preview(container, thumb_path, on_click)
+            return
 
-        json_manager = AnnotationFileManager(
-            os.path.join(output_dir, 'annotations.json')
+        placeholder = tk.Label(container, text="…", bg="white", fg="gray")
+        placeholder.pack(pady=20)
+        thumbnails.request(
+            image_path,
+            lambda path: post_to_tk(self.root, lambda: self._place_preview(container, path, on_click, placeholder))
         )
 
-        imgs = len([
-            f for f in os.listdir(folder)
-            if f.lower().endswith(('.jpg', '.jpeg', '.png', '.gif'))
-        ])
+    def _place_preview(self, container, thumb_path, on_click, placeholder=None):
+        from PIL import Image, ImageTk
 
-        annotated_imgs = len(json_manager.get_folder_info(str(folder)).keys())
+        # Карточка могла исчезнуть, пока превью создавалось (галерею обновили)
+        try:
+            if not container.winfo_exists():
+                return
+        except tk.TclError:
+            return
+        if placeholder is not None:
+            placeholder.destroy()
+        if thumb_path is None:
+            tk.Label(container, text="No preview", bg="white", fg="gray").pack(pady=20)
+            return
+
+        photo = ImageTk.PhotoImage(Image.open(thumb_path))
+        img_label = tk.Label(container, image=photo, bg="white", cursor="hand")
+        img_label.image = photo
+        img_label.pack()
+        img_label.bind("<Button-1>", on_click)
+
+    def _get_dataset_stat(self, folder):
+        output_dir = DATA_DIR / "annotated_dataset"
+
+        stats = get_dataset_stats(output_dir).get(folder)
 
-        return annotated_imgs, imgs
+        return stats["annotated_count"], stats["image_count"]
 
     def _modify_dataset(self, folder_path):
         popover = AnnotationPopover(self.root, self)
@@ -2443,12 +2355,18 @@ class ImageAnnotationApp:
     def _save_google_drive_files(self, files):
         output_dir = DATA_DIR / "annotated_dataset"
 
+        # Блазоны пишутся по одному на картинку — через журнал, а не полной перезаписью
+        blazons_manager = get_json_manager(
+            os.path.join(output_dir, 'blazons.json'),
+            journal=True
+        )
+
         for folder, images in files.items():
             real_name = output_dir / (folder + "_drive")
             hash_name = get_unique_folder_name(real_name)
             os.makedirs(output_dir / hash_name, exist_ok=True)
 
-            json_manager = JsonManager(
+            json_manager = get_json_manager(
                 os.path.join(output_dir, 'hash_to_name.json')
             )
 
@@ -2473,18 +2391,11 @@ class ImageAnnotationApp:
                 img.save(filepath, format="JPEG")
 
                 # Cохраняем блазон
-                json_manager = JsonManager(
-                    os.path.join(output_dir, 'blazons.json')
-                )
-
-                if hash_name not in json_manager.keys():
-                    json_manager[hash_name] = {name + '.jpg': blazon}
-                else:
-                    d = json_manager[hash_name]
-                    d[name + '.jpg'] = blazon
-                    json_manager[hash_name] = d
+                blazons_manager.set_path([hash_name, name + '.jpg'], blazon)
 
                 print(f"Сохранено: {filepath}")
+
+        blazons_manager.close()
         self.get_annotated_datasets()
 
     def _update_progress(self, data):
@@ -1,12 +1,64 @@
+import os
+import time
 import tkinter as tk
-from tkinter import simpledialog
+from collections import OrderedDict, deque
+from time import perf_counter_ns
 from PIL import Image, ImageTk
+from ui.label_palette import LabelOverlay
 from utils.annotation import Annotation
-from utils.logger import log_method
+from utils.label_vocabulary import LabelVocabulary
+from utils.spatial_index import BoxIndex, box_iou
+from utils.tile_pyramid import TilePyramid, render_region, visible_region
+from utils.tracing import frame_stats, traced
+
+VIEWPORT = (800, 600)
+
+_FRAME_STATS = frame_stats("AnnotationCanvas.frame")
+
+
+def post_to_tk(widget, callback):
+    """Выполняет `callback()` в потоке Tk; вызывается из фоновых потоков."""
+    try:
+        widget.after(0, callback)
+    except (tk.TclError, RuntimeError):
+        pass  # окно уже закрыто
 
 
 class AnnotationCanvas(tk.Canvas):
-    @log_method
+    """Canvas разметки с масштабом и прокруткой.
+
+    Аннотации хранятся в координатах оригинала (ratio=1.0), на экран они
+    переводятся через текущий вид: `view_x`/`view_y` — точка оригинала в левом
+    верхнем углу, `view_scale` — экранных пикселей на пиксель оригинала.
+    Во вписанном виде показывается картинка загрузчика, при увеличении —
+    тайлы пирамиды (`utils.tile_pyramid`).
+    """
+
+    ZOOM_STEP = 1.25
+    # Максимальное увеличение: экранных пикселей на пиксель оригинала
+    MAX_SCALE = 4.0
+    # Сколько вписанных кадров (PhotoImage) держать для листания туда-обратно
+    FRAME_CACHE_SIZE = 8
+    # Теги элементов аннотаций
+    ANNOTATION_TAG = "annotation"
+    HANDLE_TAG = "handle"
+    REFINED_COLOR = "#00b050"
+    SUGGESTION_TAG = "suggestion"
+    SUGGESTION_COLOR = "#0088ff"
+    # Подсказка не показывается, если уже есть аннотация с таким перекрытием (IoU)
+    SUGGESTION_OVERLAP = 0.7
+    HOVER_COLOR = "#ff9900"
+    # Допуск попадания по рамке и размер маркеров, экранные пиксели
+    HIT_TOLERANCE = 3
+    HANDLE_SIZE = 4
+    # События движения схлопываются в один кадр не чаще раза в FRAME_INTERVAL_MS;
+    # после INTERACTION_IDLE_MS без прокрутки и масштабирования кадр пересчитывается качественно
+    FRAME_INTERVAL_MS = 16
+    INTERACTION_IDLE_MS = 150
+    FAST_RESAMPLE = Image.Resampling.NEAREST
+    QUALITY_RESAMPLE = Image.Resampling.LANCZOS
+
+    @traced
     def __init__(self, parent, image_loader, annotation_saver, readonly=False, **kwargs):
         super().__init__(parent, width=800, height=600, bd=0, highlightthickness=0, **kwargs)
         self.annotation_saver = annotation_saver
@@ -18,10 +70,51 @@ class AnnotationCanvas(tk.Canvas):
         self.image = None
         self.image_path = None
         self.annotations = []
+        # id аннотации -> Annotation
+        self._annotations_by_id = {}
+        # Сетка рамок для поиска по точке; строится заново после изменений
+        self._index = None
+        self._indexed = []
+        # Подсвеченная аннотация, маркеры её углов и центра, текущее перетаскивание
+        self._hover = None
+        self._handles = {}
+        self._edit = None
+
+        # Быстрая разметка: словарь классов, поле ввода у рамки и рамка, ждущая метку
+        self.vocabulary = LabelVocabulary()
+        self._overlay = None
+        self._pending = None
+        self.on_annotation_created = None
+        # Уточнение рамок по краям (ml.box_refine.BoxRefiner), включается в окне разметки
+        self.refiner = None
+        # Предложения модели: пунктирные рамки в координатах оригинала
+        self._suggestions = []
+        self._suggestion_index = None
+        # Время последних созданных рамок — для темпа разметки
+        self._label_times = deque(maxlen=30)
         self.ratio = 1.0
         self.default_label = None
         self.readonly = readonly
 
+        # Вид: вписанная картинка или увеличенный фрагмент
+        self.original_size = None
+        self.view_scale = 1.0
+        self.view_x = 0.0
+        self.view_y = 0.0
+        self._pyramid = None
+        self._pan_start = None
+
+        # (путь, ratio) -> PhotoImage вписанного кадра; ключ показанного сейчас кадра
+        self._fitted_frames = OrderedDict()
+        self._frame_key = None
+
+        # Отложенные до следующего кадра обработчики движения: обработчик -> последнее событие
+        self._queued = {}
+        self._frame_job = None
+        self._pending_zoom = None
+        self._interacting = False
+        self._idle_job = None
+
         self._setup_canvas()
 
     def _setup_canvas(self):
@@ -31,12 +124,25 @@ class AnnotationCanvas(tk.Canvas):
         self.ratio = 1.0
 
         # Привязка событий
+        self._bind_view_events()
         if not self.readonly:
             self._bind_events()
 
+    def _bind_view_events(self):
+        """Колесо — масштаб относительно курсора, Shift+перетаскивание — прокрутка."""
+        self.bind("<MouseWheel>", self._on_wheel)  # Windows/MacOS
+        self.bind("<Button-4>", lambda e: self._queue_zoom(e.x, e.y, self.ZOOM_STEP))  # Linux
+        self.bind("<Button-5>", lambda e: self._queue_zoom(e.x, e.y, 1 / self.ZOOM_STEP))
+        self.bind("<Shift-ButtonPress-1>", self._on_pan_start)
+        self.bind("<Shift-B1-Motion>", lambda e: self._queue(self._on_pan, e))
+        self.bind("<Shift-ButtonRelease-1>", self._on_pan_end)
+
     def _bind_events(self):
+        self.bind("<Motion>", lambda e: self._queue(self._on_motion, e))
+        self.bind("<Key>", self._on_key)
+        self.bind("<Double-Button-1>", self._on_double_click)
         self.bind("<ButtonPress-1>", self._on_press)
-        self.bind("<B1-Motion>", self._on_drag)
+        self.bind("<B1-Motion>", lambda e: self._queue(self._on_drag, e))
         self.bind("<ButtonRelease-1>", self._on_release)
 
         # Правая кнопка - контекстное меню
@@ -57,6 +163,12 @@ class AnnotationCanvas(tk.Canvas):
             label="Изменить метку",
             command=lambda: self._edit_annotation_label(event.x, event.y)
         )
+        suggestion = self._suggestion_at(event.x, event.y)
+        if suggestion is not None:
+            menu.add_command(
+                label=f"Принять подсказку «{suggestion['text']}»",
+                command=lambda: self.accept_suggestion(suggestion)
+            )
 
         # Показываем меню
         try:
@@ -64,23 +176,154 @@ class AnnotationCanvas(tk.Canvas):
         finally:
             menu.grab_release()
 
-    @log_method
+    @classmethod
+    def _annotation_tag(cls, annotation):
+        return f"{cls.ANNOTATION_TAG}:{annotation.id}"
+
+    def _tag_annotation(self, annotation):
+        """Вешает на рамку и подпись общий тег и тег аннотации."""
+        tag = self._annotation_tag(annotation)
+        self.itemconfigure(annotation.rect, tags=(self.ANNOTATION_TAG, "annotation-rect", tag))
+        self.itemconfigure(annotation.text_id, tags=(self.ANNOTATION_TAG, "annotation-text", tag))
+
+    def _register_annotation(self, annotation):
+        """Связывает id аннотации с объектом и сбрасывает индекс."""
+        self._annotations_by_id[annotation.id] = annotation
+        self._index = None
+
+    def _unregister_annotation(self, annotation):
+        self._annotations_by_id.pop(annotation.id, None)
+        self._index = None
+        if self._hover is annotation:
+            self._set_hover(None)
+
+    def _box_index(self):
+        if self._index is None:
+            self._indexed = list(self.annotations)
+            self._index = BoxIndex([self._image_box(ann) for ann in self._indexed])
+        return self._index
+
+    def _annotations_at(self, x, y):
+        """Аннотации под точкой Canvas (и в пределах допуска), начиная с самой маленькой."""
+        if not self.annotations:
+            return []
+        image_x, image_y = self._to_image(x, y)
+        hits = self._box_index().query(image_x, image_y, self.HIT_TOLERANCE / self.view_scale)
+        return [self._indexed[i] for i in hits]
+
+    def _annotation_at(self, x, y):
+        """Аннотация под курсором; из вложенных рамок выбирается внутренняя."""
+        hits = self._annotations_at(x, y)
+        return hits[0] if hits else None
+
+    # --- Подсветка и маркеры для перемещения и изменения размера ---
+
+    def _on_motion(self, event):
+        if self._edit is not None or self.image is None:
+            return
+        if self._handle_at(event.x, event.y) is not None:
+            return  # курсор на маркере подсвеченной рамки
+        self._set_hover(self._annotation_at(event.x, event.y))
+
+    def _set_hover(self, annotation):
+        if annotation is self._hover:
+            return
+        if self._hover is not None and self._hover.id in self._annotations_by_id:
+            self.itemconfigure(self._hover.rect, outline="red", width=2)
+        self._hover = annotation
+        if annotation is not None:
+            self.itemconfigure(annotation.rect, outline=self.HOVER_COLOR, width=3)
+        self._draw_handles()
+
+    def _draw_handles(self):
+        self.delete(self.HANDLE_TAG)
+        self._handles = {}
+        if self._hover is None:
+            return
+        x1, y1, x2, y2 = self._view_box(self._hover)
+        points = {
+            0: (x1, y1), 1: (x2, y1), 2: (x2, y2), 3: (x1, y2),
+            "move": ((x1 + x2) / 2, (y1 + y2) / 2),
+        }
+        size = self.HANDLE_SIZE
+        for kind, (x, y) in points.items():
+            item = self.create_rectangle(
+                x - size, y - size, x + size, y + size,
+                outline=self.HOVER_COLOR, fill="white", tags=(self.HANDLE_TAG,)
+            )
+            self._handles[item] = kind
+
+    def _handle_at(self, x, y):
+        for item in reversed(self.find_overlapping(x - 1, y - 1, x + 1, y + 1)):
+            kind = self._handles.get(item)
+            if kind is not None:
+                return kind
+        return None
+
+    def _start_edit(self, kind, event):
+        x1, y1, x2, y2 = self._image_box(self._hover)
+        self._edit = {
+            "annotation": self._hover,
+            "kind": kind,
+            "start": self._to_image(event.x, event.y),
+            "box": [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)],
+        }
+
+    def _edited_box(self, event):
+        """Рамка в координатах оригинала с учётом перетаскивания."""
+        edit = self._edit
+        x, y = self._to_image(event.x, event.y)
+        dx, dy = x - edit["start"][0], y - edit["start"][1]
+        x1, y1, x2, y2 = edit["box"]
+        kind = edit["kind"]
+        if kind == "move":
+            return [x1 + dx, y1 + dy, x2 + dx, y2 + dy]
+        # Углы: 0 — левый верхний, дальше по часовой стрелке
+        if kind in (0, 3):
+            x1 += dx
+        else:
+            x2 += dx
+        if kind in (0, 1):
+            y1 += dy
+        else:
+            y2 += dy
+        return [min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)]
+
+    def _drag_edit(self, event):
+        annotation = self._edit["annotation"]
+        annotation.coords, annotation.ratio = self._edited_box(event), 1.0
+        self._place_annotation(annotation)
+        self._draw_handles()
+
+    @traced
+    def _finish_edit(self, event):
+        edit, self._edit = self._edit, None
+        annotation = edit["annotation"]
+        box = self._edited_box(event)
+        if box[0] == box[2] or box[1] == box[3]:
+            box = edit["box"]
+        annotation.coords, annotation.ratio = box, 1.0
+        self._place_annotation(annotation)
+        self._draw_handles()
+        self._index = None
+        if box != edit["box"]:
+            image_path = self.image_loader.get_current_image_path()
+            self.annotation_saver.update_annotation_in_file(image_path, annotation)
+
+    @traced
     def _delete_annotation_near(self, x, y):
-        """Удаляет ближайшую аннотацию"""
-        for i, ann in enumerate(self.annotations):
-            x1, y1, x2, y2 = ann.coords
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                self.delete(ann.rect)
-                self.delete(ann.text_id)
-                self.annotations.pop(i)
+        """Удаляет аннотацию под курсором"""
+        ann = self._annotation_at(x, y)
+        if ann is None:
+            return
 
-                self.configure(bg=self.cget("bg"))
-                self._delete_annotation_from_file(ann)
+        self.delete(self._annotation_tag(ann))
+        self._unregister_annotation(ann)
+        self.annotations = [a for a in self.annotations if a.id != ann.id]
 
-                self._redraw_all_annotations()
-                break
+        self._delete_annotation_from_file(ann)
 
-    @log_method
+    @traced
     def _delete_annotation_from_file(self, annotation):
         folder_path, image_path = self.image_loader.folder_path, self.image_loader.get_current_image_path()
 
@@ -90,83 +333,279 @@ class AnnotationCanvas(tk.Canvas):
         folder_path, image_path = self.image_loader.folder_path, self.image_loader.get_current_image_path()
         self.annotation_saver.add_annotation_to_file(image_path, annotation)
 
-    @log_method
+    @traced
     def _edit_annotation_label(self, x, y):
         """Изменяет метку аннотации"""
-        for ann in self.annotations:
-            x1, y1, x2, y2 = ann.coords
-            if x1 <= x <= x2 and y1 <= y <= y2:
-                new_label = simpledialog.askstring("Изменить метку",
-                                                   "Новая метка:",
-                                                   initialvalue=ann.text)
-                if new_label:
-                    ann.text = new_label
-                    self._update_annotation_display(ann)
-
-                self._redraw_all_annotations()
-                break
+        ann = self._annotation_at(x, y)
+        if ann is None:
+            return
 
-    def _update_annotation_display(self, annotation):
-        """Обновляет визуальное отображение аннотации на Canvas"""
-        # Удаляем старые элементы
-        self.delete(annotation.rect)  # Удаляем прямоугольник
-        if hasattr(annotation, 'text_id'):
-            self.delete(annotation.text_id)  # Удаляем старую текстовую метку
-            self._delete_annotation_from_file(annotation)
-
-        # Пересчитываем координаты с учетом текущего масштаба
-        ratio = self.ratio if hasattr(self, 'ratio') else 1.0
-        coords = [
-            annotation.coords[0] * ratio,
-            annotation.coords[1] * ratio,
-            annotation.coords[2] * ratio,
-            annotation.coords[3] * ratio
-        ]
-
-        # Перерисовываем прямоугольник
-        annotation.rect = self.create_rectangle(
-            *coords,
-            outline='red',
-            width=2
+        self._close_overlay()
+        x1, y1, x2, y2 = self._view_box(ann)
+        self._overlay = LabelOverlay(
+            self, self.vocabulary, max(x1, x2) + 4, min(y1, y2),
+            lambda label: self._relabel(ann, label), initial=ann.text
         )
 
-        # Перерисовываем текстовую метку
-        x_center = (coords[0] + coords[2]) / 2
-        y_center = (coords[1] + coords[3]) / 2
+    def _relabel(self, ann, label):
+        self._overlay = None
+        if label and label != ann.text and ann.id in self._annotations_by_id:
+            ann.text = label
+            self.vocabulary.use(label)
+            self._update_annotation_display(ann)
 
-        annotation.text_id = self.create_text(
-            x_center, y_center,
-            text=annotation.text,
-            fill='red',
-            font=('Arial', 10, 'bold')
-        )
-
-        # Обновляем ссылки в списке аннотаций
-        for i, ann in enumerate(self.annotations):
-            if ann == annotation:
-                self.annotations[i] = annotation
-                break
+    def _update_annotation_display(self, annotation):
+        """Обновляет метку аннотации на Canvas и в файле"""
+        self.itemconfigure(annotation.text_id, text=annotation.text)
 
-        self._add_annotation_to_file(annotation)
+        image_path = self.image_loader.get_current_image_path()
+        self.annotation_saver.update_annotation_in_file(image_path, annotation)
 
-    @log_method
+    @traced
     def display_image(self, image, image_path):
         self.clear()
         self._draw_image(image, image_path)
+        self.prepare_refiner()
+
+    def prepare_refiner(self):
+        """Готовит картинку к уточнению рамок, пока пользователь ещё рисует."""
+        if self.refiner is not None and self.image_path:
+            self.refiner.prepare(self._full_image_path(), self._pyramid)
 
     def _draw_image(self, image, image_path):
-        img_width, img_height = image.size
-        self.ratio = min(800 / img_width, 600 / img_height)
-        new_size = (int(img_width * self.ratio), int(img_height * self.ratio))
-        resized_image = image.resize(new_size, Image.Resampling.LANCZOS)
+        # Картинка может быть уже уменьшена загрузчиком: ratio считаем от оригинала
+        self.original_size = image.info.get("original_size", image.size)
+        img_width, img_height = self.original_size
+        self.ratio = min(VIEWPORT[0] / img_width, VIEWPORT[1] / img_height)
 
         self.image = image
-        self.tk_image = ImageTk.PhotoImage(resized_image)
         self.image_path = image_path
-        self.create_image(0, 0, anchor=tk.NW, image=self.tk_image)
+        self._drop_pyramid()
+        self._frame_key = None
+        self.view_scale, self.view_x, self.view_y = self.ratio, 0.0, 0.0
+        self._create_image_item()
         self._draw_image_path(self.image_path)
 
-    @log_method
+    def _create_image_item(self):
+        self.image_on_canvas = self.create_image(0, 0, anchor=tk.NW)
+        self._render_view()
+
+    # --- Вид: масштаб и прокрутка ---
+
+    def _to_view(self, x, y):
+        """Координаты оригинала -> координаты Canvas."""
+        return (x - self.view_x) * self.view_scale, (y - self.view_y) * self.view_scale
+
+    def _to_image(self, x, y):
+        """Координаты Canvas -> координаты оригинала."""
+        return x / self.view_scale + self.view_x, y / self.view_scale + self.view_y
+
+    @staticmethod
+    def _image_box(annotation):
+        """Рамка аннотации в координатах оригинала (старые записи хранят ratio вписанного вида)."""
+        ratio = annotation.ratio or 1.0
+        return [c / ratio for c in annotation.coords]
+
+    def _view_box(self, annotation):
+        x1, y1, x2, y2 = self._image_box(annotation)
+        return [*self._to_view(x1, y1), *self._to_view(x2, y2)]
+
+    def is_fitted(self):
+        return self.view_scale == self.ratio and self.view_x == 0 and self.view_y == 0
+
+    def _clamp_view(self):
+        width, height = self.original_size
+        self.view_x = min(max(self.view_x, 0.0), max(width - VIEWPORT[0] / self.view_scale, 0.0))
+        self.view_y = min(max(self.view_y, 0.0), max(height - VIEWPORT[1] / self.view_scale, 0.0))
+
+    def zoom_at(self, x, y, factor):
+        """Меняет масштаб, оставляя точку под курсором на месте."""
+        if self.image is None:
+            return
+        image_x, image_y = self._to_image(x, y)
+        scale = min(max(self.view_scale * factor, self.ratio), max(self.MAX_SCALE, self.ratio))
+        if scale == self.view_scale:
+            return
+        self.view_scale = scale
+        self.view_x, self.view_y = image_x - x / scale, image_y - y / scale
+        self._clamp_view()
+        self._begin_interaction()
+        self._apply_view()
+
+    def reset_view(self):
+        """Возвращает вписанный вид."""
+        if self.image is None or self.is_fitted():
+            return
+        self.view_scale, self.view_x, self.view_y = self.ratio, 0.0, 0.0
+        self._apply_view()
+
+    # --- Кадры: схлопывание событий движения и качество перерисовки ---
+
+    def _queue(self, handler, event):
+        """Откладывает обработку до следующего кадра; из серии событий остаётся последнее."""
+        self._queued[handler] = event
+        if self._frame_job is None:
+            self._frame_job = self.after(self.FRAME_INTERVAL_MS, self._run_frame)
+
+    def _run_frame(self):
+        self._frame_job = None
+        queued, self._queued = self._queued, {}
+        if not queued:
+            return
+        start = perf_counter_ns()
+        for handler, event in queued.items():
+            handler(event)
+        _FRAME_STATS.record(start, perf_counter_ns() - start)
+
+    def _flush_frame(self):
+        """Применяет отложенные события сразу (перед нажатием и отпусканием кнопки)."""
+        if self._frame_job is not None:
+            self.after_cancel(self._frame_job)
+        self._run_frame()
+
+    def _cancel_frames(self):
+        for job in (self._frame_job, self._idle_job):
+            if job is not None:
+                self.after_cancel(job)
+        self._frame_job = self._idle_job = None
+        self._queued = {}
+        self._pending_zoom = None
+        self._interacting = False
+
+    def _begin_interaction(self):
+        """Пока вид двигают, кадр рисуется быстрым ресемплингом."""
+        self._interacting = True
+        if self._idle_job is not None:
+            self.after_cancel(self._idle_job)
+        self._idle_job = self.after(self.INTERACTION_IDLE_MS, self._end_interaction)
+
+    def _end_interaction(self):
+        self._idle_job = None
+        self._interacting = False
+        self._render_view()
+
+    def _queue_zoom(self, x, y, factor):
+        """Накопленный за кадр масштаб применяется одним шагом."""
+        if self._pending_zoom is None:
+            self._pending_zoom = [x, y, factor]
+        else:
+            self._pending_zoom[0], self._pending_zoom[1] = x, y
+            self._pending_zoom[2] *= factor
+        self._queue(self._apply_pending_zoom, None)
+
+    def _apply_pending_zoom(self, _):
+        if self._pending_zoom is not None:
+            x, y, factor = self._pending_zoom
+            self._pending_zoom = None
+            self.zoom_at(x, y, factor)
+
+    def _on_wheel(self, event):
+        self._queue_zoom(event.x, event.y, self.ZOOM_STEP if event.delta > 0 else 1 / self.ZOOM_STEP)
+
+    def _on_pan_start(self, event):
+        self._flush_frame()
+        self._pan_start = (event.x, event.y, self.view_x, self.view_y)
+
+    def _on_pan_end(self, event):
+        self._flush_frame()
+        self._pan_start = None
+
+    def _on_pan(self, event):
+        if self._pan_start is None or self.image is None:
+            return
+        start_x, start_y, view_x, view_y = self._pan_start
+        self.view_x = view_x - (event.x - start_x) / self.view_scale
+        self.view_y = view_y - (event.y - start_y) / self.view_scale
+        self._clamp_view()
+        self._begin_interaction()
+        self._apply_view()
+
+    def _apply_view(self):
+        self._render_view()
+        for ann in self.annotations:
+            self._place_annotation(ann)
+        for suggestion in self._suggestions:
+            self._place_suggestion(suggestion)
+        self._draw_handles()
+        if self._pending is not None:
+            self._place_pending()
+
+    def _get_pyramid(self):
+        if self._pyramid is None:
+            image_path = os.path.join(self.image_loader.folder_path, self.image_path)
+            self._pyramid = TilePyramid(image_path, self.original_size)
+        return self._pyramid
+
+    def _drop_pyramid(self):
+        # Недостроенные уровни ушедшей картинки больше не нужны
+        if self._pyramid is not None:
+            self._pyramid.cancel()
+            self._pyramid = None
+
+    def _on_level_ready(self, pyramid, level):
+        # Вызывается из фонового потока: перерисовываем в потоке Tk
+        if level is None:
+            return
+        post_to_tk(self, lambda: self._pyramid is pyramid and self._render_view())
+
+    @traced
+    def _render_view(self):
+        """Рисует видимую часть картинки при текущем масштабе."""
+        if self.image is None or self.image_on_canvas is None:
+            return
+
+        if self.is_fitted():
+            key = (self._full_image_path(), self.ratio)
+            if key == self._frame_key:
+                return
+            photo = self._fitted_frames.get(key)
+            if photo is None:
+                new_size = (int(self.original_size[0] * self.ratio), int(self.original_size[1] * self.ratio))
+                frame = self.image if self.image.size == new_size else self.image.resize(new_size, Image.Resampling.LANCZOS)
+                photo = self._fitted_frames[key] = ImageTk.PhotoImage(frame)
+                while len(self._fitted_frames) > self.FRAME_CACHE_SIZE:
+                    self._fitted_frames.popitem(last=False)
+            self._fitted_frames.move_to_end(key)
+            self._show_frame(key, photo, (0, 0))
+        else:
+            visible = visible_region(self.original_size, self.view_x, self.view_y, self.view_scale, VIEWPORT)
+            if visible is None:
+                return
+            region, screen = visible
+            pyramid = None
+            level_ready = False
+            try:
+                pyramid = self._get_pyramid()
+                level = pyramid.level_for_scale(self.view_scale)
+                level_ready = pyramid.is_ready(level)
+            except OSError as e:
+                print(f"Пирамида тайлов недоступна: {e}")
+
+            resample = self.FAST_RESAMPLE if self._interacting else self.QUALITY_RESAMPLE
+            key = (self._full_image_path(), self.view_scale, self.view_x, self.view_y, level_ready, resample)
+            if key == self._frame_key:
+                return
+            if level_ready:
+                frame = pyramid.render(level, region, screen, resample=resample)
+            else:
+                if pyramid is not None:
+                    pyramid.ensure_level(level, lambda ready, p=pyramid: self._on_level_ready(p, ready))
+                # Пока уровень готовится, растягиваем уже загруженную картинку
+                frame = render_region(self.image, self.image.size[0] / self.original_size[0], region, screen,
+                                      resample=resample)
+            self._show_frame(key, ImageTk.PhotoImage(frame), screen[:2])
+
+    def _full_image_path(self):
+        folder = self.image_loader.folder_path if self.image_loader else ""
+        return os.path.join(str(folder), self.image_path or "")
+
+    def _show_frame(self, key, photo, offset):
+        self._frame_key = key
+        self.tk_image = photo
+        self.itemconfigure(self.image_on_canvas, image=photo)
+        self.coords(self.image_on_canvas, *offset)
+
+    @traced
     def _draw_image_path(self, image_path):
         self.create_text(
             10, 10,
@@ -177,6 +616,18 @@ class AnnotationCanvas(tk.Canvas):
         )
 
     def _on_press(self, event):
+        self.focus_set()  # для клавиш палитры
+        if self._overlay is not None:
+            # Клик мимо поля метки отменяет ввод
+            self._close_overlay()
+            return
+        # Подсветка должна соответствовать последнему положению курсора
+        self._flush_frame()
+        kind = self._handle_at(event.x, event.y) if self._hover is not None else None
+        if kind is not None:
+            self._start_edit(kind, event)
+            return
+
         self.start_x = event.x
         self.start_y = event.y
         self.current_rect = self.create_rectangle(
@@ -185,125 +636,313 @@ class AnnotationCanvas(tk.Canvas):
         )
 
     def _on_drag(self, event):
-        if self.current_rect:
+        if self._edit is not None:
+            self._drag_edit(event)
+        elif self.current_rect:
             self.coords(
                 self.current_rect,
                 self.start_x, self.start_y,
                 event.x, event.y
             )
 
-    @log_method
+    @traced
     def _on_release(self, event):
+        self._flush_frame()
+        if self._edit is not None:
+            self._finish_edit(event)
+            return
         if not self.current_rect:
             return
 
         coords = self.coords(self.current_rect)
 
+        rect, self.current_rect = self.current_rect, None
         if (coords[0] == coords[2]) or (coords[1] == coords[3]):
-            self.delete(self.current_rect)
+            self.delete(rect)
             return
+
+        # В файл попадают координаты оригинала: масштаб вида на разметку не влияет
+        x1, y1 = self._to_image(min(coords[0], coords[2]), min(coords[1], coords[3]))
+        x2, y2 = self._to_image(max(coords[0], coords[2]), max(coords[1], coords[3]))
+        box = [x1, y1, x2, y2]
+
+        self.commit_pending()
         if self.default_label is not None:
-            label = self.default_label
-        else:
-            label = simpledialog.askstring("Label", "Enter object label:", parent=self)
+            # С меткой по умолчанию рамка сохраняется после уточнения (или по истечении бюджета)
+            self._pending = {"rect": rect, "box": box, "label": self.default_label}
+            if not self._refine_pending():
+                self.commit_pending()
+            return
 
+        # Метка вводится прямо у рамки, без модального окна
+        self._pending = {"rect": rect, "box": box}
+        view_x2, view_y1 = self._to_view(x2, y1)
+        self._overlay = LabelOverlay(self, self.vocabulary, view_x2 + 4, view_y1, self._on_pending_label)
+        self._refine_pending()
+
+    def _place_pending(self):
+        x1, y1 = self._to_view(*self._pending["box"][:2])
+        x2, y2 = self._to_view(*self._pending["box"][2:])
+        self.coords(self._pending["rect"], x1, y1, x2, y2)
+        if self._overlay is not None:
+            self._overlay.move_to(x2 + 4, y1)
+
+    def _refine_pending(self):
+        """Запускает уточнение ждущей рамки в фоне; False, если уточнение выключено."""
+        pending = self._pending
+        if self.refiner is None or pending is None:
+            return False
+
+        self.refiner.refine(
+            self._full_image_path(), list(pending["box"]),
+            lambda box: post_to_tk(self, lambda: self._on_refined(pending, box)),
+            pyramid=self._pyramid
+        )
+        if "label" in pending:
+            budget_ms = int(self.refiner.budget * 1000) + 50
+            pending["timer"] = self.after(budget_ms, lambda: self._on_refined(pending, None))
+        return True
+
+    def _on_refined(self, pending, box):
+        """Показывает уточнённую рамку; сохраняется она вместе с меткой."""
+        if pending is not self._pending:
+            return  # рамку уже сохранили или отменили
+        if box is not None:
+            pending["box"] = box
+            self.itemconfigure(pending["rect"], outline=self.REFINED_COLOR)
+            self._place_pending()
+        if "label" in pending:
+            self.commit_pending()
+
+    def commit_pending(self):
+        """Сохраняет рамку с меткой по умолчанию, не дожидаясь уточнения."""
+        pending = self._pending
+        if pending is None or "label" not in pending:
+            return
+        self._pending = None
+        if pending.get("timer") is not None:
+            self.after_cancel(pending["timer"])
+        self._create_annotation(pending["box"], pending["label"], pending["rect"])
+
+    def _on_pending_label(self, label):
+        pending, self._pending, self._overlay = self._pending, None, None
+        if pending is None:
+            return
         if label:
-            self._create_annotation(coords, label, self.current_rect)
+            self._create_annotation(pending["box"], label, pending["rect"])
         else:
-            self.delete(self.current_rect)
-
-        self.current_rect = None
-
-    @log_method
-    def _create_annotation(self, coords, label, rect):
-        x_center = (coords[0] + coords[2]) / 2
-        y_center = (coords[1] + coords[3]) / 2
-
-        if coords[0] == coords[2] or coords[1] == coords[3]:
+            self.delete(pending["rect"])
+
+    def _close_overlay(self):
+        if self._overlay is not None:
+            self._overlay.cancel()
+
+    def _on_key(self, event):
+        """Цифры 1–9: метка из палитры для подсвеченной рамки."""
+        if event.char and event.char in "123456789":
+            label = self.vocabulary.palette_label(int(event.char))
+            if label is not None:
+                self.apply_label(label)
+
+    def apply_label(self, label):
+        """Метка из палитры: для рамки, ждущей метку, иначе — для подсвеченной."""
+        if self._overlay is not None and self._pending is not None:
+            self._overlay.accept(label)
+        elif self._hover is not None:
+            self._close_overlay()
+            self._relabel(self._hover, label)
+
+    # --- Подсказки модели ---
+
+    def show_suggestions(self, proposals):
+        """Рисует предложения модели пунктиром; уже размеченные объекты пропускаются."""
+        self.clear_suggestions()
+        if self.image is None:
             return
-
+        existing = [self._image_box(ann) for ann in self.annotations]
+        for proposal in proposals:
+            box = proposal["coords"]
+            if any(box_iou(box, other) >= self.SUGGESTION_OVERLAP for other in existing):
+                continue
+            suggestion = {
+                "box": box,
+                "text": proposal["text"],
+                "score": proposal.get("score", 0.0),
+                "rect": self.create_rectangle(
+                    0, 0, 0, 0, outline=self.SUGGESTION_COLOR, width=2, dash=(4, 3),
+                    tags=(self.SUGGESTION_TAG,)
+                ),
+            }
+            suggestion["text_id"] = self.create_text(
+                0, 0, anchor=tk.SW,
+                text=f"{suggestion['text']} {suggestion['score']:.2f}",
+                fill=self.SUGGESTION_COLOR, font=("Arial", 9),
+                tags=(self.SUGGESTION_TAG,)
+            )
+            self._place_suggestion(suggestion)
+            self._suggestions.append(suggestion)
+        # Подсказки под аннотациями, чтобы не перекрывать их рамки
+        if self.annotations:
+            self.tag_lower(self.SUGGESTION_TAG, self.ANNOTATION_TAG)
+        self._suggestion_index = None
+
+    def _place_suggestion(self, suggestion):
+        x1, y1 = self._to_view(*suggestion["box"][:2])
+        x2, y2 = self._to_view(*suggestion["box"][2:])
+        self.coords(suggestion["rect"], x1, y1, x2, y2)
+        self.coords(suggestion["text_id"], x1, y1)
+
+    def clear_suggestions(self):
+        self.delete(self.SUGGESTION_TAG)
+        self._suggestions = []
+        self._suggestion_index = None
+
+    def suggestion_count(self):
+        return len(self._suggestions)
+
+    def _suggestion_at(self, x, y):
+        if not self._suggestions:
+            return None
+        if self._suggestion_index is None:
+            self._suggestion_index = BoxIndex([s["box"] for s in self._suggestions])
+        hits = self._suggestion_index.query(*self._to_image(x, y), self.HIT_TOLERANCE / self.view_scale)
+        return self._suggestions[hits[0]] if len(hits) else None
+
+    def _on_double_click(self, event):
+        suggestion = self._suggestion_at(event.x, event.y)
+        if suggestion is not None:
+            self.accept_suggestion(suggestion)
+
+    def accept_suggestion(self, suggestion):
+        """Превращает предложение модели в обычную аннотацию."""
+        if suggestion not in self._suggestions:
+            return
+        self.delete(suggestion["rect"])
+        self.delete(suggestion["text_id"])
+        self._suggestions.remove(suggestion)
+        self._suggestion_index = None
+        rect = self.create_rectangle(0, 0, 0, 0, outline="red", width=2)
+        self._create_annotation(list(suggestion["box"]), suggestion["text"], rect)
+
+    def accept_all_suggestions(self):
+        for suggestion in list(self._suggestions):
+            self.accept_suggestion(suggestion)
+
+    def add_carried(self, carried):
+        """Добавляет рамки, перенесённые с предыдущей картинки; уже размеченные пропускает."""
+        existing = [self._image_box(ann) for ann in self.annotations]
+        added = 0
+        for item in carried:
+            box = item["coords"]
+            if any(box_iou(box, other) >= self.SUGGESTION_OVERLAP for other in existing):
+                continue
+            rect = self.create_rectangle(0, 0, 0, 0, outline="red", width=2)
+            self._create_annotation(list(box), item["text"], rect)
+            existing.append(box)
+            added += 1
+        return added
+
+    def boxes_per_minute(self):
+        """Темп разметки по последним созданным рамкам."""
+        if len(self._label_times) < 2:
+            return None
+        elapsed = self._label_times[-1] - self._label_times[0]
+        return (len(self._label_times) - 1) * 60 / elapsed if elapsed > 0 else None
+
+    @traced
+    def _create_annotation(self, box, label, rect):
+        """Создаёт аннотацию по рамке в координатах оригинала."""
+        self.itemconfigure(rect, outline="red")
         text_id = self.create_text(
-            x_center, y_center,
+            0, 0,
             text=label, fill="red",
             font=("Arial", 10, "bold")
         )
-
         annotation = Annotation(
-            coords=coords,
+            coords=box,
             text=label,
-            ratio=self.ratio,
+            ratio=1.0,
             rect=rect,
             text_id=text_id
         )
+        self._place_annotation(annotation)
         self.annotations.append(annotation)
+        self._tag_annotation(annotation)
+        self._register_annotation(annotation)
         self._add_annotation_to_file(annotation)
 
+        self.vocabulary.use(label)
+        self._label_times.append(time.monotonic())
+        if self.on_annotation_created is not None:
+            self.on_annotation_created(annotation)
+
     def add_annotation(self, annotation):
         if annotation in self.annotations:
             return
 
-        coords, label, rect = annotation.coords, annotation.text, annotation.rect
-
-        rect = self.create_rectangle(
-            *coords,
-            outline="red", width=2
-        )
-
-        x_center = (coords[0] + coords[2]) / 2
-        y_center = (coords[1] + coords[3]) / 2
-
-        text_id = self.create_text(
-            x_center, y_center,
-            text=label, fill="red",
+        annotation.rect = self.create_rectangle(0, 0, 0, 0, outline="red", width=2)
+        annotation.text_id = self.create_text(
+            0, 0,
+            text=annotation.text, fill="red",
             font=("Arial", 10, "bold")
         )
-
-        _ = Annotation(
-            coords=coords,
-            text=label,
-            ratio=self.ratio,
-            rect=rect,
-            text_id=text_id
-        )
+        self._place_annotation(annotation)
 
         self.annotations.append(annotation)
+        self._tag_annotation(annotation)
+        self._register_annotation(annotation)
+
+    def _place_annotation(self, annotation):
+        """Переносит элементы аннотации в координаты текущего вида."""
+        x1, y1, x2, y2 = self._view_box(annotation)
+        self.coords(annotation.rect, x1, y1, x2, y2)
+        self.coords(annotation.text_id, (x1 + x2) / 2, (y1 + y2) / 2)
 
     def get_annotations(self):
         return self.annotations
 
     def clear(self):
         """Полностью очищает canvas и сбрасывает все аннотации"""
+        self._cancel_frames()
+        self._close_overlay()
+        if self._pending is not None and self._pending.get("timer") is not None:
+            self.after_cancel(self._pending["timer"])
+        self._pending = None
         self.delete("all")  # Удаляем все элементы с canvas
         self.image_on_canvas = None
         self.image = None
         self.tk_image = None
+        self._frame_key = None
         self.image_path = None
+        self.original_size = None
+        self._drop_pyramid()
+        self._pan_start = None
         self.annotations = []  # Очищаем список аннотаций
+        self._annotations_by_id = {}
+        self._index = None
+        self._indexed = []
+        self._hover = None
+        self._handles = {}
+        self._edit = None
+        self._suggestions = []
+        self._suggestion_index = None
         self.ratio = 1.0
         self.current_rect = None
         self.configure(cursor="arrow")
 
-    @log_method
+    @traced
     def _redraw_all_annotations(self):
-        """Полная перерисовка всех элементов"""
-        # Сохраняем текущее изображение
-        current_image = self.image
-
-        # Полностью очищаем Canvas
-        self.delete("all")
-
-        # Восстанавливаем изображение (если было)
-        if current_image:
-            self._draw_image(self.image, self.image_path)
-
-        # Перерисовываем все аннотации
-        for ann in self.annotations:
-            ann.rect = self.create_rectangle(*ann.coords, outline="red", width=2)
-            x_center = (ann.coords[0] + ann.coords[2]) / 2
-            y_center = (ann.coords[1] + ann.coords[3]) / 2
-            ann.text_id = self.create_text(x_center, y_center,
-                                           text=ann.text, fill="red",
-                                           font=("Arial", 10, "bold"))
+        """Перерисовка аннотаций; кадр картинки остаётся на Canvas как есть"""
+        self.delete(self.ANNOTATION_TAG)
+        self.delete(self.HANDLE_TAG)
+        self._annotations_by_id = {}
+        self._index = None
+        self._hover = None
+        self._handles = {}
+
+        annotations, self.annotations = self.annotations, []
+        for ann in annotations:
+            self.add_annotation(ann)
 
     def set_default_label(self, label):
         if label.strip() != '':
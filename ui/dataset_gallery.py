@@ -0,0 +1,221 @@
+import tkinter as tk
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+
+class DatasetCard:
+    """Карточка датасета; виджеты создаются один раз и переиспользуются."""
+
+    def __init__(self, gallery: "VirtualDatasetGallery"):
+        self.gallery = gallery
+        self.folder: Optional[Path] = None
+        self.info: Optional[Dict[str, Any]] = None
+        app = gallery.app
+
+        self.frame = tk.Frame(
+            gallery.canvas,
+            width=gallery.ITEM_WIDTH,
+            height=gallery.ITEM_HEIGHT,
+            bg="white",
+            bd=1,
+            relief=tk.RAISED,
+            highlightbackground="#e0e0e0",
+            highlightthickness=1
+        )
+        self.frame.pack_propagate(False)
+
+        # Чекбокс для выбора
+        self.var = tk.IntVar()
+        self.checkbox = tk.Checkbutton(
+            self.frame,
+            variable=self.var,
+            bg="white",
+            command=lambda: app._toggle_dataset_selection(self.folder, self.var)
+        )
+        self.checkbox.var = self.var  # Сохраняем ссылку на переменную
+        self.checkbox.place(x=5, y=5)
+
+        # Контейнер для изображения
+        self.img_container = tk.Frame(self.frame, bg="white", height=gallery.PREVIEW_SIZE + 10)
+        self.img_container.pack(fill=tk.X, pady=(25, 5))
+        self.img_container.pack_propagate(False)
+        self.preview_frame = None
+
+        # Название датасета
+        self.name_label = tk.Label(
+            self.frame,
+            bg="white",
+            wraplength=gallery.ITEM_WIDTH - 20,
+            cursor="hand"
+        )
+        self.name_label.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.name_label.bind("<Button-1>", lambda _: app._modify_dataset(self.folder))
+
+        # Статистика и кнопки управления
+        stat_frame = tk.Frame(self.frame, bg="white")
+        stat_frame.pack(fill=tk.X, pady=(0, 5))
+
+        self.stat_label = tk.Label(stat_frame, bg="white", font=("Arial", 8))
+        self.stat_label.pack(side=tk.LEFT, padx=5)
+
+        # Кнопки: скачивание, редактирование, удаление
+        for text, color, command in (
+                ("↓", "green", lambda: app._download_dataset(self.folder)),
+                ("✏️", "blue", lambda: app._edit_dataset(self.folder)),
+                ("×", "red", lambda: app._delete_single_dataset(self.folder)),
+        ):
+            tk.Button(
+                stat_frame,
+                text=text,
+                fg=color,
+                bg="white",
+                bd=0,
+                font=("Arial", 12, "bold"),
+                command=command
+            ).pack(side=tk.RIGHT, padx=2)
+
+        self.window = gallery.canvas.create_window(0, 0, window=self.frame, anchor="nw", state="hidden")
+
+    def bind(self, folder: Path, info: Dict[str, Any]):
+        """Показывает в карточке датасет; неизменившиеся части не трогает."""
+        preview_changed = self.info is None or self.folder != folder or self.info["preview"] != info["preview"]
+        self.folder = folder
+        self.info = info
+
+        self.name_label.configure(text=info["real_name"])
+        self.stat_label.configure(text=f"Аннотировано: {info['annotated']}/{info['images']}")
+        self.var.set(1 if folder in self.gallery.app.selected_datasets else 0)
+
+        if preview_changed:
+            # Новый фрейм: превью, которое ещё догружается для старого датасета, сюда не попадёт
+            if self.preview_frame is not None:
+                self.preview_frame.destroy()
+            self.preview_frame = tk.Frame(self.img_container, bg="white")
+            self.preview_frame.pack(fill=tk.BOTH, expand=True)
+            if info["preview"]:
+                try:
+                    self.gallery.app._show_preview(
+                        self.preview_frame,
+                        info["preview"],
+                        lambda _, card=self: card.gallery.app._modify_dataset(card.folder)
+                    )
+                except Exception as e:
+                    print(f"Ошибка загрузки изображения: {e}")
+                    tk.Label(self.preview_frame, text="No preview", bg="white", fg="gray").pack(pady=20)
+
+    def place(self, x: int, y: int):
+        self.gallery.canvas.coords(self.window, x, y)
+        self.gallery.canvas.itemconfigure(self.window, state="normal")
+
+    def hide(self):
+        self.gallery.canvas.itemconfigure(self.window, state="hidden")
+
+
+class VirtualDatasetGallery:
+    """Галерея датасетов на Canvas, создающая карточки только для видимых строк.
+
+    При прокрутке карточки, ушедшие из видимой области, переиспользуются для
+    новых строк. `update()` применяет новый список датасетов как разницу:
+    перерисовываются только карточки, у которых сменился датасет или его данные.
+    """
+
+    ITEMS_PER_ROW = 3
+    ITEM_WIDTH = 250
+    ITEM_HEIGHT = ITEM_WIDTH + 60
+    PREVIEW_SIZE = 150
+    PAD = 10
+    # Лишние строки сверху и снизу, чтобы прокрутка не показывала пустоты
+    OVERSCAN_ROWS = 1
+
+    def __init__(self, app, canvas: tk.Canvas, v_scroll: tk.Scrollbar, header: tk.Widget,
+                 describe: Callable[[Path], Dict[str, Any]], header_height: int = 50):
+        self.app = app
+        self.canvas = canvas
+        self.v_scroll = v_scroll
+        self.describe = describe
+        self.header_height = header_height
+        self.folders: List[Path] = []
+        self._visible: Dict[int, DatasetCard] = {}
+        self._free: List[DatasetCard] = []
+        self._layout_pending = False
+        self._scrollregion = None
+
+        canvas.create_window(self.PAD // 2, 0, window=header, anchor="nw")
+        canvas.configure(yscrollcommand=self._on_yscroll)
+        canvas.bind("<Configure>", lambda _: self._schedule_layout())
+
+    @property
+    def cell_width(self) -> int:
+        return self.ITEM_WIDTH + 2 * self.PAD
+
+    @property
+    def cell_height(self) -> int:
+        return self.ITEM_HEIGHT + 2 * self.PAD
+
+    def _on_yscroll(self, first, last):
+        self.v_scroll.set(first, last)
+        self._schedule_layout()
+
+    def _schedule_layout(self):
+        if not self._layout_pending:
+            self._layout_pending = True
+            self.canvas.after_idle(self._layout)
+
+    def _visible_range(self) -> range:
+        top = self.canvas.canvasy(0) - self.header_height
+        bottom = top + max(self.canvas.winfo_height(), self.cell_height)
+        first_row = max(int(top // self.cell_height) - self.OVERSCAN_ROWS, 0)
+        last_row = int(bottom // self.cell_height) + self.OVERSCAN_ROWS
+        start = first_row * self.ITEMS_PER_ROW
+        return range(start, min((last_row + 1) * self.ITEMS_PER_ROW, len(self.folders)))
+
+    def _release(self, index: int):
+        card = self._visible.pop(index)
+        card.hide()
+        self._free.append(card)
+
+    def _layout(self):
+        self._layout_pending = False
+        rows = (len(self.folders) + self.ITEMS_PER_ROW - 1) // self.ITEMS_PER_ROW
+        scrollregion = (0, 0, self.ITEMS_PER_ROW * self.cell_width, self.header_height + rows * self.cell_height)
+        if scrollregion != self._scrollregion:
+            # Без проверки смена области снова вызывала бы yscrollcommand и раскладку
+            self._scrollregion = scrollregion
+            self.canvas.configure(scrollregion=scrollregion)
+
+        visible = self._visible_range()
+        for index in [i for i in self._visible if i not in visible]:
+            self._release(index)
+
+        for index in visible:
+            if index in self._visible:
+                continue
+            card = self._free.pop() if self._free else DatasetCard(self)
+            card.bind(self.folders[index], self.describe(self.folders[index]))
+            card.place(
+                (index % self.ITEMS_PER_ROW) * self.cell_width + self.PAD,
+                self.header_height + (index // self.ITEMS_PER_ROW) * self.cell_height + self.PAD
+            )
+            self._visible[index] = card
+
+    def update(self, folders: List[Path]):
+        """Применяет новый список датасетов, меняя только отличающиеся карточки."""
+        self.folders = list(folders)
+        for index, card in list(self._visible.items()):
+            if index >= len(self.folders):
+                self._release(index)
+                continue
+            folder = self.folders[index]
+            info = self.describe(folder)
+            if card.folder != folder or card.info != info:
+                card.bind(folder, info)
+        self._layout()
+
+    def refresh_selection(self):
+        """Синхронизирует чекбоксы видимых карточек с выбором приложения."""
+        for card in self._visible.values():
+            card.var.set(1 if card.folder in self.app.selected_datasets else 0)
+
+    def card_count(self) -> int:
+        """Сколько карточек реально создано (для отладки)."""
+        return len(self._visible) + len(self._free)
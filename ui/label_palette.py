@@ -0,0 +1,145 @@
+import tkinter as tk
+from tkinter import ttk
+from typing import Callable, Optional
+
+from utils.label_vocabulary import LabelVocabulary
+
+
+class LabelOverlay:
+    """Поле ввода метки прямо на Canvas рядом с рамкой, с подсказками.
+
+    Enter — выбранная подсказка, введённый текст или (если пусто) последняя
+    метка; цифры 1–9 при пустом поле — метка из палитры; Escape — отмена.
+    `on_done(метка или None)` вызывается ровно один раз.
+    """
+
+    WIDTH = 180
+
+    def __init__(self, canvas: tk.Canvas, vocabulary: LabelVocabulary, x: float, y: float,
+                 on_done: Callable[[Optional[str]], None], initial: str = ""):
+        self.canvas = canvas
+        self.vocabulary = vocabulary
+        self.on_done = on_done
+        self._choices = []
+
+        self.frame = tk.Frame(canvas, bg="#ff9900", bd=1)
+        self.var = tk.StringVar(value=initial)
+        self.entry = tk.Entry(self.frame, textvariable=self.var)
+        self.entry.pack(fill=tk.X)
+        self.listbox = tk.Listbox(self.frame, height=6, activestyle="none", exportselection=False)
+        self.listbox.pack(fill=tk.X)
+        self.window = canvas.create_window(0, 0, window=self.frame, anchor="nw", width=self.WIDTH)
+        self.move_to(x, y)
+
+        self.entry.bind("<Key>", self._on_key)
+        self.entry.bind("<KeyRelease>", self._on_key_release)
+        self.entry.bind("<Return>", lambda e: self.accept())
+        self.entry.bind("<Escape>", lambda e: self.cancel())
+        self.entry.bind("<Down>", lambda e: self._move_selection(1))
+        self.entry.bind("<Tab>", lambda e: self._move_selection(1))
+        self.entry.bind("<Up>", lambda e: self._move_selection(-1))
+        self.listbox.bind("<ButtonRelease-1>", lambda e: self.accept())
+
+        self._refresh()
+        self.entry.focus_set()
+        self.entry.select_range(0, tk.END)
+
+    def move_to(self, x: float, y: float):
+        """Ставит поле справа от точки, а у края Canvas — слева от неё."""
+        width = int(self.canvas.cget("width"))
+        if x + self.WIDTH > width:
+            x = max(x - self.WIDTH - 8, 0)
+        self.canvas.coords(self.window, x, max(y, 0))
+
+    def _refresh(self):
+        text = self.var.get()
+        self._choices = []
+        rows = []
+        last = self.vocabulary.last_label
+        if not text.strip() and last:
+            self._choices.append(last)
+            rows.append(f"↵  {last}")
+        palette = self.vocabulary.palette()
+        for label in self.vocabulary.complete(text):
+            if label in self._choices:
+                continue
+            self._choices.append(label)
+            number = palette.index(label) + 1 if not text.strip() and label in palette else None
+            rows.append(f"{number}  {label}" if number else f"    {label}")
+
+        self.listbox.delete(0, tk.END)
+        for row in rows:
+            self.listbox.insert(tk.END, row)
+        self.listbox.configure(height=max(min(len(rows), 6), 1))
+
+    def _on_key(self, event):
+        if event.char and event.char in "123456789" and not self.var.get().strip():
+            label = self.vocabulary.palette_label(int(event.char))
+            if label is not None:
+                self.accept(label)
+                return "break"
+        return None
+
+    def _on_key_release(self, event):
+        if event.keysym not in ("Up", "Down", "Tab", "Return", "Escape"):
+            self._refresh()
+
+    def _move_selection(self, step: int):
+        if not self._choices:
+            return "break"
+        current = self.listbox.curselection()
+        index = (current[0] + step) % len(self._choices) if current else (0 if step > 0 else len(self._choices) - 1)
+        self.listbox.selection_clear(0, tk.END)
+        self.listbox.selection_set(index)
+        self.listbox.see(index)
+        return "break"
+
+    def accept(self, label: Optional[str] = None):
+        if label is None:
+            selected = self.listbox.curselection()
+            if selected:
+                label = self._choices[selected[0]]
+            else:
+                label = self.var.get().strip() or self.vocabulary.last_label
+        self._finish(label or None)
+        return "break"
+
+    def cancel(self):
+        self._finish(None)
+        return "break"
+
+    def _finish(self, label: Optional[str]):
+        if self.on_done is None:
+            return
+        on_done, self.on_done = self.on_done, None
+        self.canvas.delete(self.window)
+        self.frame.destroy()
+        self.canvas.focus_set()
+        on_done(label)
+
+
+class LabelPalette(ttk.Frame):
+    """Палитра частых классов датасета: кнопки 1–9 для окна разметки."""
+
+    def __init__(self, parent, vocabulary: LabelVocabulary, on_pick: Callable[[str], None]):
+        super().__init__(parent)
+        self.vocabulary = vocabulary
+        self.on_pick = on_pick
+        ttk.Label(self, text="Классы (клавиши 1–9):").pack(anchor="w", pady=(10, 5))
+        self.buttons_frame = ttk.Frame(self)
+        self.buttons_frame.pack(fill=tk.X)
+        vocabulary.add_listener(self.refresh)
+        self.refresh()
+
+    def refresh(self):
+        for child in self.buttons_frame.winfo_children():
+            child.destroy()
+        palette = self.vocabulary.palette()
+        if not palette:
+            ttk.Label(self.buttons_frame, text="Пока нет меток", foreground="gray").pack(anchor="w")
+        for number, label in enumerate(palette, start=1):
+            ttk.Button(
+                self.buttons_frame,
+                text=f"{number}  {label}",
+                command=lambda l=label: self.on_pick(l)
+            ).pack(fill=tk.X, pady=1)
@@ -1,7 +1,12 @@
-from dataclasses import dataclass
+import uuid
+from dataclasses import dataclass, field
 from typing import List, Dict, Any
 
 
+def new_annotation_id() -> str:
+    return uuid.uuid4().hex
+
+
 @dataclass
 class Annotation:
     coords: List[float]
@@ -9,6 +14,8 @@ class Annotation:
     ratio: float
     rect: int
     text_id: int
+    # Постоянный идентификатор, сохраняется в файле разметки
+    id: str = field(default_factory=new_annotation_id)
 
     def __eq__(self, other):
         if not isinstance(other, Annotation):
@@ -26,7 +33,8 @@ class Annotation:
             'text': self.text,
             'ratio': self.ratio,
             'rect': self.rect,
-            'text_id': self.text_id
+            'text_id': self.text_id,
+            'id': self.id
         }
 
     @classmethod
@@ -36,5 +44,6 @@ class Annotation:
             text=data['text'],
             ratio=data['ratio'],
             rect=data['rect'],
-            text_id=data['text_id']
+            text_id=data['text_id'],
+            id=data.get('id') or new_annotation_id()
         )
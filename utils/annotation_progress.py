@@ -0,0 +1,131 @@
+import base64
+import json
+import threading
+import zlib
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional
+
+from utils.annotation_storage import atomic_write_json
+from utils.dir_listing import listing_cache
+from utils.json_manager import AnnotationFileManager
+from utils.paths import DATA_DIR
+
+PROGRESS_PATH = DATA_DIR / "annotated_dataset" / ".progress.json"
+
+_file_lock = threading.Lock()
+
+
+def _load_progress() -> Dict[str, Dict[str, Any]]:
+    try:
+        with open(PROGRESS_PATH, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+class AnnotationProgress:
+    """Позиция разметки датасета: курсор и битовая карта размеченных картинок.
+
+    Карта выровнена с отсортированным списком файлов и хранится в
+    `annotated_dataset/.progress.json` вместе с последней открытой картинкой,
+    поэтому при открытии датасета файлы заново не перебираются. Пока трекер
+    открыт, карта обновляется по уведомлениям менеджера аннотаций.
+    """
+
+    def __init__(self, folder: str, image_files: List[str], manager: AnnotationFileManager):
+        self.folder = str(folder)
+        self.image_files = image_files
+        self.manager = manager
+
+        saved = _load_progress().get(self.folder, {})
+        self.cursor: Optional[str] = saved.get("cursor")
+        self.bitmap = self._restore(saved) or self._build()
+        manager.add_change_listener(self._on_annotations_changed)
+
+    def _listing_mtime(self) -> Optional[int]:
+        try:
+            return listing_cache.get(self.folder).mtime_ns
+        except OSError:
+            return None
+
+    def _restore(self, saved: Dict[str, Any]) -> Optional[bytearray]:
+        """Сохранённая карта, если папка и число размеченных картинок не изменились."""
+        if saved.get("listing_mtime_ns") != self._listing_mtime() or saved.get("count") != len(self.image_files):
+            return None
+        try:
+            bitmap = bytearray(zlib.decompress(base64.b64decode(saved["bitmap"])))
+        except (KeyError, ValueError, zlib.error):
+            return None
+        if len(bitmap) != len(self.image_files):
+            return None
+        # Аннотации могли поменять, пока датасет был закрыт (импорт, объединение)
+        if bitmap.count(1) != len(self.manager.annotated_files(self.folder)):
+            return None
+        return bitmap
+
+    def _build(self) -> bytearray:
+        return bytearray(
+            1 if self.manager.is_annotated(self.folder, name) else 0
+            for name in self.image_files
+        )
+
+    def _on_annotations_changed(self, folder: Optional[str], file: Optional[str] = None):
+        if folder is None:
+            self.bitmap = self._build()
+        elif folder == self.folder:
+            if file is None:
+                self.bitmap = self._build()
+            else:
+                self.mark(file)
+
+    def index_of(self, name: str) -> Optional[int]:
+        i = bisect_left(self.image_files, name)
+        if i < len(self.image_files) and self.image_files[i] == name:
+            return i
+        return None
+
+    def mark(self, name: str):
+        """Обновляет бит картинки по текущим аннотациям."""
+        i = self.index_of(name)
+        if i is not None:
+            self.bitmap[i] = 1 if self.manager.is_annotated(self.folder, name) else 0
+
+    def set_cursor(self, index: int):
+        if 0 <= index < len(self.image_files):
+            self.cursor = self.image_files[index]
+
+    def next_unannotated(self, index: int) -> Optional[int]:
+        i = self.bitmap.find(0, index + 1)
+        return i if i >= 0 else None
+
+    def prev_unannotated(self, index: int) -> Optional[int]:
+        i = self.bitmap.rfind(0, 0, max(index, 0))
+        return i if i >= 0 else None
+
+    def resume_index(self) -> int:
+        """Картинка для продолжения: последняя открытая, иначе первая неразмеченная."""
+        if self.cursor is not None:
+            i = self.index_of(self.cursor)
+            if i is not None:
+                return i
+        i = self.bitmap.find(0)
+        return i if i >= 0 else 0
+
+    def save(self):
+        entry = {
+            "cursor": self.cursor,
+            "listing_mtime_ns": self._listing_mtime(),
+            "count": len(self.image_files),
+            "bitmap": base64.b64encode(zlib.compress(bytes(self.bitmap))).decode("ascii"),
+        }
+        with _file_lock:
+            data = _load_progress()
+            data[self.folder] = entry
+            try:
+                atomic_write_json(PROGRESS_PATH, data, indent=None)
+            except OSError as e:
+                print(f"Не удалось сохранить позицию разметки: {e}")
+
+    def close(self):
+        self.save()
+        self.manager.remove_change_listener(self._on_annotations_changed)
@@ -0,0 +1,578 @@
+import copy
+import json
+import os
+import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from utils.json_stream import StreamingJsonDocument
+
+
+AnnotationList = List[Dict[str, Any]]
+FolderData = Dict[str, AnnotationList]
+AnnotationData = Dict[str, FolderData]
+
+# Бэкенд по умолчанию можно переопределить переменной окружения
+DEFAULT_BACKEND = os.getenv("IMAGE_ANNOTATION_BACKEND", "sharded")
+
+# Папка с шардами лежит рядом с датасетами, поэтому она скрытая
+SHARDS_DIR_NAME = ".annotations"
+
+
+def atomic_write_json(path: Union[str, Path], data: Any, indent: Optional[int] = 4):
+    """Пишет JSON во временный файл и атомарно подменяет им исходный."""
+    path = Path(path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, indent=indent)
+    os.replace(tmp_path, path)
+
+
+class AnnotationStorage:
+    """Интерфейс хранилища аннотаций: папка -> файл -> список аннотаций.
+
+    Все операции записи идемпотентны (устанавливают значение целиком),
+    поэтому менеджер может держать свою копию данных в памяти. Хранилище
+    не отдаёт наружу свои внутренние объекты, а переданные в запись забирает
+    себе: запись может идти из фонового потока, пока менеджер меняет данные.
+    """
+
+    def folders(self) -> List[str]:
+        raise NotImplementedError
+
+    def has_folder(self, folder: str) -> bool:
+        return folder in self.folders()
+
+    def load_folder(self, folder: str) -> FolderData:
+        raise NotImplementedError
+
+    def load_all(self) -> AnnotationData:
+        return {folder: self.load_folder(folder) for folder in self.folders()}
+
+    def write_image(self, folder: str, image: str, annotations: AnnotationList):
+        raise NotImplementedError
+
+    def delete_image(self, folder: str, image: str):
+        raise NotImplementedError
+
+    def write_folder(self, folder: str, images: FolderData):
+        raise NotImplementedError
+
+    def delete_folder(self, folder: str):
+        raise NotImplementedError
+
+    def write_all(self, data: AnnotationData):
+        """Полностью заменяет содержимое хранилища."""
+        with self.batch():
+            for folder in set(self.folders()) - set(data.keys()):
+                self.delete_folder(folder)
+            for folder, images in data.items():
+                self.write_folder(folder, images)
+
+    @contextmanager
+    def batch(self):
+        """Группирует несколько операций в одну запись на диск."""
+        yield
+
+    def signature(self) -> Any:
+        """Отпечаток состояния на диске: меняется, когда данные изменили извне."""
+        return None
+
+    def folder_signature(self, folder: str) -> Any:
+        """Отпечаток одной папки на диске; по умолчанию — всего хранилища."""
+        return self.signature()
+
+    def validate_folder(self, folder: str):
+        """Бросает ValueError, если в папку нельзя писать."""
+        pass
+
+    def reload(self):
+        """Перечитывает данные после изменения извне."""
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonAnnotationStorage(AnnotationStorage):
+    """Один JSON-файл на все датасеты (исходный формат).
+
+    Файл читается потоково: по индексу смещений разбирается только
+    запрошенный датасет. При записи изменённые датасеты сериализуются
+    заново, а остальные копируются из старого файла без разбора.
+    """
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = Path(file_path)
+        self._batch_depth = 0
+        self._dirty = False
+        self._load_or_create()
+
+    def _load_or_create(self):
+        if not self.file_path.exists():
+            self.file_path.write_text("{}", encoding="utf-8")
+        self._document = StreamingJsonDocument(self.file_path)
+        # Порядок датасетов в файле и изменённые, но ещё не записанные датасеты
+        self._folders = dict.fromkeys(self._document.keys())
+        self._changed: AnnotationData = {}
+
+    def _read(self, folder: str) -> FolderData:
+        if folder in self._changed:
+            return self._changed[folder]
+        if folder not in self._document:
+            return {}
+        data = self._document.load(folder)
+        # Проверяем, что структура соответствует нужному формату
+        if not isinstance(data, dict):
+            raise ValueError("JSON must be a dict of dicts of lists!")
+        return data
+
+    def signature(self) -> Any:
+        try:
+            stat = self.file_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        self._load_or_create()
+
+    def _dump(self):
+        if self._batch_depth:
+            self._dirty = True
+            return
+        self._document.rewrite(self._folders, self._changed)
+        self._changed = {}
+        self._dirty = False
+
+    def _change(self, folder: str) -> FolderData:
+        if folder not in self._changed:
+            self._changed[folder] = self._read(folder)
+        self._folders.setdefault(folder, None)
+        return self._changed[folder]
+
+    def folders(self) -> List[str]:
+        return list(self._folders)
+
+    def has_folder(self, folder: str) -> bool:
+        return folder in self._folders
+
+    def load_folder(self, folder: str) -> FolderData:
+        if folder in self._changed:
+            return copy.deepcopy(self._changed[folder])
+        return self._read(folder)
+
+    def write_image(self, folder: str, image: str, annotations: AnnotationList):
+        self._change(folder)[image] = annotations
+        self._dump()
+
+    def delete_image(self, folder: str, image: str):
+        if folder not in self._folders:
+            return
+        images = self._change(folder)
+        if image in images:
+            del images[image]
+            self._dump()
+
+    def write_folder(self, folder: str, images: FolderData):
+        self._changed[folder] = images
+        self._folders.setdefault(folder, None)
+        self._dump()
+
+    def delete_folder(self, folder: str):
+        if folder in self._folders:
+            del self._folders[folder]
+            self._changed.pop(folder, None)
+            self._dump()
+
+    @contextmanager
+    def batch(self):
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth and self._dirty:
+                self._dump()
+
+
+class SqliteAnnotationStorage(AnnotationStorage):
+    """SQLite-хранилище: одна строка на аннотацию, индекс по датасету и картинке.
+
+    Каждая операция выполняется в отдельной транзакции, поэтому добавление
+    рамки стоит O(число рамок на картинке), а не O(всех аннотаций).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS datasets (
+            dataset TEXT PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS images (
+            dataset TEXT NOT NULL,
+            image TEXT NOT NULL,
+            PRIMARY KEY (dataset, image)
+        );
+        CREATE TABLE IF NOT EXISTS annotations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            dataset TEXT NOT NULL,
+            image TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+            text TEXT,
+            ratio REAL,
+            payload TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_annotations_dataset_image
+            ON annotations (dataset, image, position);
+    """
+
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = Path(db_path)
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+        self.conn = sqlite3.connect(
+            str(self.db_path),
+            isolation_level=None,  # транзакциями управляем сами
+            check_same_thread=False  # удаление датасетов идёт из фонового потока
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            if self._batch_depth == 0:
+                self.conn.execute("BEGIN")
+            self._batch_depth += 1
+            try:
+                yield
+            except Exception:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.conn.execute("ROLLBACK")
+                raise
+            else:
+                self._batch_depth -= 1
+                if self._batch_depth == 0:
+                    self.conn.execute("COMMIT")
+
+    def signature(self) -> Any:
+        # data_version меняется только при коммитах из других соединений
+        with self._lock:
+            return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def folders(self) -> List[str]:
+        with self._lock:
+            rows = self.conn.execute("SELECT dataset FROM datasets ORDER BY rowid").fetchall()
+        return [row[0] for row in rows]
+
+    def load_folder(self, folder: str) -> FolderData:
+        with self._lock:
+            images = self.conn.execute(
+                "SELECT image FROM images WHERE dataset = ? ORDER BY rowid", (folder,)
+            ).fetchall()
+            rows = self.conn.execute(
+                "SELECT image, payload FROM annotations WHERE dataset = ? ORDER BY image, position",
+                (folder,)
+            ).fetchall()
+
+        result = {image: [] for (image,) in images}
+        for image, payload in rows:
+            result.setdefault(image, []).append(json.loads(payload))
+        return result
+
+    def _insert_annotations(self, folder: str, image: str, annotations: AnnotationList):
+        rows = []
+        for position, ann in enumerate(annotations):
+            coords = list(ann.get('coords') or [None] * 4)
+            rows.append((
+                folder, image, position,
+                *coords[:4],
+                ann.get('text'),
+                ann.get('ratio'),
+                json.dumps(ann, ensure_ascii=False)
+            ))
+        self.conn.executemany(
+            "INSERT INTO annotations (dataset, image, position, x1, y1, x2, y2, text, ratio, payload) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def write_image(self, folder: str, image: str, annotations: AnnotationList):
+        with self.batch():
+            self.conn.execute("INSERT OR IGNORE INTO datasets (dataset) VALUES (?)", (folder,))
+            self.conn.execute("INSERT OR IGNORE INTO images (dataset, image) VALUES (?, ?)", (folder, image))
+            self.conn.execute("DELETE FROM annotations WHERE dataset = ? AND image = ?", (folder, image))
+            self._insert_annotations(folder, image, annotations)
+
+    def delete_image(self, folder: str, image: str):
+        with self.batch():
+            self.conn.execute("DELETE FROM images WHERE dataset = ? AND image = ?", (folder, image))
+            self.conn.execute("DELETE FROM annotations WHERE dataset = ? AND image = ?", (folder, image))
+
+    def write_folder(self, folder: str, images: FolderData):
+        with self.batch():
+            self.delete_folder(folder)
+            self.conn.execute("INSERT INTO datasets (dataset) VALUES (?)", (folder,))
+            for image, annotations in images.items():
+                self.conn.execute("INSERT INTO images (dataset, image) VALUES (?, ?)", (folder, image))
+                self._insert_annotations(folder, image, annotations)
+
+    def delete_folder(self, folder: str):
+        with self.batch():
+            self.conn.execute("DELETE FROM datasets WHERE dataset = ?", (folder,))
+            self.conn.execute("DELETE FROM images WHERE dataset = ?", (folder,))
+            self.conn.execute("DELETE FROM annotations WHERE dataset = ?", (folder,))
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class ShardedAnnotationStorage(AnnotationStorage):
+    """Отдельный JSON-файл на каждый датасет плюс небольшой индекс.
+
+    Шард называется по имени папки датасета (хэшу), а ключи папок строятся
+    от текущего расположения annotated_dataset, поэтому перенос DATA_DIR
+    ничего не ломает. Хранятся только папки, лежащие прямо в root: для
+    других ключей запись падает с ValueError, а не затирает чужой шард.
+    Изменение одного датасета переписывает только его шард.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, root: Union[str, Path], shards_dir: Union[str, Path]):
+        self.root = Path(root)
+        self.shards_dir = Path(shards_dir)
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.shards_dir / self.INDEX_NAME
+        self._lock = threading.RLock()
+        self._shards = {}
+        self._index = self._load_index()
+
+    def _name(self, folder: str) -> str:
+        path = Path(os.path.abspath(folder))
+        if path.parent != Path(os.path.abspath(self.root)):
+            raise ValueError(f"Папка {folder} не лежит в {self.root}, шард для неё не создаётся")
+        return path.name
+
+    def _check_collision(self, name: str):
+        # На нечувствительной к регистру ФС такие шарды совпали бы
+        for other in self._index:
+            if other != name and other.casefold() == name.casefold():
+                raise ValueError(f"Шард {name} совпадает с существующим шардом {other}")
+
+    def _shard_path(self, name: str) -> Path:
+        return self.shards_dir / f"{name}.json"
+
+    def _load_index(self) -> Dict[str, str]:
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, "r", encoding="utf-8") as file:
+            return json.load(file).get("datasets", {})
+
+    def _write_index(self):
+        atomic_write_json(self.index_path, {"version": 1, "datasets": self._index})
+
+    def _shard(self, name: str) -> FolderData:
+        if name not in self._shards:
+            path = self._shard_path(name)
+            if name in self._index and path.exists():
+                with open(path, "r", encoding="utf-8") as file:
+                    self._shards[name] = json.load(file)
+            else:
+                self._shards[name] = {}
+        return self._shards[name]
+
+    def _write_shard(self, name: str):
+        if name not in self._index:
+            self._check_collision(name)
+        atomic_write_json(self._shard_path(name), self._shards[name])
+        if name not in self._index:
+            self._index[name] = self._shard_path(name).name
+            self._write_index()
+
+    def signature(self) -> Any:
+        # Шарды пишутся через временный файл и rename, что меняет mtime папки
+        try:
+            return self.shards_dir.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def validate_folder(self, folder: str):
+        name = self._name(folder)
+        if name not in self._index:
+            self._check_collision(name)
+
+    def folder_signature(self, folder: str) -> Any:
+        try:
+            stat = self._shard_path(self._name(folder)).stat()
+        except (ValueError, FileNotFoundError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        with self._lock:
+            self._shards = {}
+            self._index = self._load_index()
+
+    def folders(self) -> List[str]:
+        return [str(self.root / name) for name in self._index]
+
+    def has_folder(self, folder: str) -> bool:
+        try:
+            return self._name(folder) in self._index
+        except ValueError:
+            return False
+
+    def load_folder(self, folder: str) -> FolderData:
+        try:
+            name = self._name(folder)
+        except ValueError:
+            return {}
+        with self._lock:
+            return copy.deepcopy(self._shard(name))
+
+    def write_image(self, folder: str, image: str, annotations: AnnotationList):
+        name = self._name(folder)
+        with self._lock:
+            self._shard(name)[image] = annotations
+            self._write_shard(name)
+
+    def delete_image(self, folder: str, image: str):
+        name = self._name(folder)
+        with self._lock:
+            shard = self._shard(name)
+            if image in shard:
+                del shard[image]
+                self._write_shard(name)
+
+    def write_folder(self, folder: str, images: FolderData):
+        name = self._name(folder)
+        with self._lock:
+            self._shards[name] = images
+            self._write_shard(name)
+
+    def delete_folder(self, folder: str):
+        try:
+            name = self._name(folder)
+        except ValueError:
+            return  # такой папки в шардах быть не может
+        with self._lock:
+            self._shards.pop(name, None)
+            if name in self._index:
+                del self._index[name]
+                self._write_index()
+            path = self._shard_path(name)
+            if path.exists():
+                path.unlink()
+
+
+def migrate_storage(source: AnnotationStorage, target: AnnotationStorage):
+    """Переносит все аннотации из одного хранилища в другое одной транзакцией."""
+    with target.batch():
+        for folder in source.folders():
+            target.write_folder(folder, source.load_folder(folder))
+
+
+def migrate_to_shards(source: AnnotationStorage, target: ShardedAnnotationStorage):
+    """Переносит аннотации в шарды, переписывая ключи на текущий root.
+
+    Старые хранилища могут содержать абсолютные пути от прежнего DATA_DIR;
+    если две папки дают одно имя шарда, миграция прерывается, а не сливает их.
+    """
+    seen = {}
+    for folder in source.folders():
+        name = Path(folder).name
+        other = seen.get(name.casefold())
+        if other is not None:
+            raise ValueError(f"Папки {other} и {folder} попадают в один шард {name}")
+        seen[name.casefold()] = folder
+        target.write_folder(str(target.root / name), source.load_folder(folder))
+
+
+def migrate_json_to_sqlite(json_path: Union[str, Path], db_path: Union[str, Path]) -> SqliteAnnotationStorage:
+    """Одноразовая миграция annotations.json в SQLite.
+
+    База собирается во временном файле и переименовывается только после
+    успешного переноса, чтобы прерванная миграция не оставила пустую базу.
+    """
+    db_path = Path(db_path)
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+
+    target = SqliteAnnotationStorage(tmp_path)
+    try:
+        migrate_storage(JsonAnnotationStorage(json_path), target)
+    finally:
+        target.close()
+
+    os.replace(tmp_path, db_path)
+    return SqliteAnnotationStorage(db_path)
+
+
+def export_annotations_json(storage: AnnotationStorage, json_path: Union[str, Path],
+                            folders: Optional[List[str]] = None):
+    """Выгружает аннотации в JSON исходного формата (для совместимости)."""
+    folders = storage.folders() if folders is None else folders
+    data = {folder: storage.load_folder(folder) for folder in folders}
+    atomic_write_json(json_path, data)
+
+
+def open_sharded_storage(file_path: Union[str, Path]) -> ShardedAnnotationStorage:
+    """Открывает шарды рядом с annotations.json, при первом запуске переносит в них старые данные.
+
+    Источник миграции — annotations.sqlite3, если он есть, иначе монолитный
+    annotations.json. Шарды собираются во временной папке и переименовываются
+    целиком, так что прерванная миграция просто повторится при следующем запуске.
+    """
+    file_path = Path(file_path)
+    root = file_path.parent
+    shards_dir = root / SHARDS_DIR_NAME
+    if shards_dir.exists():
+        return ShardedAnnotationStorage(root, shards_dir)
+
+    db_path = file_path.with_suffix(".sqlite3")
+    if db_path.exists():
+        source = SqliteAnnotationStorage(db_path)
+    elif file_path.exists():
+        source = JsonAnnotationStorage(file_path)
+    else:
+        return ShardedAnnotationStorage(root, shards_dir)
+
+    tmp_dir = root / (SHARDS_DIR_NAME + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    try:
+        migrate_to_shards(source, ShardedAnnotationStorage(root, tmp_dir))
+    finally:
+        source.close()
+    os.replace(tmp_dir, shards_dir)
+    return ShardedAnnotationStorage(root, shards_dir)
+
+
+def create_annotation_storage(file_path: Union[str, Path], backend: Optional[str] = None) -> AnnotationStorage:
+    """Создаёт хранилище для `annotations.json` с учётом выбранного бэкенда.
+
+    Путь всегда указывает на annotations.json: для шардов рядом с ним
+    создаётся папка .annotations, для SQLite — annotations.sqlite3, а при
+    первом запуске в них переносятся данные из старого хранилища.
+    """
+    file_path = Path(file_path)
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == "sharded":
+        return open_sharded_storage(file_path)
+    if backend == "json":
+        return JsonAnnotationStorage(file_path)
+    if backend == "sqlite":
+        db_path = file_path.with_suffix(".sqlite3")
+        if not db_path.exists() and file_path.exists():
+            return migrate_json_to_sqlite(file_path, db_path)
+        return SqliteAnnotationStorage(db_path)
+    raise ValueError(f"Unknown annotation backend: {backend}")
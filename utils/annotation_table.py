@@ -0,0 +1,192 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class AnnotationTable:
+    """Колоночное представление аннотаций для массовых операций.
+
+    Каждая рамка — строка: координаты x1/y1/x2/y2 и ratio в массивах float64,
+    класс — int32-код в словаре `classes`, картинка и датасет — коды в своих
+    словарях. Таблица обновляется по картинкам: старые строки помечаются
+    удалёнными, новые дописываются в конец, мусор периодически сжимается.
+    """
+
+    _FLOAT_COLUMNS = ("x1", "y1", "x2", "y2", "ratio")
+    _INT_COLUMNS = ("class_id", "image_id", "dataset_id")
+
+    def __init__(self, capacity: int = 1024):
+        self.size = 0
+        self.dead = 0
+        for name in self._FLOAT_COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=np.float64))
+        for name in self._INT_COLUMNS:
+            setattr(self, name, np.zeros(capacity, dtype=np.int32))
+        self.alive = np.zeros(capacity, dtype=bool)
+
+        self.classes: List[str] = []
+        self._class_ids: Dict[str, int] = {}
+        self.datasets: List[str] = []
+        self._dataset_ids: Dict[str, int] = {}
+        self.images: List[Tuple[int, str]] = []
+        self._image_ids: Dict[Tuple[int, str], int] = {}
+        self._image_rows: Dict[int, np.ndarray] = {}
+
+    def __len__(self) -> int:
+        return self.size - self.dead
+
+    # --- словари ---------------------------------------------------------
+
+    @staticmethod
+    def _intern(name: str, values: List[Any], ids: Dict[Any, int]) -> int:
+        code = ids.get(name)
+        if code is None:
+            code = ids[name] = len(values)
+            values.append(name)
+        return code
+
+    def has_dataset(self, dataset: str) -> bool:
+        return dataset in self._dataset_ids
+
+    def _columns(self):
+        return self._FLOAT_COLUMNS + self._INT_COLUMNS + ("alive",)
+
+    def _reserve(self, extra: int):
+        capacity = len(self.alive)
+        if self.size + extra <= capacity:
+            return
+        new_capacity = max(capacity * 2, self.size + extra)
+        for name in self._columns():
+            column = getattr(self, name)
+            grown = np.zeros(new_capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    def _compact(self):
+        """Выкидывает удалённые строки и пересчитывает строки картинок."""
+        keep = np.flatnonzero(self.alive[:self.size])
+        for name in self._columns():
+            column = getattr(self, name)
+            column[:len(keep)] = column[keep]
+        self.alive[len(keep):self.size] = False
+        self.size = len(keep)
+        self.dead = 0
+
+        image_ids = self.image_id[:self.size]
+        order = np.argsort(image_ids, kind="stable")
+        bounds = np.flatnonzero(np.diff(image_ids[order])) + 1
+        self._image_rows = {
+            int(image_ids[rows[0]]): rows
+            for rows in np.split(order, bounds) if len(rows)
+        }
+
+    # --- изменения -------------------------------------------------------
+
+    def _drop_rows(self, rows: Optional[np.ndarray]):
+        if rows is not None and len(rows):
+            self.alive[rows] = False
+            self.dead += len(rows)
+
+    def set_image(self, dataset: str, file: str, annotations: Optional[List[dict]]):
+        """Заменяет строки картинки её текущими аннотациями."""
+        dataset_id = self._intern(dataset, self.datasets, self._dataset_ids)
+        image_id = self._intern((dataset_id, file), self.images, self._image_ids)
+        self._drop_rows(self._image_rows.pop(image_id, None))
+
+        annotations = [ann for ann in annotations or [] if isinstance(ann, dict)]
+        if annotations:
+            count = len(annotations)
+            self._reserve(count)
+            start, end = self.size, self.size + count
+
+            coords = np.array([ann['coords'] for ann in annotations], dtype=np.float64).reshape(count, 4)
+            self.x1[start:end] = coords[:, 0]
+            self.y1[start:end] = coords[:, 1]
+            self.x2[start:end] = coords[:, 2]
+            self.y2[start:end] = coords[:, 3]
+            self.ratio[start:end] = [ann.get('ratio') or 1.0 for ann in annotations]
+            self.class_id[start:end] = [
+                self._intern(ann['text'], self.classes, self._class_ids) for ann in annotations
+            ]
+            self.image_id[start:end] = image_id
+            self.dataset_id[start:end] = dataset_id
+            self.alive[start:end] = True
+
+            self.size = end
+            self._image_rows[image_id] = np.arange(start, end)
+
+        if self.dead > 1024 and self.dead * 2 > self.size:
+            self._compact()
+
+    def set_dataset(self, dataset: str, folder_data: Dict[str, List[dict]]):
+        """Заменяет все строки датасета."""
+        self.drop_dataset(dataset)
+        for file, annotations in folder_data.items():
+            self.set_image(dataset, file, annotations)
+
+    def drop_dataset(self, dataset: str):
+        dataset_id = self._dataset_ids.get(dataset)
+        if dataset_id is None:
+            return
+        for image_id in [i for i, (d, _) in enumerate(self.images) if d == dataset_id]:
+            self._drop_rows(self._image_rows.pop(image_id, None))
+
+    # --- запросы ---------------------------------------------------------
+
+    def mask(
+            self,
+            datasets: Optional[Iterable[str]] = None,
+            classes: Optional[Iterable[str]] = None
+    ) -> np.ndarray:
+        """Булева маска живых строк, отфильтрованных по датасетам и классам."""
+        result = self.alive[:self.size].copy()
+        if datasets is not None:
+            ids = [self._dataset_ids[d] for d in datasets if d in self._dataset_ids]
+            result &= np.isin(self.dataset_id[:self.size], ids)
+        if classes is not None:
+            ids = [self._class_ids[c] for c in classes if c in self._class_ids]
+            result &= np.isin(self.class_id[:self.size], ids)
+        return result
+
+    def original_coords(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Координаты рамок в пикселях исходного изображения, массив (n, 4)."""
+        if mask is None:
+            mask = self.mask()
+        coords = np.stack([
+            self.x1[:self.size][mask], self.y1[:self.size][mask],
+            self.x2[:self.size][mask], self.y2[:self.size][mask]
+        ], axis=1)
+        return coords / self.ratio[:self.size][mask][:, None]
+
+    def class_histogram(self, datasets: Optional[Iterable[str]] = None) -> Dict[str, int]:
+        """Количество рамок по классам."""
+        counts = np.bincount(self.class_id[:self.size][self.mask(datasets)], minlength=len(self.classes))
+        return {name: int(count) for name, count in zip(self.classes, counts) if count}
+
+    def class_names(self, datasets: Optional[Iterable[str]] = None) -> List[str]:
+        """Отсортированный список встречающихся классов."""
+        return sorted(self.class_histogram(datasets))
+
+    def dataset_counts(self) -> Dict[str, int]:
+        """Количество рамок по датасетам."""
+        counts = np.bincount(self.dataset_id[:self.size][self.mask()], minlength=len(self.datasets))
+        return {name: int(count) for name, count in zip(self.datasets, counts)}
+
+    def image_boxes(self, dataset: str, file: str) -> Tuple[np.ndarray, List[str]]:
+        """Рамки картинки в исходных координатах и их метки."""
+        dataset_id = self._dataset_ids.get(dataset)
+        image_id = self._image_ids.get((dataset_id, file))
+        rows = self._image_rows.get(image_id)
+        if rows is None:
+            return np.zeros((0, 4)), []
+        coords = np.stack([self.x1[rows], self.y1[rows], self.x2[rows], self.y2[rows]], axis=1)
+        labels = [self.classes[code] for code in self.class_id[rows]]
+        return coords / self.ratio[rows][:, None], labels
+
+    @staticmethod
+    def to_yolo(boxes: np.ndarray, width: int, height: int) -> np.ndarray:
+        """Переводит рамки (x1, y1, x2, y2) в нормированные (cx, cy, w, h) YOLO."""
+        size = np.array([width, height, width, height], dtype=np.float64)
+        x1, y1, x2, y2 = boxes.T
+        yolo = np.stack([(x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1], axis=1) / size
+        return np.clip(yolo, 0.0, 1.0)
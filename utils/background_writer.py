@@ -0,0 +1,173 @@
+import atexit
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+
+class LatencyStats:
+    """Простая статистика задержек: количество, среднее, максимум, последнее значение."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "max_ms": self.max * 1000,
+            "last_ms": self.last * 1000,
+        }
+
+
+class DebouncedWriter:
+    """Фоновый поток, который копит изменённые ключи и записывает их пачкой.
+
+    Запись происходит, когда изменения не поступали `delay` секунд (но не позже
+    `max_delay` после первого изменения), либо сразу при вызове `flush()`.
+    Повторные изменения одного ключа до записи схлопываются в одну запись.
+
+    Неудачная запись повторяется с удвоением паузы (до `MAX_BACKOFF` секунд).
+    После `max_failures` неудач подряд поток перестаёт повторять сам —
+    ключи остаются в очереди до явного `flush()`, — а `on_error(ошибка)`
+    вызывается один раз, чтобы показать ошибку пользователю.
+    """
+
+    MAX_BACKOFF = 30.0
+
+    def __init__(self, flush_fn: Callable[[List[Hashable]], None], delay: float = 0.5, max_delay: float = 3.0,
+                 max_failures: int = 5, on_error: Optional[Callable[[Exception], None]] = None):
+        self.flush_fn = flush_fn
+        self.delay = delay
+        self.max_delay = max_delay
+        self.max_failures = max_failures
+        self.on_error = on_error
+
+        self._cond = threading.Condition()
+        self._dirty = {}  # упорядоченное множество ключей
+        self._first_mark = None
+        self._last_mark = None
+        self._flushing = False
+        self._closed = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self._gave_up = False
+        self._reported = False
+
+        self.flush_latency = LatencyStats()
+        self.write_latency = LatencyStats()
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def mark_dirty(self, key: Hashable):
+        with self._cond:
+            self._dirty[key] = None
+            self._last_mark = time.monotonic()
+            if self._first_mark is None:
+                self._first_mark = self._last_mark
+            self._cond.notify_all()
+
+    def _take(self) -> List[Hashable]:
+        keys = list(self._dirty)
+        self._dirty.clear()
+        self._first_mark = None
+        self._last_mark = None
+        return keys
+
+    def _write(self, keys: List[Hashable]):
+        start = time.perf_counter()
+        error = None
+        try:
+            self.flush_fn(keys)
+            with self._cond:
+                self._failures = 0
+                self._retry_at = 0.0
+                self._gave_up = False
+                self._reported = False
+        except Exception as e:
+            error = e
+            # Возвращаем ключи, чтобы не потерять изменения
+            with self._cond:
+                for key in keys:
+                    self._dirty.setdefault(key, None)
+                if self._first_mark is None:
+                    self._first_mark = self._last_mark = time.monotonic()
+                self._failures += 1
+                if self._failures == 1:
+                    print(f"Ошибка фоновой записи: {e}")
+                backoff = min(self.delay * 2 ** self._failures, self.MAX_BACKOFF)
+                self._retry_at = time.monotonic() + backoff
+                if self._failures >= self.max_failures and not self._gave_up:
+                    self._gave_up = True
+                    print(f"Фоновая запись остановлена после {self._failures} неудач: {e}")
+        finally:
+            self.flush_latency.add(time.perf_counter() - start)
+            with self._cond:
+                self._flushing = False
+                self._cond.notify_all()
+                report = self._gave_up and not self._reported
+                if report:
+                    self._reported = True
+        if error is not None and report and self.on_error is not None:
+            self.on_error(error)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._closed and (not self._dirty or self._flushing or self._gave_up):
+                    self._cond.wait()
+                # Ждём паузы в изменениях (и паузы перед повтором после ошибки)
+                while not self._closed and self._dirty and not self._gave_up:
+                    due = min(self._last_mark + self.delay, self._first_mark + self.max_delay)
+                    due = max(due, self._retry_at)
+                    now = time.monotonic()
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if self._closed:
+                    return
+                if self._flushing or not self._dirty or self._gave_up:
+                    continue
+                keys = self._take()
+                self._flushing = True
+            self._write(keys)
+
+    def flush(self):
+        """Синхронно записывает все накопленные изменения."""
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            keys = self._take()
+            if not keys:
+                return
+            self._flushing = True
+        self._write(keys)
+
+    def close(self):
+        """Записывает остаток и останавливает поток (вызывается и при выходе)."""
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "failures": self._failures,
+            "flush": self.flush_latency.as_dict(),
+            "write": self.write_latency.as_dict(),
+        }
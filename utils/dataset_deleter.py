@@ -5,7 +5,8 @@ from pathlib import Path
 from tkinter import messagebox
 import tkinter as tk
 from tkinter import ttk
-from utils.json_manager import JsonManager
+from utils.json_manager import get_json_manager, get_annotation_manager
+from utils.dataset_stats import get_dataset_stats
 from utils.paths import DATA_DIR
 
 
@@ -30,11 +31,11 @@ class DatasetDeleter:
         hash_to_name_path = output_dir / 'hash_to_name.json'
 
         if not self.test_dataset:
-            hash_to_name_manager = JsonManager(hash_to_name_path)
+            hash_to_name_manager = get_json_manager(hash_to_name_path)
             dataset_names = ' '.join(
                 list(map(lambda dataset: Path(hash_to_name_manager[Path(dataset).name]).name, datasets)))
         else:
-            hash_to_name_manager = JsonManager(hash_to_name_path)
+            hash_to_name_manager = get_json_manager(hash_to_name_path)
             dataset_names = ' '.join(
                 list(map(lambda dataset: Path(hash_to_name_manager[Path(dataset).parent.parent.name]).name, datasets)))
 
@@ -72,8 +73,9 @@ class DatasetDeleter:
         output_dir = DATA_DIR / "annotated_dataset"
         annotations_path = output_dir / 'annotations.json'
         hash_to_name_path = output_dir / 'hash_to_name.json'
-        annotations_manager = JsonManager(annotations_path)
-        hash_to_name_manager = JsonManager(hash_to_name_path)
+        annotations_manager = get_annotation_manager(annotations_path)
+        hash_to_name_manager = get_json_manager(hash_to_name_path)
+        dataset_stats = get_dataset_stats(output_dir)
 
         try:
             for i, dataset in enumerate(datasets, 1):
@@ -92,6 +94,7 @@ class DatasetDeleter:
                     if not self.test_dataset:
                         annotations_manager.delete_key(dataset_path)
                         hash_to_name_manager.delete_key(dataset.name)
+                        dataset_stats.forget(dataset_path)
 
                     self.queue.put(("progress", i, len(datasets)))
 
@@ -101,6 +104,7 @@ class DatasetDeleter:
             if not self.test_dataset:
                 annotations_manager.save()
                 hash_to_name_manager.save()
+                dataset_stats.save()
 
             self.queue.put(("complete", task_id))
         except Exception as e:
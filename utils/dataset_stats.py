@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from utils.annotation_storage import atomic_write_json
+from utils.json_manager import AnnotationFileManager, get_annotation_manager
+from utils.dir_listing import listing_cache
+
+
+STATS_FILE_NAME = ".dataset_stats.json"
+
+
+class DatasetStatsCache:
+    """Кэш статистики датасетов для галереи.
+
+    Для каждой папки хранятся число картинок, первая картинка для превью,
+    число размеченных картинок и рамок, гистограмма классов и mtime папки.
+    Файловая часть пересчитывается, только если mtime папки изменился,
+    аннотационная — после записи аннотаций этой папки через менеджер или
+    если отпечаток её аннотаций на диске (шарда) не совпал с сохранённым:
+    так ловятся изменения после последнего `save()` — падение, правка
+    извне, другой экземпляр программы.
+    Кэш сохраняется в `annotated_dataset/.dataset_stats.json`.
+    """
+
+    def __init__(self, output_dir: Union[str, Path], annotation_manager: AnnotationFileManager):
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / STATS_FILE_NAME
+        self._lock = threading.Lock()
+        self._stale = set()
+        self._changed = False
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self.annotation_manager = None
+        self.attach(annotation_manager)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        """Сохраняет кэш на диск, если он менялся."""
+        with self._lock:
+            if not self._changed:
+                return
+            entries = dict(self._entries)
+            self._changed = False
+        try:
+            atomic_write_json(self.path, entries, indent=None)
+        except OSError as e:
+            print(f"Не удалось сохранить статистику датасетов: {e}")
+
+    def attach(self, annotation_manager: AnnotationFileManager):
+        """Подписывается на изменения аннотаций менеджера."""
+        if annotation_manager is self.annotation_manager:
+            return
+        if self.annotation_manager is not None:
+            # Менеджер пересоздан: его данные могли разойтись с кэшем
+            self._on_annotations_changed(None)
+        self.annotation_manager = annotation_manager
+        annotation_manager.add_change_listener(self._on_annotations_changed)
+
+    def _on_annotations_changed(self, folder: Optional[str], file: Optional[str] = None):
+        with self._lock:
+            if folder is None:
+                # Хранилище перечитано целиком — пересчитываем аннотации всех папок
+                self._stale.update(self._entries)
+            else:
+                self._stale.add(folder)
+
+    def _scan_images(self, folder: Path, entry: Dict[str, Any]):
+        names = listing_cache.get(folder).images
+        entry["image_count"] = len(names)
+        entry["preview"] = names[0] if names else None
+
+    def _annotations_signature(self, key: str):
+        signature = self.annotation_manager.folder_signature(key)
+        # В JSON кортеж превращается в список — сравниваем в одном виде
+        return list(signature) if isinstance(signature, tuple) else signature
+
+    def _count_annotations(self, key: str, entry: Dict[str, Any]):
+        # Отпечаток снимаем до подсчёта: запись во время подсчёта вызовет пересчёт
+        entry["annotations_signature"] = self._annotations_signature(key)
+        folder_data = self.annotation_manager.get_folder_info(key)
+        classes = Counter(
+            ann['text']
+            for annotations in folder_data.values()
+            for ann in annotations
+        )
+        entry["annotated_count"] = len(self.annotation_manager.annotated_files(key))
+        entry["box_count"] = sum(classes.values())
+        entry["classes"] = dict(classes)
+
+    def get(self, folder: Union[str, Path]) -> Dict[str, Any]:
+        """Статистика папки; пересчитывается только устаревшая часть."""
+        folder = Path(folder)
+        key = str(folder)
+        try:
+            mtime_ns = folder.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime_ns = None
+
+        with self._lock:
+            entry = dict(self._entries.get(key, {}))
+            annotations_stale = key in self._stale or "box_count" not in entry
+            self._stale.discard(key)
+        if not annotations_stale and entry.get("annotations_signature") != self._annotations_signature(key):
+            annotations_stale = True
+
+        if entry.get("mtime_ns") != mtime_ns or "image_count" not in entry:
+            if mtime_ns is None:
+                entry.update(image_count=0, preview=None)
+            else:
+                self._scan_images(folder, entry)
+            entry["mtime_ns"] = mtime_ns
+            annotations_stale = True
+        if annotations_stale:
+            self._count_annotations(key, entry)
+
+        with self._lock:
+            if self._entries.get(key) != entry:
+                self._entries[key] = entry
+                self._changed = True
+        return entry
+
+    def forget(self, folder: Union[str, Path]):
+        """Убирает удалённый датасет из кэша."""
+        with self._lock:
+            if self._entries.pop(str(folder), None) is not None:
+                self._changed = True
+
+
+_caches: Dict[str, DatasetStatsCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_dataset_stats(output_dir: Union[str, Path]) -> DatasetStatsCache:
+    """Общий на процесс кэш статистики для папки annotated_dataset."""
+    output_dir = Path(output_dir)
+    key = os.path.abspath(output_dir)
+    manager = get_annotation_manager(output_dir / 'annotations.json')
+    with _caches_lock:
+        cache = _caches.get(key)
+        if cache is None:
+            cache = _caches[key] = DatasetStatsCache(output_dir, manager)
+        else:
+            cache.attach(manager)
+        return cache
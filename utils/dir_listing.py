@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Union
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif')
+
+# Если папка менялась совсем недавно, её mtime может не отразить изменение
+# в тот же квант времени — такой листинг перепроверяем при следующем запросе
+_RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+class FileEntry(NamedTuple):
+    name: str
+    size: int
+    mtime_ns: int
+
+
+class DirectoryListing:
+    """Снимок содержимого папки: файлы с размером и mtime, отсортированные картинки."""
+
+    def __init__(self, path: str, mtime_ns: int, entries: Dict[str, FileEntry]):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.entries = entries
+        self.images = sorted(name for name in entries if name.lower().endswith(IMAGE_EXTENSIONS))
+        self.trusted = time.time_ns() - mtime_ns > _RACY_WINDOW_NS
+
+
+class DirectoryListingCache:
+    """Общий кэш листингов папок, сбрасывается по mtime самой папки."""
+
+    def __init__(self):
+        self._listings: Dict[str, DirectoryListing] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _scan(path: str, mtime_ns: int) -> DirectoryListing:
+        entries = {}
+        with os.scandir(path) as it:
+            for item in it:
+                if not item.is_file():
+                    continue
+                stat = item.stat()
+                entries[item.name] = FileEntry(item.name, stat.st_size, stat.st_mtime_ns)
+        return DirectoryListing(path, mtime_ns, entries)
+
+    def get(self, path: Union[str, Path]) -> DirectoryListing:
+        path = os.path.abspath(path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            listing = self._listings.get(path)
+            if listing is not None and listing.mtime_ns == mtime_ns and listing.trusted:
+                self.hits += 1
+                return listing
+            self.misses += 1
+
+        listing = self._scan(path, mtime_ns)
+        with self._lock:
+            self._listings[path] = listing
+        return listing
+
+    def invalidate(self, path: Optional[Union[str, Path]] = None):
+        with self._lock:
+            if path is None:
+                self._listings.clear()
+            else:
+                self._listings.pop(os.path.abspath(path), None)
+
+    def stats(self) -> Dict[str, int]:
+        return {"folders": len(self._listings), "hits": self.hits, "misses": self.misses}
+
+
+listing_cache = DirectoryListingCache()
+
+
+def list_images(path: Union[str, Path]) -> List[str]:
+    """Отсортированные имена картинок в папке (из общего кэша листингов)."""
+    return list(listing_cache.get(path).images)
@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from PIL import Image
+
+
+def image_nbytes(image: Image.Image) -> int:
+    """Примерный объём декодированной картинки в памяти."""
+    width, height = image.size
+    return width * height * len(image.getbands())
+
+
+class ImageCache:
+    """Потокобезопасный LRU-кэш декодированных картинок с лимитом по байтам."""
+
+    def __init__(self, max_bytes: int = 96 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Image.Image]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def put(self, key: Hashable, image: Image.Image):
+        nbytes = image_nbytes(image)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size_bytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._items[key] = (image, nbytes)
+            self.size_bytes += nbytes
+            # Вытесняем давно не использованные
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size_bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "items": len(self._items),
+                "bytes": self.size_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
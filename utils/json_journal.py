@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Union
+
+
+def _apply_record(data: Dict[str, Any], record: Dict[str, Any]):
+    path = record["path"]
+    target = data
+    for key in path[:-1]:
+        if not isinstance(target.get(key), dict):
+            target[key] = {}
+        target = target[key]
+
+    if record["op"] == "set":
+        target[path[-1]] = record["value"]
+    elif record["op"] == "del":
+        target.pop(path[-1], None)
+
+
+def replay_journal(journal_path: Union[str, Path], data: Dict[str, Any]) -> Dict[str, Any]:
+    """Накатывает записи журнала на загруженный документ."""
+    journal_path = Path(journal_path)
+    if not journal_path.exists():
+        return data
+
+    with open(journal_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Оборванная последняя запись после падения — пропускаем
+                continue
+            _apply_record(data, record)
+    return data
+
+
+class JsonJournal:
+    """Журнал изменений JSON-документа с групповым fsync и фоновым сжатием.
+
+    Каждое изменение дописывается в `<file>.journal` одной строкой и сразу
+    сбрасывается в ОС; fsync выполняется пачками фоновым потоком. Когда журнал
+    вырастает больше `compact_bytes` или старше `compact_age` секунд, поток
+    сворачивает его в основной файл через `write_base`.
+    """
+
+    def __init__(
+            self,
+            journal_path: Union[str, Path],
+            write_base: Callable[[], None],
+            group_size: int = 64,
+            group_delay: float = 0.05,
+            compact_bytes: int = 1024 * 1024,
+            compact_age: float = 30.0
+    ):
+        self.journal_path = Path(journal_path)
+        self.write_base = write_base
+        self.group_size = group_size
+        self.group_delay = group_delay
+        self.compact_bytes = compact_bytes
+        self.compact_age = compact_age
+
+        self.lock = threading.RLock()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._pending = 0
+        self._first_record_at = None
+        self._file = open(self.journal_path, "a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, op: str, path: List[str], value: Any = None):
+        record = {"op": op, "path": path}
+        if op == "set":
+            record["value"] = value
+
+        with self.lock:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._pending += 1
+            if self._first_record_at is None:
+                self._first_record_at = time.monotonic()
+            if self._pending >= self.group_size:
+                self._wakeup.set()
+
+    def sync(self):
+        """Гарантирует, что все записи журнала дошли до диска."""
+        with self.lock:
+            if self._pending:
+                os.fsync(self._file.fileno())
+                self._pending = 0
+
+    def compact(self):
+        """Сворачивает журнал в основной файл и очищает его."""
+        with self.lock:
+            if self._first_record_at is None:
+                return
+            self.write_base()
+            self._file.truncate(0)
+            self._file.seek(0)
+            self._pending = 0
+            self._first_record_at = None
+
+    def _needs_compaction(self) -> bool:
+        if self._first_record_at is None:
+            return False
+        if time.monotonic() - self._first_record_at >= self.compact_age:
+            return True
+        return self._file.tell() >= self.compact_bytes
+
+    def _run(self):
+        while not self._closed:
+            self._wakeup.wait(self.group_delay)
+            self._wakeup.clear()
+            try:
+                with self.lock:
+                    if self._closed:
+                        break
+                    self.sync()
+                    if self._needs_compaction():
+                        self.compact()
+            except Exception as e:
+                print(f"Ошибка записи журнала {self.journal_path}: {e}")
+
+    def close(self):
+        """Останавливает фоновый поток и сворачивает журнал."""
+        with self.lock:
+            if self._closed:
+                return
+            self.compact()
+            self._closed = True
+            self._file.close()
+        self._wakeup.set()
+        try:
+            self.journal_path.unlink()
+        except FileNotFoundError:
+            pass
@@ -1,14 +1,48 @@
+import copy
 import json
+import os
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Union, Dict, List
-from utils.annotation import Annotation
+from typing import Any, Union, Dict, List, Optional
+from utils.annotation import Annotation, new_annotation_id
+from utils.annotation_storage import create_annotation_storage, export_annotations_json
+from utils.annotation_table import AnnotationTable
+from utils.background_writer import DebouncedWriter
+from utils.json_journal import JsonJournal, replay_journal
 
 
 class JsonManager:
-    def __init__(self, file_path: Union[str, Path], autosave: bool = True):
+    def __init__(self, file_path: Union[str, Path], autosave: bool = True, journal: bool = False):
         self.file_path = Path(file_path)
+        self.journal_path = self.file_path.with_name(self.file_path.name + ".journal")
         self.autosave = autosave
         self.data = self._load_or_create()
+        # В режиме журнала изменения дописываются в <file>.journal,
+        # а основной файл переписывается фоновым сжатием
+        self.journal = None
+        if journal:
+            self.enable_journal()
+        else:
+            self._absorb_journal()
+        self._signature = self.signature()
+
+    def enable_journal(self):
+        """Включает режим журнала; журналом владеет этот менеджер до `close()`."""
+        if self.journal is None:
+            self.journal = JsonJournal(self.journal_path, lambda: self._write_base(durable=True))
+
+    def _absorb_journal(self):
+        """Сворачивает оставшийся после падения журнал в основной файл.
+
+        Без журнала менеджер не должен удалять чужие записи, поэтому журнал
+        удаляется только здесь — после того как уже накатан в `self.data`
+        и основной файл с ним записан на диск.
+        """
+        if self.journal is None and self.journal_path.exists():
+            self._write_base(durable=True)
+            self.journal_path.unlink()
 
     def values(self):
         return self.data.values()
@@ -16,101 +50,593 @@ class JsonManager:
     def keys(self):
         return self.data.keys()
 
+    def signature(self):
+        """Размер и mtime файла и журнала — по ним реестр решает, нужно ли перечитывать."""
+        result = []
+        for path in (self.file_path, self.journal_path):
+            try:
+                stat = path.stat()
+                result.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                result.append(None)
+        return tuple(result)
+
+    def is_stale(self) -> bool:
+        """Файл изменён не этим менеджером."""
+        return self.signature() != self._signature
+
+    def reload(self):
+        """Перечитывает файл с диска."""
+        with self._mutation():
+            self.data = self._load_or_create()
+            self._absorb_journal()
+            self._signature = self.signature()
+
+    def _write_base(self, durable: bool = False):
+        """Атомарно переписывает основной файл целиком."""
+        tmp_path = self.file_path.with_name(self.file_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(self.data, file, indent=4)
+            if durable:
+                # Перед очисткой журнала основной файл должен быть на диске
+                file.flush()
+                os.fsync(file.fileno())
+        os.replace(tmp_path, self.file_path)
+
     def _save(self):
         """Сохраняет данные в JSON-файл."""
-        with open(self.file_path, "w", encoding="utf-8") as file:
-            json.dump(self.data, file, indent=4)
+        if self.journal is not None:
+            self.journal.sync()
+            return
+        self._write_base()
 
     def _load_or_create(self) -> Dict[str, Any]:
-        """Загружает JSON или создаёт файл."""
+        """Загружает JSON или создаёт файл, затем накатывает журнал."""
         if not self.file_path.exists():
             self.file_path.write_text("{}", encoding="utf-8")
-            return {}
-        with open(self.file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            return data
+            data = {}
+        else:
+            with open(self.file_path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        return replay_journal(self.journal_path, data)
+
+    def _mutation(self):
+        """Блокировка изменений: сжатие журнала не должно видеть их наполовину."""
+        return self.journal.lock if self.journal is not None else nullcontext()
+
+    def _record(self, op: str, path: List[str], value: Any = None, save: bool = True):
+        if self.journal is not None:
+            self.journal.append(op, path, value)
+        elif save and self.autosave:
+            self._save()
+        self._signature = self.signature()
 
     def __getitem__(self, key: str) -> Any:
         """Получить значение по ключу """
         return self.data.setdefault(key, None)
 
     def __setitem__(self, key: str, value: Any):
-        self.data[key] = value
-        if self.autosave:
-            self._save()
+        with self._mutation():
+            self.data[key] = value
+            self._record("set", [key], value)
 
     def __delitem__(self, key: str):
-        del self.data[key]
-        if self.autosave:
-            self._save()
+        with self._mutation():
+            del self.data[key]
+            self._record("del", [key])
 
     def __repr__(self) -> str:
         return f"JsonManager(file='{self.file_path}', data={self.data})"
 
+    def set_path(self, path: List[str], value: Any):
+        """Устанавливает вложенное значение: `manager.set_path(['папка', 'файл'], value)`.
+
+        В режиме журнала записывается только изменённое значение, а не весь ключ.
+        """
+        with self._mutation():
+            target = self.data
+            for key in path[:-1]:
+                if not isinstance(target.get(key), dict):
+                    target[key] = {}
+                target = target[key]
+            target[path[-1]] = value
+            self._record("set", list(path), value)
+
     def delete_key(self, key: str):
         """Удаляет ключ без немедленного сохранения."""
-        if key in self.data:
-            del self.data[key]
+        with self._mutation():
+            if key in self.data:
+                del self.data[key]
+                self._record("del", [key], save=False)
 
     def set_key(self, key: str, value: Any):
         """Устанавливает значение без немедленного сохранения."""
-        self.data[key] = value
+        with self._mutation():
+            self.data[key] = value
+            self._record("set", [key], value, save=False)
 
     def save(self):
         """Явное сохранение всех изменений."""
         self._save()
+        self._signature = self.signature()
+
+    def close(self):
+        """Сворачивает журнал в основной файл и останавливает фоновый поток."""
+        if self.journal is not None:
+            with self.journal.lock:
+                self.journal.close()
+                self.journal = None
+            self._signature = self.signature()
+
+
+class _FileNameIndex:
+    """Индекс размеченных файлов папки: основа имени -> ключи с аннотациями."""
+
+    def __init__(self, folder_data: Dict[str, List[Any]]):
+        self.annotated = {}  # упорядоченное множество ключей с непустыми аннотациями
+        self.stems = {}
+        for file, annotations in folder_data.items():
+            self.update(file, annotations)
+
+    @staticmethod
+    def stem(file: str) -> str:
+        return os.path.splitext(file)[0]
+
+    def update(self, file: str, annotations: Optional[List[Any]]):
+        keys = self.stems.setdefault(self.stem(file), [])
+        if annotations:
+            self.annotated[file] = None
+            if file not in keys:
+                keys.append(file)
+        else:
+            self.annotated.pop(file, None)
+            if file in keys:
+                keys.remove(file)
+            if not keys:
+                del self.stems[self.stem(file)]
+
+    def find(self, file: str) -> Optional[str]:
+        """Ключ самого файла или его варианта с другим расширением."""
+        if file in self.annotated:
+            return file
+        keys = self.stems.get(self.stem(file))
+        return keys[0] if keys else None
 
 
 class AnnotationFileManager(JsonManager):
-    def __init__(self, file_path: Union[str, Path]):
+    """Аннотации вида папка -> файл -> список аннотаций.
+
+    Данные хранятся в подключаемом хранилище (см. utils.annotation_storage),
+    папки подгружаются в память по мере обращения к ним. После
+    `enable_write_behind()` изменения картинок записываются фоновым потоком.
+    """
+
+    def __init__(self, file_path: Union[str, Path], backend: Optional[str] = None):
+        self.backend = backend
+        self.writer = None
+        self._lock = threading.RLock()
+        # папка -> файл -> {id аннотации: позиция в списке из self.data}
+        self._ann_index = {}
+        # папка -> _FileNameIndex
+        self._name_index = {}
+        # Колоночная таблица для аналитики, создаётся при первом запросе
+        self._table = None
+        # Подписчики на изменения: получают папку (None — перечитано всё) и файл (None — вся папка)
+        self._listeners = []
+        # Подписчики на ошибку фоновой записи (после того как повторы исчерпаны)
+        self._error_listeners = []
         super().__init__(file_path)
 
     def _load_or_create(self) -> Dict[str, Dict[str, List[Any]]]:
-        """Загружает JSON или создаёт файл с пустым словарём словарей."""
-        if not self.file_path.exists():
-            self.file_path.write_text("{}", encoding="utf-8")
-            return {}
-        with open(self.file_path, "r", encoding="utf-8") as file:
-            data = json.load(file)
-            # Проверяем, что структура соответствует нужному формату
-            if not all(isinstance(v, dict) for v in data.values()):
-                raise ValueError("JSON must be a dict of dicts of lists!")
-            return data
+        """Открывает хранилище; сами папки загружаются лениво."""
+        self.storage = create_annotation_storage(self.file_path, self.backend)
+        return {}
+
+    def _save(self):
+        """Дописывает отложенные изменения (остальное уже в хранилище)."""
+        self.flush()
+
+    def signature(self):
+        return self.storage.signature()
+
+    def folder_signature(self, folder: str):
+        """Отпечаток аннотаций папки на диске (для кэшей, переживающих перезапуск)."""
+        return self.storage.folder_signature(folder)
+
+    def reload(self):
+        """Сбрасывает загруженные папки и перечитывает хранилище."""
+        self.flush()
+        with self._lock:
+            self.storage.reload()
+            self.data = {}
+            self._ann_index = {}
+            self._name_index = {}
+            self._table = None
+        self._signature = self.signature()
+        self._notify(None)
+
+    def _written(self):
+        self._signature = self.signature()
+
+    def enable_write_behind(self, delay: float = 0.5):
+        """Включает отложенную запись: изменения копятся и пишутся фоновым потоком."""
+        if self.writer is None:
+            self.writer = DebouncedWriter(self._flush_dirty, delay=delay, on_error=self._on_write_error)
+
+    def add_write_error_listener(self, callback):
+        """`callback(ошибка)` из фонового потока, когда запись перестала удаваться."""
+        self._error_listeners.append(callback)
+
+    def remove_write_error_listener(self, callback):
+        if callback in self._error_listeners:
+            self._error_listeners.remove(callback)
+
+    def _on_write_error(self, error: Exception):
+        for callback in list(self._error_listeners):
+            callback(error)
+
+    def flush(self):
+        """Немедленно записывает отложенные изменения."""
+        if self.writer is not None:
+            self.writer.flush()
+
+    def write_metrics(self) -> Dict[str, Any]:
+        """Задержки фоновой записи (пусто, если она выключена)."""
+        return self.writer.metrics() if self.writer is not None else {}
+
+    def add_change_listener(self, callback):
+        """Подписка на изменения аннотаций: `callback(folder, file)`, None — изменено всё."""
+        self._listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _notify(self, folder: Optional[str], file: Optional[str] = None):
+        for callback in list(self._listeners):
+            callback(folder, file)
+
+    def _persist_image(self, folder: str, file: str):
+        self._notify(folder, file)
+        if self._table is not None and self._table.has_dataset(folder):
+            with self._lock:
+                folder_data = self.data.get(folder)
+                if folder_data is not None:
+                    self._table.set_image(folder, file, folder_data.get(file))
+        if self.writer is not None:
+            self.writer.mark_dirty((folder, file))
+        else:
+            self._write_image(folder, file)
+
+    def _write_image(self, folder: str, file: str):
+        # Снимок берём под блокировкой: список может меняться из потока Tk
+        with self._lock:
+            folder_data = self.data.get(folder)
+            if folder_data is None:
+                return  # папку удалили до записи
+            annotations = folder_data.get(file)
+            snapshot = copy.deepcopy(annotations) if annotations is not None else None
+
+        if snapshot is None:
+            self.storage.delete_image(folder, file)
+        else:
+            self.storage.write_image(folder, file, snapshot)
+        self._written()
+
+    def _flush_dirty(self, keys: List[Any]):
+        with self.storage.batch():
+            for folder, file in keys:
+                start = time.perf_counter()
+                self._write_image(folder, file)
+                self.writer.write_latency.add(time.perf_counter() - start)
+
+    def _assign_ids(self, folder: str, folder_data: Dict[str, List[Any]], persist: bool = True):
+        """Выдаёт идентификаторы старым аннотациям, записанным без `id`.
+
+        Выданные id сразу сохраняются: иначе после `reload()` они
+        сменятся, и id, которые держит открытое окно разметки, потеряются.
+        """
+        changed = []
+        for file, annotations in folder_data.items():
+            missing = [ann for ann in annotations if isinstance(ann, dict) and not ann.get('id')]
+            for ann in missing:
+                ann['id'] = new_annotation_id()
+            if missing:
+                changed.append(file)
+        if not changed or not persist:
+            return
+        if self.writer is not None:
+            for file in changed:
+                self.writer.mark_dirty((folder, file))
+            return
+        with self.storage.batch():
+            for file in changed:
+                self.storage.write_image(folder, file, copy.deepcopy(folder_data[file]))
+        self._written()
+
+    def _image_index(self, folder: str, file: str) -> Dict[str, int]:
+        """Позиции аннотаций картинки по id, строятся при первом обращении."""
+        files = self._ann_index.setdefault(folder, {})
+        index = files.get(file)
+        if index is None:
+            annotations = self.data[folder].get(file, [])
+            index = files[file] = {
+                ann['id']: i for i, ann in enumerate(annotations) if isinstance(ann, dict)
+            }
+        return index
+
+    def _folder(self, folder: str, create: bool = False) -> Optional[Dict[str, List[Any]]]:
+        if folder not in self.data:
+            if self.storage.has_folder(folder):
+                self.data[folder] = self.storage.load_folder(folder)
+                self._ann_index.pop(folder, None)
+                self._assign_ids(folder, self.data[folder])
+            elif create:
+                self.data[folder] = {}
+            else:
+                return None
+            self._name_index[folder] = _FileNameIndex(self.data[folder])
+        return self.data[folder]
+
+    def _index_file(self, folder: str, file: str):
+        """Обновляет индекс имён после изменения аннотаций файла."""
+        index = self._name_index.get(folder)
+        if index is not None:
+            index.update(file, self.data[folder].get(file))
+
+    def keys(self):
+        folders = self.storage.folders()
+        known = set(folders)
+        # Папки, созданные в памяти и ещё не записанные фоновым потоком
+        return folders + [folder for folder in self.data if folder not in known]
+
+    def values(self):
+        return [self._folder(folder) for folder in self.keys()]
+
+    def __getitem__(self, key: str) -> Any:
+        """Получить аннотации папки или None."""
+        return self._folder(key)
+
+    def __setitem__(self, key: str, value: Any):
+        self.flush()
+        with self._lock:
+            self.data[key] = value
+            self._ann_index.pop(key, None)
+            # Папка целиком пишется ниже, отдельно сохранять id не нужно
+            self._assign_ids(key, value, persist=False)
+            self._name_index[key] = _FileNameIndex(value)
+            if self._table is not None and self._table.has_dataset(key):
+                self._table.set_dataset(key, value)
+            snapshot = copy.deepcopy(value)
+        self.storage.write_folder(key, snapshot)
+        self._written()
+        self._notify(key)
+
+    def __delitem__(self, key: str):
+        self.delete_key(key)
+
+    def delete_key(self, key: str):
+        """Удаляет папку из хранилища."""
+        self.flush()
+        with self._lock:
+            self.data.pop(key, None)
+            self._ann_index.pop(key, None)
+            self._name_index.pop(key, None)
+            if self._table is not None:
+                self._table.drop_dataset(key)
+        self.storage.delete_folder(key)
+        self._written()
+        self._notify(key)
+
+    def set_key(self, key: str, value: Any):
+        """Заменяет аннотации папки."""
+        self[key] = value
+
+    def batch(self):
+        """Группирует изменения в одну запись: `with manager.batch(): ...`."""
+        return self.storage.batch()
 
     def delete_file(self, folder: str, file: str):
         """Удалить файл из папки: `manager.delete_file('папка', 'файл')`."""
-        if folder in self.data and file in self.data[folder]:
-            del self.data[folder][file]
-            self._save()
+        with self._lock:
+            folder_data = self._folder(folder)
+            if folder_data is None or file not in folder_data:
+                return
+            del folder_data[file]
+            self._ann_index.get(folder, {}).pop(file, None)
+            self._index_file(folder, file)
+        self._persist_image(folder, file)
 
-    def delete_annotation(self, folder: str, file: str, annotation: dict):
-        """Удалить аннотацию по файлу из папки."""
-        if folder in self.data and file in self.data[folder]:
-            for i, ann in enumerate(self.data[folder][file]):
-                if Annotation.from_dict(ann) == Annotation.from_dict(annotation):
-                    del self.data[folder][file][i]
-            self._save()
+    def delete_annotation(self, folder: str, file: str, annotation: dict) -> bool:
+        """Удалить аннотацию по файлу из папки (по `id`, если он есть)."""
+        if annotation.get('id'):
+            return self.delete_annotation_by_id(folder, file, annotation['id'])
+        with self._lock:
+            folder_data = self._folder(folder)
+            if folder_data is None or file not in folder_data:
+                return False
+            target = Annotation.from_dict(annotation)
+            kept = [
+                ann for ann in folder_data[file]
+                if Annotation.from_dict(ann) != target
+            ]
+            if len(kept) == len(folder_data[file]):
+                return False
+            folder_data[file] = kept
+            self._ann_index.get(folder, {}).pop(file, None)
+            self._index_file(folder, file)
+        self._persist_image(folder, file)
+        return True
+
+    def delete_annotation_by_id(self, folder: str, file: str, annotation_id: str) -> bool:
+        """Удалить аннотацию по её id: `manager.delete_annotation_by_id('папка', 'файл', id)`."""
+        with self._lock:
+            folder_data = self._folder(folder)
+            if folder_data is None or file not in folder_data:
+                return False
+            index = self._image_index(folder, file)
+            position = index.pop(annotation_id, None)
+            if position is None:
+                return False
+            # Порядок аннотаций сохраняется (он же порядок отрисовки и экспорта),
+            # позиции пересчитываем только у аннотаций после удалённой
+            annotations = folder_data[file]
+            del annotations[position]
+            for i in range(position, len(annotations)):
+                index[annotations[i]['id']] = i
+            self._index_file(folder, file)
+        self._persist_image(folder, file)
+        return True
+
+    def update_annotation(self, folder: str, file: str, annotation_id: str, changes: Dict[str, Any]) -> bool:
+        """Изменить поля аннотации по id: `manager.update_annotation('папка', 'файл', id, {'text': 'герб'})`."""
+        with self._lock:
+            folder_data = self._folder(folder)
+            if folder_data is None or file not in folder_data:
+                return False
+            position = self._image_index(folder, file).get(annotation_id)
+            if position is None:
+                return False
+            ann = folder_data[file][position]
+            ann.update(changes)
+            ann['id'] = annotation_id
+        self._persist_image(folder, file)
+        return True
 
     def add_file_info(self, folder: str, file: str, info: List[Any]):
         """Добавить информацию о файле: `manager.add_file_info('папка', 'файл', ['info1', 'info2'])`."""
-        self.data.setdefault(folder, {}).setdefault(file, []).extend(info)
-        self._save()
+        # Недопустимую папку отвергаем сразу, а не в фоновой записи
+        self.storage.validate_folder(folder)
+        with self._lock:
+            annotations = self._folder(folder, create=True).setdefault(file, [])
+            for ann in info:
+                if isinstance(ann, dict) and not ann.get('id'):
+                    ann['id'] = new_annotation_id()
+            start = len(annotations)
+            annotations.extend(info)
+            index = self._ann_index.get(folder, {}).get(file)
+            if index is not None:
+                index.update({ann['id']: start + i for i, ann in enumerate(info) if isinstance(ann, dict)})
+            self._index_file(folder, file)
+        self._persist_image(folder, file)
 
     def get_file_info(self, folder: str, file: str) -> List[Any]:
         """Получить информацию о файле: `info = manager.get_file_info('папка', 'файл')`."""
-        res = self.data.get(folder, {}).get(file, [])
-        if not res:
-            for any_format in ['.jpeg', '.jpg', '.png', '.gif']:
-                without_format = '.'.join(file.split('.')[:-1]) + any_format
-                if without_format in self.data.get(folder, {}).keys():
-                    return self.data.get(folder, {}).get(without_format, [])
+        key = self.find_file_key(folder, file)
+        return self.data[folder][key] if key is not None else []
+
+    def find_file_key(self, folder: str, file: str) -> Optional[str]:
+        """Ключ, под которым размечен файл (возможно, с другим расширением), или None."""
+        if self._folder(folder) is None:
+            return None
+        return self._name_index[folder].find(file)
+
+    def is_annotated(self, folder: str, file: str) -> bool:
+        """Есть ли у файла (или его варианта с другим расширением) аннотации."""
+        return self.find_file_key(folder, file) is not None
+
+    def annotated_files(self, folder: str) -> List[str]:
+        """Файлы папки, у которых есть хотя бы одна аннотация."""
+        if self._folder(folder) is None:
             return []
-        else:
-            return res
+        return list(self._name_index[folder].annotated)
 
     def get_folder_info(self, folder: str) -> Dict[str, List[Any]]:
-        """Получить информацию о файле: `info = manager.get_file_info('папка', 'файл')`."""
-        return self.data.get(folder, {})
+        """Получить аннотации всех файлов папки: `info = manager.get_folder_info('папка')`."""
+        return self._folder(folder) or {}
+
+    def annotation_table(self, folders: Optional[List[str]] = None) -> AnnotationTable:
+        """Колоночная таблица аннотаций (по умолчанию всех папок).
+
+        Папки попадают в таблицу при первом запросе, дальше она обновляется
+        вместе с каждой записью через этот менеджер.
+        """
+        with self._lock:
+            if self._table is None:
+                self._table = AnnotationTable()
+            for folder in folders if folders is not None else self.keys():
+                if not self._table.has_dataset(folder):
+                    self._table.set_dataset(folder, self._folder(folder) or {})
+            return self._table
 
     def get_data(self):
-        return self.data
+        return {folder: self._folder(folder) for folder in self.keys()}
+
+    def export_json(self, json_path: Union[str, Path], folders: Optional[List[str]] = None):
+        """Выгрузить аннотации в JSON исходного формата."""
+        self.flush()
+        export_annotations_json(self.storage, json_path, folders)
+
+    def close(self):
+        """Дописывает отложенные изменения и останавливает фоновую запись."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __repr__(self) -> str:
+        return f"AnnotationFileManager(file='{self.file_path}', storage={self.storage.__class__.__name__})"
+
+
+class JsonManagerRegistry:
+    """Общий на процесс кэш менеджеров: один живой менеджер на файл.
+
+    Файл перечитывается, только если его размер или mtime изменились не через
+    этот менеджер. Счётчики hits/misses показывают, сколько разборов сэкономлено.
+    """
+
+    def __init__(self):
+        self._managers = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path: Union[str, Path], cls=JsonManager) -> JsonManager:
+        key = (cls, os.path.abspath(file_path))
+        with self._lock:
+            manager = self._managers.get(key)
+            if manager is None:
+                self.misses += 1
+                manager = cls(file_path)
+                self._managers[key] = manager
+            elif manager.is_stale():
+                self.misses += 1
+                manager.reload()
+            else:
+                self.hits += 1
+            return manager
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "managers": len(self._managers)}
+
+    def flush_all(self):
+        """Дописывает отложенные изменения всех менеджеров (при выходе из приложения)."""
+        with self._lock:
+            managers = list(self._managers.values())
+        for manager in managers:
+            if isinstance(manager, AnnotationFileManager):
+                manager.flush()
+
+    def clear(self):
+        with self._lock:
+            self._managers.clear()
+
+
+registry = JsonManagerRegistry()
+
+
+def get_json_manager(file_path: Union[str, Path], journal: bool = False) -> JsonManager:
+    """Общий JsonManager для файла (см. JsonManagerRegistry).
+
+    `journal=True` включает режим журнала у общего менеджера: так у файла
+    остаётся один экземпляр, и журнал не удалит менеджер, который его не вёл.
+    Выключается режим через `close()`.
+    """
+    manager = registry.get(file_path, JsonManager)
+    if journal:
+        manager.enable_journal()
+    return manager
+
+
+def get_annotation_manager(file_path: Union[str, Path]) -> AnnotationFileManager:
+    """Общий AnnotationFileManager для annotations.json (см. JsonManagerRegistry)."""
+    return registry.get(file_path, AnnotationFileManager)
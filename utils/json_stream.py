@@ -0,0 +1,167 @@
+import json
+import mmap
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple, Union
+
+
+# Строка JSON (с экранированием) или скобка; всё остальное пропускается
+_TOKEN = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]]', re.DOTALL)
+
+Span = Tuple[int, int]
+
+
+def _skip_whitespace(buffer, pos: int, step: int = 1) -> int:
+    while 0 <= pos < len(buffer) and buffer[pos:pos + 1] in (b" ", b"\t", b"\r", b"\n"):
+        pos += step
+    return pos
+
+
+def scan_top_level(buffer) -> Dict[str, Span]:
+    """Находит байтовые границы значений верхнего уровня JSON-объекта.
+
+    Разбирается только структура (строки и скобки), сами значения не
+    создаются, поэтому память не зависит от размера файла.
+    """
+    spans: Dict[str, Span] = {}
+    depth = 0
+    key = None
+    value_start = None
+    closed = False
+
+    for match in _TOKEN.finditer(buffer):
+        token = match.group()
+        first = token[:1]
+        if first == b'"':
+            if depth == 1 and key is None:
+                key = json.loads(token)
+                colon = buffer.find(b":", match.end())
+                value_start = _skip_whitespace(buffer, colon + 1)
+                if buffer[value_start:value_start + 1] not in (b"{", b"[", b'"'):
+                    # Скалярное значение заканчивается перед ',' или '}'
+                    end = value_start
+                    while buffer[end:end + 1] not in (b",", b"}"):
+                        end += 1
+                    spans[key] = (value_start, _skip_whitespace(buffer, end - 1, -1) + 1)
+                    key = None
+            elif depth == 1:
+                # Строка — само значение ключа
+                spans[key] = (value_start, match.end())
+                key = None
+        elif first in (b"{", b"["):
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1 and key is not None:
+                spans[key] = (value_start, match.end())
+                key = None
+            elif depth == 0:
+                closed = True
+                break
+
+    if not closed:
+        raise ValueError("Некорректный JSON: объект верхнего уровня не закрыт")
+    return spans
+
+
+class StreamingJsonDocument:
+    """JSON-объект на диске, ключи верхнего уровня которого читаются по одному.
+
+    При первом чтении строится индекс смещений и кладётся рядом в
+    `<file>.offsets`; пока размер и mtime файла не изменились, индекс
+    берётся оттуда и файл целиком больше не сканируется.
+    """
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = Path(file_path)
+        self.index_path = self.file_path.with_name(self.file_path.name + ".offsets")
+        self.spans: Dict[str, Span] = self._load_index()
+
+    def _stat(self) -> Tuple[int, int]:
+        stat = self.file_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_index(self) -> Dict[str, Span]:
+        mtime_ns, size = self._stat()
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as file:
+                cached = json.load(file)
+            if cached["mtime_ns"] == mtime_ns and cached["size"] == size:
+                return {key: tuple(span) for key, span in cached["keys"].items()}
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        if size == 0:
+            spans = {}
+        else:
+            with open(self.file_path, "rb") as file, \
+                    mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                spans = scan_top_level(buffer)
+        self._save_index(spans)
+        return spans
+
+    def _save_index(self, spans: Dict[str, Span]):
+        mtime_ns, size = self._stat()
+        try:
+            with open(self.index_path, "w", encoding="utf-8") as file:
+                json.dump({"mtime_ns": mtime_ns, "size": size, "keys": spans}, file)
+        except OSError as e:
+            print(f"Не удалось сохранить индекс {self.index_path}: {e}")
+
+    def keys(self):
+        return self.spans.keys()
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.spans
+
+    def read_raw(self, key: str, file=None) -> bytes:
+        start, end = self.spans[key]
+        if file is not None:
+            file.seek(start)
+            return file.read(end - start)
+        with open(self.file_path, "rb") as file:
+            file.seek(start)
+            return file.read(end - start)
+
+    def load(self, key: str) -> Any:
+        """Разбирает значение одного ключа, не читая остальной файл."""
+        return json.loads(self.read_raw(key))
+
+    def rewrite(self, keys: Iterable[str], values: Dict[str, Any], indent: Optional[int] = 4):
+        """Атомарно переписывает файл в порядке `keys`.
+
+        Значения из `values` сериализуются заново, остальные ключи копируются
+        из старого файла байт в байт без разбора. Индекс обновляется сразу.
+        """
+        tmp_path = self.file_path.with_name(self.file_path.name + ".tmp")
+        pad = " " * (indent or 0)
+        newline = "\n" if indent is not None else ""
+        spans: Dict[str, Span] = {}
+
+        source = open(self.file_path, "rb") if self.file_path.exists() else None
+        try:
+            with open(tmp_path, "wb") as out:
+                out.write(b"{")
+                for i, key in enumerate(keys):
+                    prefix = ("," if i else "") + newline + pad + json.dumps(key) + ": "
+                    out.write(prefix.encode("utf-8"))
+                    if key in values:
+                        raw = json.dumps(values[key], indent=indent)
+                        if indent is not None:
+                            # Вложенные строки сдвигаем под уровень ключа
+                            raw = raw.replace("\n", "\n" + pad)
+                        raw = raw.encode("utf-8")
+                    else:
+                        raw = self.read_raw(key, source)
+                    start = out.tell()
+                    out.write(raw)
+                    spans[key] = (start, out.tell())
+                out.write((newline + "}" if spans else "}").encode("utf-8"))
+        finally:
+            if source is not None:
+                source.close()
+
+        os.replace(tmp_path, self.file_path)
+        self.spans = spans
+        self._save_index(spans)
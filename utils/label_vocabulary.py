@@ -0,0 +1,57 @@
+from typing import Dict, List, Optional
+
+
+class LabelVocabulary:
+    """Словарь классов датасета для быстрой разметки.
+
+    Метки упорядочены по частоте (при равенстве — по алфавиту), первые
+    `PALETTE_SIZE` доступны по клавишам 1–9. Новые метки добавляются по мере
+    разметки; последняя использованная запоминается для повтора.
+    """
+
+    PALETTE_SIZE = 9
+
+    def __init__(self, counts: Optional[Dict[str, int]] = None):
+        self.counts: Dict[str, int] = dict(counts or {})
+        self.last_label: Optional[str] = None
+        self._listeners = []
+        self._order = self._sorted()
+
+    def _sorted(self) -> List[str]:
+        return sorted(self.counts, key=lambda label: (-self.counts[label], label))
+
+    @property
+    def labels(self) -> List[str]:
+        return list(self._order)
+
+    def palette(self) -> List[str]:
+        return self._order[:self.PALETTE_SIZE]
+
+    def palette_label(self, number: int) -> Optional[str]:
+        """Метка для клавиши `number` (1–9)."""
+        if 1 <= number <= min(self.PALETTE_SIZE, len(self._order)):
+            return self._order[number - 1]
+        return None
+
+    def use(self, label: str):
+        """Учитывает поставленную метку."""
+        self.counts[label] = self.counts.get(label, 0) + 1
+        self.last_label = label
+        palette = self.palette()
+        self._order = self._sorted()
+        if self.palette() != palette:
+            for listener in self._listeners:
+                listener()
+
+    def complete(self, text: str, limit: int = 6) -> List[str]:
+        """Подсказки: сначала метки, начинающиеся с текста, затем содержащие его."""
+        text = text.strip().lower()
+        if not text:
+            return self._order[:limit]
+        prefix = [label for label in self._order if label.lower().startswith(text)]
+        inner = [label for label in self._order if text in label.lower() and label not in prefix]
+        return (prefix + inner)[:limit]
+
+    def add_listener(self, callback):
+        """`callback()` вызывается, когда меняется состав палитры."""
+        self._listeners.append(callback)
@@ -21,3 +21,10 @@ def get_data_dir():
 
 #  BASE_DIR = get_base_dir()
 DATA_DIR = get_data_dir()
+
+
+def get_dataset_folders(output_dir: Path):
+    """Папки датасетов в annotated_dataset (служебные скрытые папки пропускаются)"""
+    if not output_dir.exists():
+        return []
+    return [f for f in output_dir.iterdir() if f.is_dir() and not f.name.startswith('.')]
@@ -0,0 +1,93 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+
+def box_iou(a, b) -> float:
+    """IoU двух рамок (x1, y1, x2, y2)."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    inter = width * height
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class BoxIndex:
+    """Равномерная сетка над рамками для поиска по точке.
+
+    Рамки хранятся в массивах NumPy (нормализованные x1 < x2, y1 < y2).
+    Размер ячейки — медианный размер рамки, поэтому обычная рамка попадает
+    в несколько ячеек; очень большие рамки хранятся отдельным списком и
+    проверяются при каждом запросе. Результаты упорядочены по площади:
+    сначала самые мелкие, то есть вложенные рамки.
+    """
+
+    # Рамки, занимающие больше ячеек, в сетку не раскладываются
+    MAX_CELLS_PER_BOX = 64
+
+    def __init__(self, boxes):
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        self.x1 = np.minimum(boxes[:, 0], boxes[:, 2])
+        self.y1 = np.minimum(boxes[:, 1], boxes[:, 3])
+        self.x2 = np.maximum(boxes[:, 0], boxes[:, 2])
+        self.y2 = np.maximum(boxes[:, 1], boxes[:, 3])
+        self.area = (self.x2 - self.x1) * (self.y2 - self.y1)
+
+        sizes = np.maximum(self.x2 - self.x1, self.y2 - self.y1)
+        self.cell_size = max(float(np.median(sizes)), 1.0) if len(sizes) else 1.0
+
+        cells = defaultdict(list)
+        large = []
+        col1, row1 = self._cell(self.x1), self._cell(self.y1)
+        col2, row2 = self._cell(self.x2), self._cell(self.y2)
+        for i in range(len(boxes)):
+            if (col2[i] - col1[i] + 1) * (row2[i] - row1[i] + 1) > self.MAX_CELLS_PER_BOX:
+                large.append(i)
+                continue
+            for col in range(col1[i], col2[i] + 1):
+                for row in range(row1[i], row2[i] + 1):
+                    cells[(col, row)].append(i)
+        self._cells = {key: np.array(value, dtype=np.intp) for key, value in cells.items()}
+        self._large = np.array(large, dtype=np.intp)
+
+    def __len__(self) -> int:
+        return len(self.area)
+
+    def _cell(self, values):
+        return np.floor(np.asarray(values) / self.cell_size).astype(np.int64)
+
+    def _candidates(self, x1: float, y1: float, x2: float, y2: float) -> np.ndarray:
+        parts = [self._large]
+        col1, row1 = int(math.floor(x1 / self.cell_size)), int(math.floor(y1 / self.cell_size))
+        col2, row2 = int(math.floor(x2 / self.cell_size)), int(math.floor(y2 / self.cell_size))
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > len(self._cells):
+            parts.extend(self._cells.values())
+        else:
+            for col in range(col1, col2 + 1):
+                for row in range(row1, row2 + 1):
+                    cell = self._cells.get((col, row))
+                    if cell is not None:
+                        parts.append(cell)
+        return np.unique(np.concatenate(parts))
+
+    def distances(self, x: float, y: float, indices: np.ndarray) -> np.ndarray:
+        """Расстояние от точки до рамок (0 — точка внутри)."""
+        dx = np.maximum(np.maximum(self.x1[indices] - x, 0), x - self.x2[indices])
+        dy = np.maximum(np.maximum(self.y1[indices] - y, 0), y - self.y2[indices])
+        return np.hypot(dx, dy)
+
+    def query(self, x: float, y: float, radius: float = 0.0) -> np.ndarray:
+        """Индексы рамок, содержащих точку или лежащих не дальше `radius`, по возрастанию площади."""
+        if not len(self):
+            return np.empty(0, dtype=np.intp)
+        candidates = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        hits = candidates[self.distances(x, y, candidates) <= radius]
+        return hits[np.argsort(self.area[hits], kind="stable")]
+
+    def nearest(self, x: float, y: float) -> np.ndarray:
+        """Все рамки по удалённости от точки (при равенстве — меньшие раньше)."""
+        indices = np.arange(len(self))
+        return np.lexsort((self.area, self.distances(x, y, indices)))
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from PIL import Image
+
+from utils.paths import DATA_DIR
+
+
+class ThumbnailCache:
+    """Превью картинок на диске: `DATA_DIR/.thumbnails/<ключ>.jpg`.
+
+    Ключ строится из пути, mtime и размера файла, поэтому изменённая картинка
+    получает новое превью. Рядом с превью лежит `<ключ>.src` с исходной
+    строкой ключа: по ней `prune()` удаляет превью картинок, которых больше
+    нет или которые изменились. Недостающие превью создаются пулом фоновых
+    потоков.
+    """
+
+    def __init__(self, cache_dir: Union[str, Path] = DATA_DIR / ".thumbnails", size: int = 150, workers: int = 2):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _key(self, image_path: Union[str, Path]) -> Optional[str]:
+        try:
+            stat = os.stat(image_path)
+        except OSError:
+            return None
+        return f"{os.path.abspath(image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{self.size}"
+
+    def _thumb_path(self, image_path: Union[str, Path]) -> Optional[Path]:
+        key = self._key(image_path)
+        if key is None:
+            return None
+        return self.cache_dir / (hashlib.sha1(key.encode("utf-8")).hexdigest() + ".jpg")
+
+    def cached(self, image_path: Union[str, Path]) -> Optional[Path]:
+        """Путь к готовому превью или None."""
+        thumb_path = self._thumb_path(image_path)
+        if thumb_path is not None and thumb_path.exists():
+            return thumb_path
+        return None
+
+    def _generate(self, image_path: Union[str, Path], thumb_path: Path) -> Path:
+        image = Image.open(image_path)
+        image.draft("RGB", (self.size, self.size))
+        image.thumbnail((self.size, self.size))
+        tmp_path = thumb_path.with_name(thumb_path.name + f".{threading.get_ident()}.tmp")
+        image.convert("RGB").save(tmp_path, "JPEG", quality=85)
+        thumb_path.with_suffix(".src").write_text(self._key(image_path) or "", encoding="utf-8")
+        os.replace(tmp_path, thumb_path)
+        return thumb_path
+
+    def _is_current(self, key: str) -> bool:
+        try:
+            path, mtime_ns, size, thumb_size = key.rsplit("|", 3)
+            stat = os.stat(path)
+        except (ValueError, OSError):
+            return False
+        return (str(stat.st_mtime_ns), str(stat.st_size), str(self.size)) == (mtime_ns, size, thumb_size)
+
+    def prune(self) -> int:
+        """Удаляет превью удалённых и изменённых картинок; возвращает их число."""
+        removed = 0
+        for thumb_path in self.cache_dir.glob("*.jpg"):
+            source_path = thumb_path.with_suffix(".src")
+            try:
+                key = source_path.read_text(encoding="utf-8")
+            except OSError:
+                key = ""  # превью без ключа (старого формата) создастся заново
+            if self._is_current(key):
+                continue
+            with self._lock:
+                if thumb_path in self._pending:
+                    continue
+                for path in (thumb_path, source_path):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+            removed += 1
+        return removed
+
+    def _run(self, image_path, thumb_path, callbacks):
+        try:
+            result = self._generate(image_path, thumb_path)
+        except Exception as e:
+            print(f"Ошибка создания превью {image_path}: {e}")
+            result = None
+        with self._lock:
+            callbacks = self._pending.pop(thumb_path, callbacks)
+        for callback in callbacks:
+            callback(result)
+
+    def request(self, image_path: Union[str, Path], callback: Callable[[Optional[Path]], None]):
+        """Вызывает `callback(путь к превью или None)`.
+
+        Если превью уже есть, вызов синхронный; иначе — из фонового потока
+        после генерации, так что UI должен перенаправить его в свой поток.
+        """
+        thumb_path = self._thumb_path(image_path)
+        if thumb_path is None:
+            callback(None)
+            return
+        if thumb_path.exists():
+            callback(thumb_path)
+            return
+        with self._lock:
+            callbacks = self._pending.get(thumb_path)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return
+            callbacks = self._pending[thumb_path] = [callback]
+        self._executor.submit(self._run, image_path, thumb_path, callbacks)
+
+
+_thumbnail_cache = None
+
+
+def get_thumbnail_cache() -> ThumbnailCache:
+    """Общий на процесс кэш превью."""
+    global _thumbnail_cache
+    if _thumbnail_cache is None:
+        _thumbnail_cache = ThumbnailCache()
+        # Превью удалённых датасетов и изменённых картинок чистим в фоне
+        _thumbnail_cache._executor.submit(_thumbnail_cache.prune)
+    return _thumbnail_cache
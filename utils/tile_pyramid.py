@@ -0,0 +1,284 @@
+import hashlib
+import math
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Optional, Tuple, Union
+
+from PIL import Image
+
+from utils.image_cache import ImageCache
+from utils.paths import DATA_DIR
+
+TILES_DIR = DATA_DIR / ".tiles"
+# Сколько места на диске могут занимать тайлы; старые пирамиды удаляются (LRU)
+TILE_CACHE_BYTES = 2 * 1024 ** 3
+# Сканы гербов бывают больше 100 Мп, а по умолчанию Pillow считает картинки
+# больше ~179 Мп «бомбой». Порог поднят сознательно: уровень 0 декодируется
+# в одном фоновом потоке, а картинки больше этого предела не открываются,
+# и причина пишется в консоль.
+MAX_IMAGE_PIXELS = 400_000_000
+if Image.MAX_IMAGE_PIXELS is not None and Image.MAX_IMAGE_PIXELS < MAX_IMAGE_PIXELS:
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# Один поток: уровень огромного скана декодируется целиком, два сразу не держим в памяти
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tiles")
+# Недавно показанные тайлы всех пирамид
+_tile_memory = ImageCache(max_bytes=64 * 1024 * 1024)
+_trim_lock = threading.Lock()
+
+Region = Tuple[float, float, float, float]
+ScreenBox = Tuple[int, int, int, int]
+
+
+def visible_region(image_size, view_x: float, view_y: float, scale: float,
+                   viewport) -> Optional[Tuple[Region, ScreenBox]]:
+    """Видимая часть картинки: прямоугольник в координатах оригинала и его место на экране.
+
+    `view_x`/`view_y` — точка оригинала в левом верхнем углу окна,
+    `scale` — экранных пикселей на пиксель оригинала.
+    """
+    width, height = image_size
+    x0, y0 = max(view_x, 0), max(view_y, 0)
+    x1 = min(view_x + viewport[0] / scale, width)
+    y1 = min(view_y + viewport[1] / scale, height)
+    if x1 <= x0 or y1 <= y0:
+        return None
+    screen = (
+        round((x0 - view_x) * scale), round((y0 - view_y) * scale),
+        round((x1 - view_x) * scale), round((y1 - view_y) * scale),
+    )
+    if screen[2] <= screen[0] or screen[3] <= screen[1]:
+        return None
+    return (x0, y0, x1, y1), screen
+
+
+def render_region(source: Image.Image, source_scale: float, region: Region, screen: ScreenBox,
+                  origin=(0, 0), resample=Image.Resampling.BILINEAR) -> Image.Image:
+    """Вырезает `region` (координаты оригинала) из `source` и масштабирует под `screen`.
+
+    `source_scale` — пикселей `source` на пиксель оригинала, `origin` — где в
+    координатах этого масштаба лежит левый верхний угол `source`.
+    """
+    box = (
+        region[0] * source_scale - origin[0], region[1] * source_scale - origin[1],
+        region[2] * source_scale - origin[0], region[3] * source_scale - origin[1],
+    )
+    size = (screen[2] - screen[0], screen[3] - screen[1])
+    return source.resize(size, resample, box=box)
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def trim_tile_cache(cache_dir: Union[str, Path] = TILES_DIR, max_bytes: int = TILE_CACHE_BYTES,
+                    keep: Optional[Path] = None):
+    """Удаляет давно открывавшиеся пирамиды, пока кэш тайлов больше `max_bytes`.
+
+    Время обращения — mtime папки пирамиды, его обновляет каждый TilePyramid.
+    """
+    cache_dir = Path(cache_dir)
+    with _trim_lock:
+        try:
+            entries = [(entry.stat().st_mtime, Path(entry.path)) for entry in os.scandir(cache_dir) if entry.is_dir()]
+        except FileNotFoundError:
+            return
+        sizes = {path: _dir_size(path) for _, path in entries}
+        total = sum(sizes.values())
+        for _, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            if keep is not None and path == Path(keep):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= sizes[path]
+
+
+class TilePyramid:
+    """Многоуровневая пирамида тайлов картинки с кэшем на диске.
+
+    Уровень 0 — оригинал, каждый следующий вдвое меньше; последний помещается
+    в один тайл. Тайлы лежат в `DATA_DIR/.tiles/<ключ>/<уровень>/<x>_<y>.jpg`,
+    ключ строится из пути, mtime и размера файла; весь кэш ограничен
+    `TILE_CACHE_BYTES` (см. `trim_tile_cache`). Уровень создаётся целиком
+    в фоне при первом обращении: уровни от 1 — из JPEG, уменьшенного ещё при
+    декодировании (`draft`); для уровня 0 оригинал декодируется один раз, и
+    из него же уменьшением строятся все остальные уровни. При показе
+    читаются только тайлы, попавшие в окно. Ещё не начатые задания
+    отменяются через `cancel()`, когда пользователь уходит с картинки.
+    """
+
+    def __init__(self, image_path: Union[str, Path], original_size: Tuple[int, int],
+                 cache_dir: Union[str, Path] = TILES_DIR, tile_size: int = 256):
+        self.image_path = str(image_path)
+        self.width, self.height = original_size
+        self.tile_size = tile_size
+
+        stat = os.stat(self.image_path)
+        key = f"{os.path.abspath(self.image_path)}|{stat.st_mtime_ns}|{stat.st_size}|{tile_size}"
+        self.cache_dir = Path(cache_dir) / hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+        self.max_level = 0
+        while max(self.width, self.height) > tile_size << self.max_level:
+            self.max_level += 1
+
+        self._ready = set()
+        self._failed = {}
+        self._pending = {}
+        self._futures = {}
+        self._lock = threading.Lock()
+        try:
+            # Отметка обращения для LRU-очистки кэша
+            os.utime(self.cache_dir)
+        except FileNotFoundError:
+            pass
+
+    def level_scale(self, level: int) -> float:
+        return 1 / (1 << level)
+
+    def level_size(self, level: int) -> Tuple[int, int]:
+        return (max(math.ceil(self.width / (1 << level)), 1),
+                max(math.ceil(self.height / (1 << level)), 1))
+
+    def level_for_scale(self, scale: float) -> int:
+        """Самый мелкий уровень, разрешение которого не ниже экранного."""
+        if scale >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / scale))), self.max_level)
+
+    def _level_dir(self, level: int) -> Path:
+        return self.cache_dir / str(level)
+
+    def is_ready(self, level: int) -> bool:
+        if level in self._ready:
+            return True
+        if (self._level_dir(level) / ".done").exists():
+            self._ready.add(level)
+            return True
+        return False
+
+    def _write_tiles(self, level: int, image: Image.Image):
+        level_dir = self._level_dir(level)
+        level_dir.mkdir(parents=True, exist_ok=True)
+        width, height = image.size
+        for top in range(0, height, self.tile_size):
+            for left in range(0, width, self.tile_size):
+                tile = image.crop((left, top, min(left + self.tile_size, width), min(top + self.tile_size, height)))
+                tile_path = level_dir / f"{left // self.tile_size}_{top // self.tile_size}.jpg"
+                tmp_path = tile_path.with_name(tile_path.name + ".tmp")
+                tile.save(tmp_path, "JPEG", quality=90)
+                os.replace(tmp_path, tile_path)
+        (level_dir / ".done").touch()
+        with self._lock:
+            self._ready.add(level)
+
+    def _generate_level(self, level: int):
+        size = self.level_size(level)
+        with Image.open(self.image_path) as source:
+            if level > 0:
+                source.draft("RGB", size)
+            image = source.convert("RGB")
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        self._write_tiles(level, image)
+        if level == 0:
+            # Оригинал уже в памяти: остальные уровни дешевле получить из него
+            for coarser in range(1, self.max_level + 1):
+                image = image.reduce(2)
+                if image.size != self.level_size(coarser):
+                    image = image.resize(self.level_size(coarser), Image.Resampling.BILINEAR)
+                if not self.is_ready(coarser):
+                    self._write_tiles(coarser, image)
+
+    def _run(self, level: int):
+        error = None
+        try:
+            if not self.is_ready(level):
+                self._generate_level(level)
+        except Image.DecompressionBombError as e:
+            error = f"слишком большая картинка: {e}"
+        except MemoryError:
+            error = "не хватило памяти для декодирования"
+        except Exception as e:
+            error = str(e)
+        if error is not None:
+            print(f"Ошибка создания тайлов {self.image_path} (уровень {level}): {error}")
+        with self._lock:
+            callbacks = self._pending.pop(level, [])
+            self._futures.pop(level, None)
+            if error is not None:
+                self._failed[level] = error
+        if error is None:
+            trim_tile_cache(self.cache_dir.parent, keep=self.cache_dir)
+        for callback in callbacks:
+            callback(level if error is None else None)
+
+    def failed(self, level: int) -> Optional[str]:
+        """Причина, по которой уровень не удалось построить, или None."""
+        return self._failed.get(level)
+
+    def ensure_level(self, level: int, callback: Callable[[Optional[int]], None]):
+        """Создаёт уровень в фоне; `callback(уровень или None)` вызывается из фонового потока.
+
+        Уровень, который уже не удалось построить, повторно не строится.
+        """
+        with self._lock:
+            if level in self._failed:
+                return
+            callbacks = self._pending.get(level)
+            if callbacks is not None:
+                callbacks.append(callback)
+                return
+            self._pending[level] = [callback]
+            try:
+                self._futures[level] = _executor.submit(self._run, level)
+            except RuntimeError:
+                self._pending.pop(level, None)  # приложение закрывается
+
+    def cancel(self):
+        """Отменяет ещё не начатые задания этой пирамиды (картинку сменили)."""
+        with self._lock:
+            for level, future in list(self._futures.items()):
+                if future.cancel():
+                    self._futures.pop(level, None)
+                    self._pending.pop(level, None)
+
+    def tile(self, level: int, col: int, row: int) -> Image.Image:
+        key = (str(self.cache_dir), level, col, row)
+        tile = _tile_memory.get(key)
+        if tile is None:
+            tile = Image.open(self._level_dir(level) / f"{col}_{row}.jpg")
+            tile.load()
+            _tile_memory.put(key, tile)
+        return tile
+
+    def render(self, level: int, region: Region, screen: ScreenBox,
+               resample=Image.Resampling.BILINEAR) -> Image.Image:
+        """Собирает видимую часть из тайлов готового уровня и масштабирует под экран."""
+        scale = self.level_scale(level)
+        level_width, level_height = self.level_size(level)
+        size = self.tile_size
+        first_col = int(region[0] * scale) // size
+        first_row = int(region[1] * scale) // size
+        last_col = min(math.ceil(region[2] * scale), level_width - 1) // size
+        last_row = min(math.ceil(region[3] * scale), level_height - 1) // size
+
+        origin = (first_col * size, first_row * size)
+        mosaic = Image.new("RGB", (
+            min((last_col + 1) * size, level_width) - origin[0],
+            min((last_row + 1) * size, level_height) - origin[1],
+        ))
+        for row in range(first_row, last_row + 1):
+            for col in range(first_col, last_col + 1):
+                mosaic.paste(self.tile(level, col, row), (col * size - origin[0], row * size - origin[1]))
+        return render_region(mosaic, scale, region, screen, origin=origin, resample=resample)
@@ -0,0 +1,220 @@
+import itertools
+import json
+import os
+import threading
+from array import array
+from functools import wraps
+from pathlib import Path
+from time import perf_counter_ns
+from typing import Dict, Optional, Union
+
+from utils.logger import setup_logger
+
+
+class Tracer:
+    """Трассировка интервалов (span) в кольцевой буфер фиксированного размера.
+
+    Буферы выделяются один раз, запись интервала — несколько присваиваний без
+    форматирования строк; при переполнении старые интервалы затираются.
+    Выключенный трассировщик стоит одной проверки флага. Результат
+    выгружается в формате Chrome trace events (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, capacity: int = 65536):
+        self.capacity = capacity
+        self.enabled = False
+        self._names = [None] * capacity
+        self._starts = array("q", bytes(8 * capacity))
+        self._durations = array("q", bytes(8 * capacity))
+        self._threads = array("Q", bytes(8 * capacity))
+        # next() у itertools.count атомарен под GIL — потоки подгрузки пишут без блокировки
+        self._counter = itertools.count()
+        self._written = 0
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self._counter = itertools.count()
+        self._written = 0
+
+    def record(self, name: str, start_ns: int, duration_ns: int):
+        index = next(self._counter)
+        slot = index % self.capacity
+        self._names[slot] = name
+        self._starts[slot] = start_ns
+        self._durations[slot] = duration_ns
+        self._threads[slot] = threading.get_ident()
+        if index >= self._written:
+            self._written = index + 1
+
+    def __len__(self) -> int:
+        return min(self._written, self.capacity)
+
+    def events(self) -> list:
+        """Записанные интервалы в формате Chrome trace events, по времени начала."""
+        pid = os.getpid()
+        count = len(self)
+        first = self._written - count
+        events = []
+        for index in range(first, self._written):
+            slot = index % self.capacity
+            events.append({
+                "name": self._names[slot],
+                "ph": "X",
+                "ts": self._starts[slot] / 1000,
+                "dur": self._durations[slot] / 1000,
+                "pid": pid,
+                "tid": self._threads[slot],
+            })
+        events.sort(key=lambda event: event["ts"])
+
+        # Имена потоков, чтобы подгрузка и UI были подписаны в просмотрщике
+        thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for tid in sorted({event["tid"] for event in events}):
+            if tid in thread_names:
+                events.append({
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": tid,
+                    "args": {"name": thread_names[tid]},
+                })
+        return events
+
+    def export_chrome_trace(self, path: Union[str, Path]) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        trace = {
+            "traceEvents": self.events(),
+            "displayTimeUnit": "ms",
+            # Сводка по кадрам интерактивных видов (см. FrameStats)
+            "otherData": {"frames": {name: stats.summary() for name, stats in _frame_stats.items()}},
+        }
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(trace, file)
+        return path
+
+
+tracer = Tracer()
+if os.environ.get("IMAGE_ANNOTATION_TRACE"):
+    tracer.enable()
+
+
+class FrameStats:
+    """Время кадров интерактивного вида: последние `size` значений для сводки.
+
+    Пишется всегда (один раз за кадр, а не за событие); при включённой
+    трассировке каждый кадр попадает в трассу интервалом с именем `name`.
+    """
+
+    def __init__(self, name: str, size: int = 256):
+        self.name = name
+        self.size = size
+        self._durations = array("q", bytes(8 * size))
+        self.frames = 0
+
+    def record(self, start_ns: int, duration_ns: int):
+        self._durations[self.frames % self.size] = duration_ns
+        self.frames += 1
+        if tracer.enabled:
+            tracer.record(self.name, start_ns, duration_ns)
+
+    def summary(self) -> Dict[str, float]:
+        recent = sorted(self._durations[:min(self.frames, self.size)])
+        if not recent:
+            return {"frames": 0}
+        return {
+            "frames": self.frames,
+            "mean_ms": sum(recent) / len(recent) / 1e6,
+            "p95_ms": recent[min(int(len(recent) * 0.95), len(recent) - 1)] / 1e6,
+            "max_ms": recent[-1] / 1e6,
+        }
+
+
+_frame_stats: Dict[str, FrameStats] = {}
+
+
+def frame_stats(name: str) -> FrameStats:
+    """Общая на процесс статистика кадров с данным именем."""
+    stats = _frame_stats.get(name)
+    if stats is None:
+        stats = _frame_stats[name] = FrameStats(name)
+    return stats
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        tracer.record(self.name, self.start, perf_counter_ns() - self.start)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """Контекстный менеджер для участка кода: `with span("decode"): ...`"""
+    if not tracer.enabled:
+        return _NULL_SPAN
+    return _Span(name)
+
+
+def _log_exception(span_name: str, error: Exception):
+    # Вложенные traced-вызовы не пишут одно исключение по нескольку раз
+    if getattr(error, "_traced_logged", False):
+        return
+    try:
+        error._traced_logged = True
+    except AttributeError:
+        pass
+    setup_logger().exception(f"Error in {span_name}: {error}")
+
+
+def traced(func=None, *, name: Optional[str] = None):
+    """Декоратор: каждый вызов функции записывается интервалом.
+
+    Имя по умолчанию — `Класс.метод`. Можно вешать как `@traced`
+    или `@traced(name="...")`. Исключения пишутся в лог приложения
+    (как раньше в log_method) и пробрасываются дальше: из обработчиков Tk
+    иначе они пропадают в собранной версии.
+    """
+    if func is None:
+        return lambda f: traced(f, name=name)
+
+    span_name = name or func.__qualname__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter_ns() if tracer.enabled else None
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            _log_exception(span_name, e)
+            raise
+        finally:
+            if start is not None:
+                tracer.record(span_name, start, perf_counter_ns() - start)
+
+    return wrapper